@@ -0,0 +1,59 @@
+"""
+Production gunicorn profile.
+
+    gunicorn -c product_check/gunicorn.conf.py
+
+The app is imported once in the master (preload) and shared copy-on-write
+with the forked workers; each worker warms itself up before it accepts
+connections. Sizes can be overridden with GUNICORN_* environment variables.
+"""
+import gc
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = "product_check.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# gthread: a few processes for CPU, threads to overlap DB/network waits.
+# SQLite has a single writer, so more threads than this mostly adds lock waits.
+worker_class = "gthread"
+workers = _env_int("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1)
+threads = _env_int("GUNICORN_THREADS", 4)
+
+preload_app = True
+
+# Recycle workers to cap slow leaks; jitter keeps them from restarting together
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Heartbeat files on tmpfs so a slow disk can't get workers killed
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    from django.db import connections
+
+    # A SQLite handle must never be shared across fork
+    connections.close_all()
+    # Move everything the preloaded app allocated out of the GC's reach, so
+    # collections in the workers don't write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from product_check.warmup import warm_up
+
+    warm_up()
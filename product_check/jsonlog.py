@@ -0,0 +1,179 @@
+"""
+Structured logging off the request path.
+
+Records carry their fields as ``extra=``; ``JsonFormatter`` writes them as
+one JSON object per line. ``AsyncJsonHandler`` only puts the record on a
+bounded queue, and a listener thread per process does the file I/O
+(rotating JSONL files). ``SamplingFilter`` keeps a fraction of the records
+per logger, so hot paths can log every request and pay for only a
+sample. Wrap expensive fields in ``lazy(...)``: they are computed only for
+records that passed level and sampling, e.g.
+``logger.info("search", extra={"results": lazy(qs.count)})``.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Attributes every LogRecord has; everything else came in through extra=
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class lazy:
+    """A log field computed only if its record is emitted."""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __call__(self):
+        return self.func(*self.args)
+
+
+def fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep ``LOG_SAMPLING[name]`` of a logger's records (the longest matching
+    dotted prefix wins; 1.0 when none matches). WARNING and above are
+    always kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._rates = {}
+
+    def _rate(self, name):
+        if name not in self._rates:
+            rates = getattr(settings, "LOG_SAMPLING", {})
+            prefix = name
+            while prefix and prefix not in rates:
+                prefix = prefix.rpartition(".")[0]
+            self._rates[name] = rates.get(prefix, 1.0)
+        return self._rates[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class _FieldEncoder(DjangoJSONEncoder):
+    # Fields can be anything; what neither JSON nor Django knows is written as str()
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(fields(record))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, cls=_FieldEncoder)
+
+
+class _SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    A rotating file that several processes (gunicorn workers) append to:
+    one that finds the file already rotated by another reopens it instead
+    of rotating again.
+    """
+
+    def shouldRollover(self, record):
+        if self.stream is not None:
+            try:
+                current = os.stat(self.baseFilename).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(self.stream.fileno()).st_ino:
+                self.stream.close()
+                self.stream = self._open()
+        return super().shouldRollover(record)
+
+
+class AsyncJsonHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a background thread that appends them to
+    ``filename`` (rotated at ``max_bytes``, keeping ``backup_count``
+    files). A full queue drops the record rather than block the request.
+    The thread starts on first use in each process, so it also exists in
+    workers forked from a preloaded master.
+    """
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, backup_count=5, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.filename = Path(filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+            target = _SharedRotatingFileHandler(
+                self.filename, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8",
+            )
+            target.setFormatter(self.formatter or JsonFormatter())
+            # A queue inherited through fork may hold the parent's records
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, target)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._listener.stop)
+
+    def prepare(self, record):
+        # Runs in the caller's thread, and only for records that will be written
+        for key, value in fields(record).items():
+            if isinstance(value, lazy):
+                try:
+                    setattr(record, key, value())
+                except Exception as e:
+                    setattr(record, key, f"<error: {e!r}>")
+        # Args and tracebacks may not survive the trip to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
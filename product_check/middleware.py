@@ -0,0 +1,67 @@
+import logging
+import time
+
+from django.conf import settings
+
+from . import routers
+from .jsonlog import lazy
+
+PIN_COOKIE = "pin_primary"
+
+request_logger = logging.getLogger("product_check.requests")
+
+
+def _user_id(request):
+    user = getattr(request, "user", None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+class RequestLogMiddleware:
+    """
+    One structured record per request (view, status, timing), written by
+    the JSON log handler and sampled per LOG_SAMPLING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        request_logger.info("request", extra={
+            "view": match.view_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "params": lazy(request.GET.dict),
+            "status": response.status_code,
+            "user_id": lazy(_user_id, request),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Let safe requests read from the replica unless this client wrote
+    recently; a request that writes pins the client to the primary for
+    REPLICA_PIN_SECONDS (longer than the replica sync interval).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in ("GET", "HEAD") or PIN_COOKIE in request.COOKIES
+        token = routers.begin_request(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end_request(token)
+        if wrote:
+            response.set_cookie(
+                PIN_COOKIE, "1",
+                max_age=getattr(settings, "REPLICA_PIN_SECONDS", 30),
+                httponly=True, samesite="Lax",
+            )
+        return response
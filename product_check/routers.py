@@ -0,0 +1,74 @@
+"""
+Send reads to a read replica and writes to the primary.
+
+Only requests opt in to the replica (ReplicaPinningMiddleware); management
+commands and background tasks always read from the primary. A request that
+writes, and the same client's requests for REPLICA_PIN_SECONDS afterwards,
+are pinned to the primary so users always read their own changes.
+"""
+from contextvars import ContextVar
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+_routing = ContextVar("replica_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def begin_request(pinned):
+    """Start replica routing for the current request; returns a reset token."""
+    return _routing.set(RoutingState(pinned))
+
+
+def end_request(token):
+    """Stop routing for the request; returns True if it wrote anything."""
+    state = _routing.get()
+    _routing.reset(token)
+    return bool(state and state.wrote)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.pinned:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = state.pinned = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary file (see sync_replica)
+        return db != REPLICA
+
+
+class PrimaryRouter:
+    """
+    Last router when there is no replica: without it Django would send a
+    global-table lookup made from a shard row (e.g. ``order.user``) to
+    that row's shard.
+    """
+
+    def db_for_read(self, model, **hints):
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
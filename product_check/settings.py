@@ -1,3 +1,5 @@
+import os
+import sys
 from pathlib import Path
 
 # Base directory
@@ -21,7 +23,13 @@ INSTALLED_APPS = [
 
 # Middleware
 MIDDLEWARE = [
+    # Static and media files skip the rest of the stack (and the request log)
+    'product_check.staticfiles.StaticFilesMiddleware',
+    # Its timing covers every other middleware
+    'product_check.middleware.RequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Outermost DB user, so session/auth reads and writes are routed too
+    'product_check.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,11 +62,88 @@ TEMPLATES = [
 WSGI_APPLICATION = 'product_check.wsgi.application'
 
 # Database
+# product_check.sqlite_backend = stock sqlite3 + WAL/busy-timeout pragmas
+# on every new connection and BEGIN IMMEDIATE for atomic blocks
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'product_check.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {},  # overrides for sqlite_backend.base.DEFAULT_PRAGMAS
+        },
+    }
+}
+
+# Optional read replica: a copy of the primary file refreshed by
+# `manage.py sync_replica --interval N`. Safe requests read from it unless
+# the client wrote within REPLICA_PIN_SECONDS (keep this above the interval).
+REPLICA_DB_PATH = os.environ.get('REPLICA_DB_PATH')
+REPLICA_PIN_SECONDS = 30
+DATABASE_ROUTERS = []
+if REPLICA_DB_PATH:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': REPLICA_DB_PATH,
+        'OPTIONS': {'pragmas': {'query_only': 1}},
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_ROUTERS.append('product_check.routers.PrimaryReplicaRouter')
+
+# Shop sharding (see shops/sharding.py): Item, ItemRequest, Order and
+# Transaction rows live on the shard owning their shop. Shards are created
+# with `manage.py init_shards`; 1 keeps everything on 'default'.
+# Foreign keys that cross databases are declared with db_constraint=False.
+# `manage.py test` defaults to two (in-memory) shards, so the tests cover them.
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 2 if sys.argv[1:2] == ['test'] else 1))
+for _n in range(1, SHARD_COUNT):
+    DATABASES[f'shard_{_n}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db_shard_{_n}.sqlite3',
+    }
+if SHARD_COUNT > 1:
+    DATABASE_ROUTERS.insert(0, 'shops.sharding.ShopShardRouter')
+    if not REPLICA_DB_PATH:
+        DATABASE_ROUTERS.append('product_check.routers.PrimaryRouter')
+
+# Background jobs (see shops/tasks.py): side effects are queued as Job rows
+# and run by `manage.py run_worker`, which also queues the periodic
+# SHOPS_SCHEDULE tasks (cron syntax, in TIME_ZONE). Set SHOPS_TASKS_EAGER
+# to run jobs inline after commit instead, e.g. in development.
+SHOPS_WORKER_PROCESSES = int(os.environ.get('SHOPS_WORKER_PROCESSES', 2))
+
+# Logging (see product_check/jsonlog.py): structured records go to
+# logs/app.jsonl through a queue, so requests never wait on the disk.
+# LOG_SAMPLING keeps that fraction of a logger's INFO records.
+LOG_DIR = Path(os.environ.get('LOG_DIR', BASE_DIR / 'logs'))
+LOG_SAMPLING = {
+    'product_check.requests': float(os.environ.get('LOG_SAMPLE_REQUESTS', 0.1)),
+    'shops.search': float(os.environ.get('LOG_SAMPLE_SEARCH', 0.1)),
+}
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'product_check.jsonlog.JsonFormatter'},
+    },
+    'filters': {
+        'sampling': {'()': 'product_check.jsonlog.SamplingFilter'},
+    },
+    'handlers': {
+        'jsonl': {
+            'class': 'product_check.jsonlog.AsyncJsonHandler',
+            'filename': LOG_DIR / 'app.jsonl',
+            'formatter': 'json',
+            'filters': ['sampling'],
+        },
+        'console': {'class': 'logging.StreamHandler', 'level': 'WARNING'},
+    },
+    'loggers': {
+        'product_check': {'handlers': ['jsonl', 'console'], 'level': 'INFO'},
+        'shops': {'handlers': ['jsonl', 'console'], 'level': 'INFO'},
+    },
 }
 
 # Password validators
@@ -70,12 +155,36 @@ TIME_ZONE = 'Asia/Kolkata'
 USE_I18N = True
 USE_TZ = True
 
-# Static files
+# Static files (see product_check/staticfiles.py): `collectstatic` writes
+# content-hashed, precompressed copies to STATIC_ROOT, and
+# StaticFilesMiddleware serves them with immutable caching
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'product_check.staticfiles.CompressedManifestStaticFilesStorage'},
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Product images are stored under their content hash (shops/images.py), so
+# their URLs can be cached forever
+MEDIA_IMMUTABLE_PREFIXES = ['blobs/']
+# How long an unreferenced image blob is kept before it is deleted
+IMAGE_BLOB_GRACE_SECONDS = 3600
+
+# Delivered orders and sales older than this move to gzip'd segment files in
+# ARCHIVE_DIR (shops/archive.py); history pages read through to them
+ARCHIVE_DIR = BASE_DIR / 'archive'
+ARCHIVE_AFTER_DAYS = 365
+HISTORY_PAGE_SIZE = 50
+# Orders per page (and per bulk action) of the shopkeeper fulfilment queue
+FULFILMENT_PAGE_SIZE = 100
+
+# Catalog change feed (shops/changes.py): changes older than this are
+# pruned daily; clients polling from an older cursor must refetch
+CATALOG_CHANGES_KEEP_DAYS = 30
 
 # Default primary key field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
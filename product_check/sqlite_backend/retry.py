@@ -0,0 +1,28 @@
+import functools
+import random
+import time
+
+from django.db import OperationalError, connections
+
+
+def retry_on_locked(func=None, *, attempts=3, delay=0.05):
+    """
+    Retry a short write when SQLite still reports "database is locked"
+    after its busy timeout. Only the outermost call retries: inside an
+    atomic block the transaction is already broken and must be unwound.
+    The wrapped function should be one atomic unit of work.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    in_atomic = any(c.in_atomic_block for c in connections.all(initialized_only=True))
+                    if "locked" not in str(e) or in_atomic or attempt == attempts - 1:
+                        raise
+                    time.sleep(delay * (2 ** attempt) * (0.5 + random.random()))
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
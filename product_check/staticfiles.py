@@ -0,0 +1,158 @@
+"""
+Static and media files without a separate web server.
+
+``collectstatic`` (with ``CompressedManifestStaticFilesStorage``) writes
+every file under a content-hashed name plus ``.gz`` and, when the
+``brotli`` package is installed, ``.br`` copies. ``StaticFilesMiddleware``
+indexes STATIC_ROOT once at startup and answers a request for a hashed
+name with the best precompressed copy the client accepts and
+``Cache-Control: immutable``: the name changes whenever the content does,
+so browsers never need to revalidate it. Media uploads are served with
+Last-Modified revalidation, except under MEDIA_IMMUTABLE_PREFIXES
+(content-addressed product images), which are immutable too.
+"""
+import gzip
+import mimetypes
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".xml", ".html", ".ico", ".ttf", ".eot"}
+# Smaller files gain less than the Content-Encoding header costs
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # A template names a file that was never added: link it as-is
+            # rather than fail the page
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            self._compress(name)
+
+    def _compress(self, name):
+        if Path(name).suffix.lower() not in COMPRESSIBLE:
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            # Not worth a second lookup on every request
+            if len(compressed) > len(data) * 0.95:
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+
+
+def _static_index():
+    """{url path: (path, {encoding: path}, immutable)} for STATIC_ROOT."""
+    root = getattr(settings, "STATIC_ROOT", None)
+    if not root or not os.path.isdir(root):
+        return {}
+    hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+    if not hashed and hasattr(staticfiles_storage, "load_manifest"):
+        hashed = set(staticfiles_storage.load_manifest().values())
+    index = {}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            if filename.endswith((".gz", ".br")):
+                continue
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            variants = {
+                encoding: path + suffix
+                for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+                if os.path.exists(path + suffix)
+            }
+            index[settings.STATIC_URL + name] = (path, variants, name in hashed)
+    return index
+
+
+def _accepted(request):
+    header = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    return {part.split(";")[0].strip() for part in header.split(",")}
+
+
+class StaticFilesMiddleware:
+    """Serve STATIC_URL from the collected files and MEDIA_URL from MEDIA_ROOT."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_files = _static_index()
+        self.media_url = settings.MEDIA_URL
+        self.media_root = str(settings.MEDIA_ROOT)
+        self.media_max_age = getattr(settings, "MEDIA_MAX_AGE", 86400)
+        self.media_immutable = tuple(getattr(settings, "MEDIA_IMMUTABLE_PREFIXES", ()))
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD"):
+            entry = self.static_files.get(request.path_info)
+            if entry is not None:
+                return self.serve_static(request, *entry)
+            if self.media_url and request.path_info.startswith(self.media_url):
+                return self.serve_media(request, request.path_info[len(self.media_url):])
+        return self.get_response(request)
+
+    def serve_static(self, request, path, variants, immutable):
+        accepted = _accepted(request)
+        encoding = next((e for e in ("br", "gzip") if e in variants and e in accepted), None)
+        stat = os.stat(path)
+        if not immutable and not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+            return HttpResponseNotModified()
+        response = FileResponse(open(variants[encoding] if encoding else path, "rb"))
+        response["Content-Type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if variants:
+            response["Vary"] = "Accept-Encoding"
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = IMMUTABLE if immutable else "public, max-age=0, must-revalidate"
+        # Answered ahead of SecurityMiddleware
+        response["X-Content-Type-Options"] = "nosniff"
+        return response
+
+    def serve_media(self, request, name):
+        try:
+            path = safe_join(self.media_root, name)
+            stat = os.stat(path)
+        except (SuspiciousFileOperation, OSError):
+            raise Http404("No such file")
+        if not os.path.isfile(path):
+            raise Http404("No such file")
+        immutable = bool(self.media_immutable) and name.startswith(self.media_immutable)
+        if not immutable and not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+            return HttpResponseNotModified()
+        response = FileResponse(open(path, "rb"))
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = IMMUTABLE if immutable else f"public, max-age={self.media_max_age}"
+        response["X-Content-Type-Options"] = "nosniff"
+        return response
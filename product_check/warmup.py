@@ -0,0 +1,84 @@
+"""
+Warm a freshly forked gunicorn worker before it takes traffic, so the
+first requests after a deploy don't pay for URLconf import, template
+compilation and cold catalog pages.
+"""
+import logging
+import os
+import time
+
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Extra warm-up callables registered by apps (e.g. in-memory indexes)
+_extra_steps = []
+
+
+def register(step):
+    """Add ``step()`` to the post-fork warm-up. Usable as a decorator."""
+    _extra_steps.append(step)
+    return step
+
+
+def warm_url_resolver():
+    resolver = get_resolver()
+    # Touching these forces the URLconf import and the reverse() tables
+    resolver.reverse_dict
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        namespace_resolver.reverse_dict
+
+
+def _template_dirs(engine):
+    """Directories the engine's loaders search: DIRS and every app's templates/."""
+    loaders = getattr(getattr(engine, "engine", None), "template_loaders", None)
+    if loaders is None:
+        return getattr(engine, "template_dirs", ())
+    # APP_DIRS or an explicit app_directories loader (possibly wrapped in
+    # the cached one); both answer get_dirs()
+    dirs = []
+    for loader in loaders:
+        if hasattr(loader, "get_dirs"):
+            dirs.extend(loader.get_dirs())
+    return list(dict.fromkeys(dirs))
+
+
+def warm_templates():
+    """Compile every template into the cached loader (on by default since Django 4.1)."""
+    for engine in engines.all():
+        for template_dir in _template_dirs(engine):
+            for root, _, files in os.walk(template_dir):
+                for filename in files:
+                    if not filename.endswith(".html"):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), template_dir).replace(os.sep, "/")
+                    try:
+                        engine.get_template(name)
+                    except Exception as e:
+                        logger.warning("Warm-up could not compile template %s: %s", name, e)
+
+
+def warm_catalog():
+    """Pull the catalog tables into the OS/SQLite page cache."""
+    from shops import sharding
+    from shops.models import Item, Shop
+
+    list(Shop.objects.values_list("id", "shop_name"))
+    for items in sharding.each_shard(Item.objects.values_list("item_id", "shop_id", "name", "quantity", "price")):
+        list(items)
+
+
+def warm_up():
+    started = time.perf_counter()
+    for step in [warm_url_resolver, warm_templates, warm_catalog, *_extra_steps]:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", step.__name__)
+        logger.info("Warm-up %s took %.1f ms", step.__name__, (time.perf_counter() - step_started) * 1000)
+    # Request threads open their own connections
+    connections.close_all()
+    logger.info("Worker warm-up finished in %.1f ms", (time.perf_counter() - started) * 1000)
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from .admin_paging import LargeTableAdmin, value_filter
 from .models import (
     Profile,
     Shop,
@@ -9,15 +11,159 @@ from .models import (
     Order,
     Wishlist,
     Recommendation,
+    Notification,
+    AccountClosure,
+    Job,
+    PeriodicTask,
+    ImageBlob,
+    StockMovement,
+    name_key,
 )
 
-# Register models
-admin.site.register(Profile)
-admin.site.register(Shop)
-admin.site.register(Item)
-admin.site.register(ItemRequest)
-admin.site.register(CartItem)
-admin.site.register(Transaction)
-admin.site.register(Order)
-admin.site.register(Wishlist)
-admin.site.register(Recommendation)
+# Every ForeignKey to a user or an item is a raw id box: a <select> would
+# load the whole table. list_select_related covers what __str__ and
+# list_display follow, so a changelist page is a single query.
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ("user", "phone")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ("=user__username",)
+
+
+@admin.register(Shop)
+class ShopAdmin(admin.ModelAdmin):
+    list_display = ("shop_name", "user", "updated_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ("shop_name", "=user__username")
+
+
+@admin.register(Item)
+class ItemAdmin(LargeTableAdmin):
+    list_display = ("item_id", "name", "shop", "quantity", "price", "updated_at")
+    list_select_related = ("shop",)
+    raw_id_fields = ("shop",)
+    search_help_text = "Exact item id or name"
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term and not term.isdigit():
+            # Served by item_name_key_idx
+            return queryset.filter(name_key=name_key(term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(ItemRequest)
+class ItemRequestAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "shop", "item_name", "quantity", "status", "created_at")
+    list_select_related = ("user", "shop")
+    list_filter = (value_filter("status", ["Pending", "Approved", "Rejected"]),)
+    date_hierarchy = "created_at"
+    raw_id_fields = ("user", "shop", "item")
+    exact_search_fields = ("user__username",)
+    search_help_text = "Exact request id or username"
+
+
+@admin.register(CartItem)
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "product", "quantity")
+    list_select_related = ("user", "product__shop")
+    raw_id_fields = ("user", "product")
+    exact_search_fields = ("user__username",)
+    search_help_text = "Exact id or username"
+
+
+@admin.register(Transaction)
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ("id", "buyer", "seller", "item", "quantity", "total_price", "date")
+    list_select_related = ("buyer", "seller", "item__shop")
+    date_hierarchy = "date"
+    raw_id_fields = ("buyer", "seller", "item")
+    exact_search_fields = ("buyer__username", "seller__username")
+    search_help_text = "Exact transaction id, buyer or seller username"
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "item", "shop", "quantity", "total_price", "status", "payment_method", "created_at")
+    list_select_related = ("user", "item__shop", "shop")
+    list_filter = ("status", "payment_method")
+    date_hierarchy = "created_at"
+    raw_id_fields = ("user", "shop", "item")
+    exact_search_fields = ("user__username",)
+    search_help_text = "Exact order id or username"
+
+
+@admin.register(Wishlist)
+class WishlistAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "item")
+    list_select_related = ("user", "item__shop")
+    raw_id_fields = ("user", "item")
+    exact_search_fields = ("user__username",)
+    search_help_text = "Exact id or username"
+
+
+@admin.register(Recommendation)
+class RecommendationAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "item")
+    list_select_related = ("user", "item__shop")
+    raw_id_fields = ("user", "item")
+    exact_search_fields = ("user__username",)
+    search_help_text = "Exact id or username"
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "kind", "message", "is_read", "created_at")
+    list_select_related = ("user",)
+    list_filter = ("kind", "is_read")
+    raw_id_fields = ("user", "item")
+    exact_search_fields = ("user__username",)
+    search_help_text = "Exact id or username"
+
+
+@admin.register(AccountClosure)
+class AccountClosureAdmin(admin.ModelAdmin):
+    list_display = ("username", "status", "current_step", "deleted_rows", "created_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("=username",)
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_at", "locked_by", "finished_at")
+    list_filter = ("status",)
+    search_help_text = "Exact job id"
+
+
+admin.site.register(PeriodicTask)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(LargeTableAdmin):
+    list_display = ("id", "item", "delta", "reason", "order_id", "sale_id", "created_at")
+    list_select_related = ("item__shop",)
+    list_filter = (value_filter("reason", [
+        StockMovement.OPENING, StockMovement.CREATED, StockMovement.EDIT,
+        StockMovement.CART, StockMovement.CART_REMOVE, StockMovement.SALE,
+    ]),)
+    raw_id_fields = ("item", "order", "sale")
+    search_help_text = "Exact movement id"
+
+    def has_change_permission(self, request, obj=None):
+        # Append-only
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImageBlob)
+class ImageBlobAdmin(LargeTableAdmin):
+    list_display = ("id", "name", "size", "refcount", "updated_at")
+    readonly_fields = ("name", "size", "refcount")
+    exact_search_fields = ("name",)
+    search_help_text = "Exact blob id or path"
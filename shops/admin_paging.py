@@ -0,0 +1,232 @@
+"""
+Admin changelists for tables too big to count or page with OFFSET.
+
+``LargeTableAdmin`` pages by primary key (``?cursor=<last pk seen>``, newest
+first), so every page is one indexed range scan however deep it is. Its
+result counts are estimated, never a full ``COUNT(*)``. Search only
+matches exact values on indexed columns (``exact_search_fields``, plus
+the id for a numeric term), since a ``LIKE '%term%'`` search scans the
+whole table.
+
+With sharding on, sharded tables get a "shard" filter: a changelist shows
+one database at a time (default first), and relations to tables on
+another database are prefetched or loaded per row rather than joined.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+
+from . import sharding
+
+CURSOR_VAR = "cursor"
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    An unfiltered table is estimated from its id range (two index
+    lookups); a filtered one is counted up to ADMIN_COUNT_LIMIT rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        if not queryset.query.where:
+            bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+            if bounds["high"] is None:
+                return 0
+            # Rows moved between shards keep their ids, so one table can
+            # hold several shards' id ranges; its id span means nothing then
+            if bounds["high"] >> sharding.ID_SHIFT == bounds["low"] >> sharding.ID_SHIFT:
+                return bounds["high"] - bounds["low"] + 1
+        return queryset[:getattr(settings, "ADMIN_COUNT_LIMIT", 10000)].count()
+
+
+class CursorChangeList(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET[CURSOR_VAR])
+        except (KeyError, ValueError):
+            self.cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing a filter or search starts again from the newest rows
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.cursor is not None:
+            queryset = queryset.filter(pk__lt=self.cursor)
+        return queryset.order_by("-pk")
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        rows = list(self.queryset[:self.list_per_page + 1])
+        self.has_next = len(rows) > self.list_per_page
+        self.result_list = rows[:self.list_per_page]
+        self.next_page_url = (
+            self.get_query_string({CURSOR_VAR: self.result_list[-1].pk}) if self.has_next else None
+        )
+        self.first_page_url = self.get_query_string() if self.cursor is not None else None
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.has_next or self.cursor is not None
+        self.paginator = paginator
+
+
+def value_filter(field, values):
+    """
+    A list filter over known ``values`` of ``field``: the default filter
+    for a field without choices runs SELECT DISTINCT over the whole table.
+    """
+
+    class ValueFilter(admin.SimpleListFilter):
+        title = field.replace("_", " ")
+        parameter_name = field
+
+        def lookups(self, request, model_admin):
+            return [(value, value) for value in values]
+
+        def queryset(self, request, queryset):
+            if self.value():
+                return queryset.filter(**{field: self.value()})
+            return queryset
+
+    return ValueFilter
+
+
+def _is_sharded(model):
+    return model._meta.app_label == "shops" and model._meta.model_name in sharding.SHARDED_MODELS
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Which database a sharded table's changelist reads; "default" unless chosen."""
+
+    title = "shard"
+    parameter_name = "shard"
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.shard_aliases()]
+
+    def value(self):
+        value = super().value()
+        return value if value in sharding.shard_aliases() else sharding.PRIMARY
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        for alias, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == alias,
+                "query_string": changelist.get_query_string({self.parameter_name: alias}),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value())
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    change_list_template = "admin/cursor_change_list.html"
+    show_full_result_count = False
+    # Pages are keyed on the id; sorting by other columns would sort the table
+    sortable_by = ()
+    list_per_page = 50
+    exact_search_fields = ()
+    search_help_text = "Exact id or value"
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if sharding.is_enabled() and _is_sharded(self.model):
+            return (ShardFilter, *list_filter)
+        return list_filter
+
+    def get_list_select_related(self, request):
+        """
+        Joins only between tables on the same database: a JOIN from a shard
+        to a global table would hit the shard's empty copy of it. Global
+        relations of shard rows are prefetched from "default" instead
+        (``get_queryset``); shard relations of global rows load per row.
+        """
+        paths = super().get_list_select_related(request)
+        if not sharding.is_enabled() or not paths:
+            return paths
+        if paths is True:
+            paths = [field.name for field in self.model._meta.concrete_fields if field.many_to_one]
+        return [joined for joined, _ in map(self._split_relation, paths) if joined]
+
+    def _split_relation(self, path):
+        """``(joinable prefix, path to prefetch)`` of a list_select_related path."""
+        model, parts = self.model, path.split("__")
+        for depth, part in enumerate(parts):
+            model = model._meta.get_field(part).related_model
+            if _is_sharded(model) != _is_sharded(self.model):
+                prefetch = path if _is_sharded(self.model) else None
+                return "__".join(parts[:depth]), prefetch
+        return path, None
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        paths = super().get_list_select_related(request)
+        if sharding.is_enabled() and paths and paths is not True:
+            prefetch = [prefetched for _, prefetched in map(self._split_relation, paths) if prefetched]
+            if prefetch:
+                queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is None and sharding.is_enabled() and _is_sharded(self.model):
+            field = self.model._meta.get_field(from_field) if from_field else self.model._meta.pk
+            try:
+                value = field.to_python(object_id)
+            except (ValidationError, ValueError):
+                return None
+            obj = sharding.locate(self.get_queryset(request), **{field.name: value})
+        return obj
+
+    def get_search_fields(self, request):
+        # Shows the search box; get_search_results decides what is matched
+        return self.exact_search_fields or ("pk",)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        if not self.exact_search_fields:
+            return queryset.none(), False
+        match = Q()
+        for field in self.exact_search_fields:
+            match |= self._search_condition(field, term)
+        return queryset.filter(match), False
+
+    def _search_condition(self, field, term):
+        head, _, rest = field.partition("__")
+        if rest and sharding.is_enabled() and _is_sharded(self.model):
+            related = self.model._meta.get_field(head).related_model
+            if not _is_sharded(related):
+                # e.g. user__username on a shard: look the user up on "default"
+                matches = related._default_manager.using(sharding.PRIMARY).filter(**{rest: term})
+                return Q(**{f"{head}__in": list(matches.values_list("pk", flat=True)[:1000])})
+        return Q(**{field: term})
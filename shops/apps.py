@@ -6,3 +6,4 @@ class ShopConfig(AppConfig):
 
     def ready(self):
         import shops.signals
+        import shops.search_index  # registers its warm-up step
@@ -0,0 +1,374 @@
+"""
+Cold storage for old orders and sales, so the hot tables only hold recent
+history.
+
+``archive()`` moves rows older than a cutoff (delivered orders only; the
+cart and the fulfilment queue work on the others) into gzip'd JSON-lines
+segment files under ARCHIVE_DIR, then deletes them from the hot table in
+small chunks. Inside a segment each owner's rows (a buyer's orders, a
+seller's sales) form one gzip member, and an ArchiveEntry records its
+offset, so reading one user's history decompresses only their rows.
+
+``page()`` is what history views use: hot rows first, then archived ones,
+merged newest first behind one cursor, so paging past the hot window is
+transparent.
+"""
+import calendar
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Q, prefetch_related_objects
+from django.utils import timezone
+
+from . import sharding
+from .models import ArchiveEntry, ArchiveSegment, Item, Order, Shop, Transaction
+
+logger = logging.getLogger(__name__)
+
+ORDERS = "orders"
+TRANSACTIONS = "transactions"
+
+# owner: whose history the rows are (one gzip member each); party: the
+# other user involved, found through an offset-less entry; keep: rows
+# that stay hot however old they are
+KINDS = {
+    ORDERS: {
+        "model": Order, "at": "created_at", "owner": "user_id", "party": "shop_id",
+        "keep": ~Q(status=Order.DELIVERED),
+    },
+    TRANSACTIONS: {"model": Transaction, "at": "date", "owner": "seller_id", "party": "buyer_id", "keep": None},
+}
+
+
+def archive_dir():
+    return Path(getattr(settings, "ARCHIVE_DIR", Path(settings.BASE_DIR) / "archive"))
+
+
+# ---------------- Cursors ----------------
+def encode_cursor(at, pk):
+    micros = calendar.timegm(at.utctimetuple()) * 1_000_000 + at.microsecond
+    return f"{micros}_{pk}"
+
+
+def decode_cursor(cursor):
+    """(datetime, pk) from ``encode_cursor``, or None if malformed."""
+    try:
+        micros, pk = cursor.split("_")
+        at = datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=int(micros))
+        return at, int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+# ---------------- Segment files ----------------
+def _fields(model):
+    return model._meta.concrete_fields
+
+
+def _to_row(model, obj):
+    row = {}
+    for field in _fields(model):
+        value = field.value_from_object(obj)
+        # DjangoJSONEncoder would cut datetimes to milliseconds; cursors need them exact
+        row[field.attname] = value.isoformat() if isinstance(value, datetime) else value
+    return row
+
+
+def _instance(model, alias, row):
+    fields = _fields(model)
+    return model.from_db(alias, [f.attname for f in fields], [f.to_python(row.get(f.attname)) for f in fields])
+
+
+def _shop_owners(rows, kind):
+    if kind != ORDERS:
+        return {}
+    shop_ids = {row["shop_id"] for row in rows if row.get("shop_id")}
+    return dict(Shop.objects.filter(pk__in=shop_ids).values_list("pk", "user_id"))
+
+
+def _party(kind, row, shop_owners):
+    value = row.get(KINDS[kind]["party"])
+    return shop_owners.get(value) if kind == ORDERS else value
+
+
+def _totals(kind, rows):
+    if kind != TRANSACTIONS:
+        return {}
+    units, revenue = defaultdict(int), defaultdict(Decimal)
+    for row in rows:
+        units[str(row["item_id"])] += int(row["quantity"])
+        revenue[str(row["seller_id"])] += Decimal(str(row["total_price"]))
+    return {"units": dict(units), "revenue": {k: str(v) for k, v in revenue.items()}}
+
+
+def _write(kind, alias, rows):
+    """
+    Write ``rows`` (dicts) to a new segment file. Returns its relative
+    path, its unsaved ArchiveEntry objects (segment not set) and the
+    oldest and newest row dates.
+    """
+    spec = KINDS[kind]
+    at_field = spec["model"]._meta.get_field(spec["at"])
+    at = {id(row): at_field.to_python(row[spec["at"]]) for row in rows}
+    by_owner = defaultdict(list)
+    for row in rows:
+        by_owner[row[spec["owner"]]].append(row)
+
+    relative = f"{kind}/{alias}/{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+    path = archive_dir() / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entries = []
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        for owner, owned in sorted(by_owner.items()):
+            owned.sort(key=lambda row: (at[id(row)], row["id"]), reverse=True)
+            data = "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in owned).encode()
+            offset = f.tell()
+            f.write(gzip.compress(data, mtime=0))
+            entries.append(ArchiveEntry(
+                kind=kind, user_id=owner, offset=offset, length=f.tell() - offset, rows=len(owned),
+                first_at=at[id(owned[-1])], last_at=at[id(owned[0])],
+            ))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+    shop_owners = _shop_owners(rows, kind)
+    parties = defaultdict(list)
+    for row in rows:
+        party = _party(kind, row, shop_owners)
+        if party is not None and party != row[spec["owner"]]:
+            parties[party].append(at[id(row)])
+    for party, times in parties.items():
+        entries.append(ArchiveEntry(kind=kind, user_id=party, rows=len(times), first_at=min(times), last_at=max(times)))
+    return relative, entries, min(at.values()), max(at.values())
+
+
+def _read(segment, offset=None, length=None):
+    """Rows (dicts) of a whole segment, or of the one gzip member at ``offset``."""
+    with open(archive_dir() / segment.path, "rb") as f:
+        if offset is None:
+            data = f.read()
+        else:
+            f.seek(offset)
+            data = f.read(length)
+    return [json.loads(line) for line in gzip.decompress(data).splitlines() if line]
+
+
+# ---------------- Archiving ----------------
+def _delete_hot(segment, pks, chunk_size, pause):
+    model = KINDS[segment.kind]["model"]
+    manager = model.objects.db_manager(segment.alias)
+    for start in range(0, len(pks), chunk_size):
+        with transaction.atomic(using=segment.alias):
+            # No delete signals: the sales still count towards units_sold and revenue
+            manager.filter(pk__in=pks[start:start + chunk_size])._raw_delete(segment.alias)
+        if pause:
+            time.sleep(pause)
+    segment.status = ArchiveSegment.DONE
+    segment.save(update_fields=["status"])
+
+
+def recover(chunk_size=500, pause=0):
+    """Finish segments whose hot rows weren't all deleted (the archiver stopped midway)."""
+    for segment in ArchiveSegment.objects.filter(status=ArchiveSegment.PENDING):
+        _delete_hot(segment, [row["id"] for row in _read(segment)], chunk_size, pause)
+
+
+def archive(kind, before, dry_run=False):
+    """Move ``kind`` rows dated before ``before`` to segment files; returns the number moved."""
+    spec = KINDS[kind]
+    segment_rows = getattr(settings, "ARCHIVE_SEGMENT_ROWS", 50000)
+    chunk_size = getattr(settings, "ARCHIVE_CHUNK_SIZE", 500)
+    pause = getattr(settings, "ARCHIVE_PAUSE", 0.01)
+    recover(chunk_size, pause)
+
+    moved = 0
+    for alias in sharding.shard_aliases():
+        old = spec["model"].objects.using(alias).filter(**{f"{spec['at']}__lt": before})
+        if spec["keep"] is not None:
+            old = old.exclude(spec["keep"])
+        if dry_run:
+            moved += old.count()
+            continue
+        while True:
+            batch = list(old.order_by("pk")[:segment_rows])
+            if not batch:
+                break
+            rows = [_to_row(spec["model"], obj) for obj in batch]
+            path, entries, first_at, last_at = _write(kind, alias, rows)
+            with transaction.atomic():
+                segment = ArchiveSegment.objects.create(
+                    kind=kind, alias=alias, path=path, rows=len(rows),
+                    first_at=first_at, last_at=last_at, totals=_totals(kind, rows),
+                )
+                for entry in entries:
+                    entry.segment = segment
+                ArchiveEntry.objects.bulk_create(entries, batch_size=500)
+            _delete_hot(segment, [row["id"] for row in rows], chunk_size, pause)
+            moved += len(rows)
+            logger.info("Archived %s %s from %s to %s", len(rows), kind, alias, path)
+    return moved
+
+
+def archive_old():
+    """Scheduled: archive everything older than ARCHIVE_AFTER_DAYS."""
+    before = timezone.now() - timedelta(days=getattr(settings, "ARCHIVE_AFTER_DAYS", 365))
+    return {kind: archive(kind, before) for kind in KINDS}
+
+
+def archived_totals():
+    """(units sold per item id, revenue per seller id) of all archived sales."""
+    units, revenue = defaultdict(int), defaultdict(Decimal)
+    for totals in ArchiveSegment.objects.filter(kind=TRANSACTIONS).values_list("totals", flat=True):
+        for item_id, n in totals.get("units", {}).items():
+            units[int(item_id)] += n
+        for seller_id, amount in totals.get("revenue", {}).items():
+            revenue[int(seller_id)] += Decimal(amount)
+    return units, revenue
+
+
+def forget(user_id):
+    """Remove a closed account's rows, on either side, from every segment."""
+    segments = ArchiveSegment.objects.filter(entries__user_id=user_id).distinct()
+    changed_sales = False
+    for segment in segments:
+        rows = _read(segment)
+        shop_owners = _shop_owners(rows, segment.kind)
+        owner = KINDS[segment.kind]["owner"]
+        kept = [
+            row for row in rows
+            if row[owner] != user_id and _party(segment.kind, row, shop_owners) != user_id
+        ]
+        if len(kept) == len(rows):
+            continue
+        _rewrite(segment, kept)
+        changed_sales |= segment.kind == TRANSACTIONS
+    return changed_sales
+
+
+def renumber_items(aliases, new_ids):
+    """
+    rebalance_shards moved items off ``aliases`` under new ids (``new_ids``:
+    old id -> new id): point the rows archived from those shards at the new
+    ids, so history still shows the items and their archived sales still
+    count towards units_sold.
+    """
+    moved = {str(old_id) for old_id in new_ids}
+    for segment in ArchiveSegment.objects.filter(alias__in=aliases, status=ArchiveSegment.DONE):
+        # Sales segments list their items in the totals; order segments have to be read
+        if segment.kind == TRANSACTIONS and not moved & segment.totals.get("units", {}).keys():
+            continue
+        rows = _read(segment)
+        changed = False
+        for row in rows:
+            if row.get("item_id") in new_ids:
+                row["item_id"] = new_ids[row["item_id"]]
+                changed = True
+        if changed:
+            _rewrite(segment, rows)
+
+
+def _rewrite(segment, rows):
+    """Replace the segment's file, entries and totals with ``rows``; drop it when none are left."""
+    old_path = segment.path
+    with transaction.atomic():
+        segment.entries.all().delete()
+        if rows:
+            segment.path, entries, segment.first_at, segment.last_at = _write(segment.kind, segment.alias, rows)
+            segment.rows = len(rows)
+            segment.totals = _totals(segment.kind, rows)
+            segment.save()
+            for entry in entries:
+                entry.segment = segment
+            ArchiveEntry.objects.bulk_create(entries, batch_size=500)
+        else:
+            segment.delete()
+    (archive_dir() / old_path).unlink(missing_ok=True)
+
+
+# ---------------- Reading ----------------
+def _attach(kind, objects):
+    """Load the related rows history templates show, in bulk."""
+    item_ids = {obj.item_id for obj in objects if obj.item_id}
+    if item_ids:
+        items = {item.pk: item for item in sharding.fan_out(Item.objects.filter(pk__in=item_ids).select_related("shop"))}
+        field = KINDS[kind]["model"]._meta.get_field("item")
+        for obj in objects:
+            if obj.item_id in items:
+                field.set_cached_value(obj, items[obj.item_id])
+    prefetch_related_objects(objects, "buyer" if kind == TRANSACTIONS else "user")
+
+
+def _archived(kind, user_id, before, limit):
+    """Up to ``limit`` archived rows of ``user_id`` older than ``before``, newest first."""
+    spec = KINDS[kind]
+    entries = ArchiveEntry.objects.filter(kind=kind, user_id=user_id, offset__isnull=False).select_related("segment")
+    if before is not None:
+        entries = entries.filter(first_at__lte=before[0])
+    found = []
+    for entry in entries.order_by("-last_at"):
+        # Every later entry only holds older rows than the ones we have
+        if len(found) >= limit and entry.last_at < found[limit - 1][0][0]:
+            break
+        for row in _read(entry.segment, entry.offset, entry.length):
+            obj = _instance(spec["model"], entry.segment.alias, row)
+            key = (getattr(obj, spec["at"]), obj.pk)
+            if before is None or key < before:
+                found.append((key, obj))
+        found.sort(key=lambda pair: pair[0], reverse=True)
+    return [obj for _, obj in found[:limit]]
+
+
+def page(kind, user_id, cursor=None, limit=None):
+    """
+    One page of ``user_id``'s history (their orders, or the sales of their
+    shop), newest first: ``(objects, next_cursor)``.
+    """
+    spec = KINDS[kind]
+    limit = limit or getattr(settings, "HISTORY_PAGE_SIZE", 50)
+    before = decode_cursor(cursor) if cursor else None
+    at = spec["at"]
+
+    hot = spec["model"].objects.filter(**{spec["owner"]: user_id}).select_related("item")
+    if kind == TRANSACTIONS:
+        hot = hot.prefetch_related("buyer")
+    if before is not None:
+        hot = hot.filter(Q(**{f"{at}__lt": before[0]}) | Q(**{at: before[0], "pk__lt": before[1]}))
+    key = lambda obj: (getattr(obj, at), obj.pk)
+    rows = sharding.fan_out(hot.order_by(f"-{at}", "-pk"), key=key, reverse=True, limit=limit + 1)
+
+    # The archive only matters once the page reaches back to its newest row
+    newest = ArchiveEntry.objects.filter(kind=kind, user_id=user_id, offset__isnull=False).aggregate(Max("last_at"))
+    newest = newest["last_at__max"]
+    if newest is not None and (len(rows) <= limit or getattr(rows[limit], at) <= newest):
+        archived = _archived(kind, user_id, before, limit + 1)
+        _attach(kind, archived)
+        rows = sorted(rows + archived, key=key, reverse=True)[:limit + 1]
+
+    next_cursor = encode_cursor(getattr(rows[limit - 1], at), rows[limit - 1].pk) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def get(kind, pk, user_id):
+    """An archived row owned by ``user_id`` (e.g. an old order's invoice), or None."""
+    spec = KINDS[kind]
+    entries = ArchiveEntry.objects.filter(kind=kind, user_id=user_id, offset__isnull=False).select_related("segment")
+    for entry in entries.order_by("-last_at"):
+        for row in _read(entry.segment, entry.offset, entry.length):
+            if row["id"] == pk:
+                obj = _instance(spec["model"], entry.segment.alias, row)
+                _attach(kind, [obj])
+                return obj
+    return None
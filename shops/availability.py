@@ -0,0 +1,109 @@
+"""
+Bulk availability. POST a shopping list to ``availability/`` and get back,
+for every line, the shops holding enough stock, plus the single shop that
+covers the most lines. The whole list is resolved with one grouped query
+per shard over the index on ``Item.name_key`` (the casefolded name, as
+SQLite's LOWER() only folds ASCII), however long the list is.
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Min, Sum
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import sharding
+from .models import Item, Shop, name_key
+
+
+def _parse_lines(body):
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        raise ValueError("The body must be JSON.")
+    lines = payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(lines, list) or not lines:
+        raise ValueError("Send {\"items\": [{\"name\": ..., \"quantity\": ...}, ...]}.")
+    max_lines = getattr(settings, "AVAILABILITY_MAX_LINES", 300)
+    if len(lines) > max_lines:
+        raise ValueError(f"At most {max_lines} items per request.")
+    parsed = []
+    for line in lines:
+        if not isinstance(line, dict):
+            raise ValueError("Each item must be an object with a name and a quantity.")
+        name = str(line.get("name", "")).strip()
+        quantity = line.get("quantity", 1)
+        if not name or isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise ValueError("Each item needs a name and a positive integer quantity.")
+        parsed.append((name, quantity))
+    return parsed
+
+
+def stock_by_name(keys):
+    """{name key: {shop_id: (stock, lowest price)}} for in-stock items."""
+    stock = {}
+    rows = sharding.fan_out(
+        Item.objects.filter(name_key__in=set(keys), quantity__gt=0)
+        .order_by()
+        .values_list("name_key", "shop_id")
+        .annotate(stock=Sum("quantity"), price=Min("price"))
+    )
+    for key, shop_id, total, price in rows:
+        # SQLite's MIN() drops the decimal places
+        stock.setdefault(key, {})[shop_id] = (total, Decimal(price).quantize(Decimal("0.01")))
+    return stock
+
+
+def check(lines):
+    """Per-line shops that can fulfil it, and the shop covering most lines."""
+    stock = stock_by_name(name_key(name) for name, _ in lines)
+    results, covered = [], {}
+    for name, quantity in lines:
+        shops = sorted(
+            (
+                (shop_id, total, price)
+                for shop_id, (total, price) in stock.get(name_key(name), {}).items()
+                if total >= quantity
+            ),
+            key=lambda row: (row[2], row[0]),
+        )
+        for shop_id, _, price in shops:
+            count, cost = covered.get(shop_id, (0, Decimal("0.00")))
+            covered[shop_id] = (count + 1, cost + price * quantity)
+        results.append((name, quantity, shops))
+
+    shop_ids = {shop_id for _, _, shops in results for shop_id, _, _ in shops}
+    shop_names = dict(Shop.objects.filter(id__in=shop_ids).values_list("id", "shop_name"))
+
+    best = None
+    if covered:
+        # Most lines first, then the cheaper basket (at each line's lowest price)
+        shop_id, (count, cost) = min(covered.items(), key=lambda kv: (-kv[1][0], kv[1][1], kv[0]))
+        best = {"shop_id": shop_id, "shop_name": shop_names.get(shop_id), "lines": count, "total": cost}
+
+    return {
+        "lines": [
+            {
+                "name": name,
+                "quantity": quantity,
+                "shops": [
+                    {"shop_id": shop_id, "shop_name": shop_names.get(shop_id), "stock": total, "price": price}
+                    for shop_id, total, price in shops
+                ],
+            }
+            for name, quantity, shops in results
+        ],
+        "best_shop": best,
+    }
+
+
+@csrf_exempt  # Read-only, and called by integrations without a session
+@require_POST
+def bulk_availability(request):
+    try:
+        lines = _parse_lines(request.body)
+    except (ValueError, UnicodeDecodeError) as exc:
+        return JsonResponse({"success": False, "error": str(exc)}, status=400)
+    return JsonResponse({"success": True, **check(lines)})
@@ -0,0 +1,161 @@
+"""
+Catalog change feed. Every Item/Shop create, update, stock change and
+delete appends a CatalogChange row (see ``shops.signals``), and
+``changes/?since=<cursor>`` returns only the rows after the cursor a
+client last saw, so polling costs bytes proportional to what changed.
+
+A change's row is written on "default" once the change has committed on
+its own database (an item's shard), so a rolled-back save leaves nothing
+in the feed. SQLite has one writer per database, so feed ids follow the
+order the rows commit in and a cursor never skips a row that commits
+later. That order is not the order the changes themselves committed in
+across shards, and a crash between the two commits loses the row.
+
+``prune()`` (scheduled) deletes changes older than
+CATALOG_CHANGES_KEEP_DAYS. A client whose cursor is older than what is
+left gets a 410 with ``expired`` set and has to fetch the catalog again.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from .models import CatalogChange, Item
+
+ITEM_FIELDS = ("shop_id", "name", "quantity", "price", "description", "updated_at")
+SHOP_FIELDS = ("shop_name", "address", "updated_at")
+# Saves that touch nothing but these columns are reported as "stock"
+STOCK_FIELDS = {"quantity", "updated_at"}
+PRUNE_CHUNK = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def _describe(instance):
+    if isinstance(instance, Item):
+        data = {name: getattr(instance, name) for name in ITEM_FIELDS}
+        # As stored, whatever type the view assigned
+        data["price"] = Decimal(str(instance.price)).quantize(Decimal("0.01"))
+        data["image"] = instance.image.url if instance.image else None
+        return "item", instance.shop_id, data
+    return "shop", instance.pk, {name: getattr(instance, name) for name in SHOP_FIELDS}
+
+
+def _append(instance, **fields):
+    # Described now, written once the instance's own transaction commits
+    transaction.on_commit(lambda: CatalogChange.objects.create(**fields), using=instance._state.db)
+
+
+def record_save(instance, created, update_fields=None):
+    kind, shop_id, data = _describe(instance)
+    if created:
+        op = CatalogChange.CREATE
+    elif update_fields and set(update_fields) <= STOCK_FIELDS:
+        op = CatalogChange.STOCK
+        data = {"quantity": data["quantity"], "updated_at": data["updated_at"]}
+    else:
+        op = CatalogChange.UPDATE
+    _append(instance, kind=kind, object_id=instance.pk, shop_id=shop_id, op=op, data=data)
+
+
+def record_delete(instance):
+    kind, shop_id, _ = _describe(instance)
+    _append(instance, kind=kind, object_id=instance.pk, shop_id=shop_id, op=CatalogChange.DELETE)
+
+
+def record_renumbered(items, old_ids):
+    """
+    rebalance_shards moved ``items`` to a shard that gave them new ids
+    (``old_ids``: new id -> old id): a delete of each old id, then a create
+    of the new one.
+    """
+    rows = []
+    for item in items:
+        kind, shop_id, data = _describe(item)
+        rows.append(CatalogChange(kind=kind, object_id=old_ids[item.pk], shop_id=shop_id, op=CatalogChange.DELETE))
+        rows.append(CatalogChange(kind=kind, object_id=item.pk, shop_id=shop_id, op=CatalogChange.CREATE, data=data))
+    CatalogChange.objects.bulk_create(rows)
+
+
+def latest_cursor():
+    return CatalogChange.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def _expired(since):
+    # Ids are never reused and only prune() deletes, from the oldest up, so
+    # a gap between the cursor and the oldest row is what was pruned
+    oldest = CatalogChange.objects.order_by("id").values_list("id", flat=True).first()
+    return oldest is not None and since < oldest - 1
+
+
+def prune():
+    """Scheduled: delete changes older than CATALOG_CHANGES_KEEP_DAYS (the newest always stays)."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, "CATALOG_CHANGES_KEEP_DAYS", 30))
+    # Ids follow commit order, so the first recent row bounds the old ones
+    keep_from = (
+        CatalogChange.objects.filter(created_at__gte=cutoff).order_by("id").values_list("id", flat=True).first()
+        or latest_cursor()
+    )
+    pruned = 0
+    while True:
+        ids = list(
+            CatalogChange.objects.filter(id__lt=keep_from).order_by("id").values_list("id", flat=True)[:PRUNE_CHUNK]
+        )
+        if not ids:
+            break
+        # Short transactions, so feed writes aren't held up behind the prune
+        with transaction.atomic():
+            pruned += CatalogChange.objects.filter(id__gte=ids[0], id__lte=ids[-1]).delete()[0]
+    if pruned:
+        logger.info("Pruned %s catalog changes", pruned)
+    return pruned
+
+
+@require_GET
+def catalog_changes(request):
+    """
+    ``?since=<cursor>`` returns up to ``limit`` changes after the cursor, the
+    cursor to send next time and whether more are waiting. Without ``since``
+    only the current cursor is returned: take it before a full fetch, then
+    poll from there. ``shop=<id>`` narrows the feed to one shop. A cursor
+    whose changes have been pruned gets a 410 carrying the current cursor.
+    """
+    page_size = getattr(settings, "CATALOG_CHANGES_PAGE_SIZE", 500)
+    try:
+        limit = max(1, min(int(request.GET.get("limit", page_size)), page_size))
+        since = request.GET.get("since")
+        since = int(since) if since is not None else None
+        shop_id = int(request.GET["shop"]) if request.GET.get("shop") else None
+    except ValueError:
+        return JsonResponse({"success": False, "error": "since, limit and shop must be integers."}, status=400)
+
+    if since is None:
+        return JsonResponse({"success": True, "changes": [], "cursor": latest_cursor(), "more": False})
+
+    if _expired(since):
+        return JsonResponse({
+            "success": False,
+            "error": "The cursor is older than the feed keeps; fetch the catalog again.",
+            "expired": True,
+            "cursor": latest_cursor(),
+        }, status=410)
+
+    changes = CatalogChange.objects.filter(id__gt=since)
+    if shop_id is not None:
+        changes = changes.filter(shop_id=shop_id)
+    rows = list(
+        changes.order_by("id").values("id", "kind", "object_id", "shop_id", "op", "data", "created_at")[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return JsonResponse({
+        "success": True,
+        "changes": rows,
+        "cursor": rows[-1]["id"] if rows else since,
+        "more": more,
+    })
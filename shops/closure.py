@@ -0,0 +1,133 @@
+"""
+Account closure: the account is deactivated in the request, and the
+cascade is deleted here in small chunks so no single transaction holds
+the SQLite write lock for long.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import archive, counters, sharding, tasks
+from .models import (
+    AccountClosure,
+    CartItem,
+    Item,
+    ItemRequest,
+    Notification,
+    Order,
+    PriceChange,
+    Profile,
+    Recommendation,
+    Shop,
+    StockMovement,
+    StockSnapshot,
+    Transaction,
+    Wishlist,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _purge_plan(user_id, shop_id, item_ids=None):
+    """
+    (label, model, filter) in dependency order: rows that point at the
+    shop's items go before the items, the items before the shop, and so on,
+    so every chunk delete only has to cascade into already-empty tables.
+
+    With sharding the shop's items are not on "default", so global tables
+    are matched on ``item_ids`` instead of joining through the item.
+    """
+    def owned(user_q, shop_q):
+        return user_q | shop_q if shop_id else user_q
+
+    def of_shop_items(field):
+        if item_ids is not None:
+            return Q(**{f"{field}_id__in": item_ids})
+        return Q(**{f"{field}__shop_id": shop_id})
+
+    plan = [
+        ("notifications", Notification, owned(Q(user_id=user_id), of_shop_items("item"))),
+        ("wishlist", Wishlist, owned(Q(user_id=user_id), of_shop_items("item"))),
+        ("recommendations", Recommendation, owned(Q(user_id=user_id), of_shop_items("item"))),
+        ("cart", CartItem, owned(Q(user_id=user_id), of_shop_items("product"))),
+        ("requests", ItemRequest, owned(Q(user_id=user_id), Q(shop_id=shop_id) | Q(item__shop_id=shop_id))),
+        ("orders", Order, owned(Q(user_id=user_id), Q(shop_id=shop_id) | Q(item__shop_id=shop_id))),
+        ("transactions", Transaction, owned(Q(buyer_id=user_id) | Q(seller_id=user_id), Q(item__shop_id=shop_id))),
+    ]
+    if shop_id:
+        plan += [
+            ("stock ledger", StockMovement, of_shop_items("item")),
+            ("stock snapshots", StockSnapshot, of_shop_items("item")),
+            ("price history", PriceChange, of_shop_items("item")),
+            ("items", Item, Q(shop_id=shop_id)),
+            ("shop", Shop, Q(pk=shop_id)),
+        ]
+    plan += [
+        ("profile", Profile, Q(user_id=user_id)),
+        ("user", User, Q(pk=user_id)),
+    ]
+    return plan
+
+
+def _delete_in_chunks(closure, label, model, condition, chunk_size, pause, using):
+    closure.current_step = label
+    closure.save(update_fields=["current_step"])
+
+    manager = model.objects.db_manager(using)
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(manager.filter(condition).values_list("pk", flat=True)[:chunk_size])
+            if not pks:
+                return
+            deleted, _ = manager.filter(pk__in=pks).delete()
+            AccountClosure.objects.filter(pk=closure.pk).update(deleted_rows=F("deleted_rows") + deleted)
+        # Let waiting writers take the lock between chunks
+        if pause:
+            time.sleep(pause)
+
+
+def purge_account(closure_id):
+    """Delete everything owned by a closed account. Safe to re-run after a crash."""
+    closure = AccountClosure.objects.filter(pk=closure_id).exclude(status="done").first()
+    if closure is None:
+        return
+
+    chunk_size = getattr(settings, "ACCOUNT_PURGE_CHUNK_SIZE", 500)
+    pause = getattr(settings, "ACCOUNT_PURGE_PAUSE", 0.01)
+    shop_id = Shop.objects.filter(user_id=closure.user_id).values_list("pk", flat=True).first()
+    item_ids = None
+    if shop_id and sharding.is_enabled():
+        item_ids = list(sharding.for_shop(Item.objects, shop_id).filter(shop_id=shop_id).values_list("pk", flat=True))
+
+    closure.status = "running"
+    closure.save(update_fields=["status"])
+    try:
+        # First, while the shop still maps archived orders to its owner
+        closure.current_step = "archive"
+        closure.save(update_fields=["current_step"])
+        if archive.forget(closure.user_id):
+            # Archived sales count towards the other side's counters too
+            tasks.enqueue(counters.reconcile)
+        for label, model, condition in _purge_plan(closure.user_id, shop_id, item_ids):
+            aliases = [None]
+            if sharding.is_enabled() and model._meta.model_name in sharding.SHARDED_MODELS:
+                # The user's own orders/requests can sit on any shard
+                aliases = sharding.shard_aliases()
+            for using in aliases:
+                _delete_in_chunks(closure, label, model, condition, chunk_size, pause, using)
+    except Exception as e:
+        logger.exception("Purge of account %s failed at %s", closure.username, closure.current_step)
+        closure.status = "failed"
+        closure.last_error = str(e)
+        closure.save(update_fields=["status", "last_error"])
+        raise
+
+    closure.status = "done"
+    closure.current_step = ""
+    closure.finished_at = timezone.now()
+    closure.save(update_fields=["status", "current_step", "finished_at"])
@@ -0,0 +1,126 @@
+"""
+Denormalized counters, so dashboards can show and sort by them without
+aggregating over the big tables:
+
+    Item.units_sold       SUM(Transaction.quantity) of the item
+    Item.wishlist_count   COUNT(Wishlist) of the item
+    Shop.revenue          SUM(Transaction.total_price) sold by the shop's owner
+    Shop.pending_requests COUNT(ItemRequest) of the shop with status "Pending"
+
+Signals (shops/signals.py) apply each change as an ``F()`` update right
+after the write that caused it, in the same transaction when the write
+runs in one (checkout does), so a rolled-back sale takes its counts with
+it. With sharding the shop (and the wishlist) live on "default" while
+sales and requests live on the shop's shard, so a crash between the two
+can leave a count off; ``reconcile`` recomputes everything from the rows
+(and the totals of archived sales, see shops/archive.py).
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import archive, sharding
+from .models import Item, ItemRequest, Shop, Transaction, Wishlist
+
+logger = logging.getLogger(__name__)
+
+PENDING = "Pending"
+RECONCILE_BATCH = 500
+
+
+def _bump_item(item_id, using=None, **deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if using is not None:
+        Item.objects.using(using).filter(pk=item_id).update(**changes)
+        return
+    # The item's shard isn't known (e.g. from a wishlist row on "default")
+    for queryset in sharding.each_shard(Item.objects.filter(pk=item_id)):
+        if queryset.update(**changes):
+            return
+
+
+def _bump_shop(lookup, **deltas):
+    Shop.objects.filter(**lookup).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def sale(record, sign=1):
+    """A Transaction was recorded (sign=1) or deleted (sign=-1)."""
+    _bump_item(record.item_id, using=record._state.db, units_sold=sign * record.quantity)
+    _bump_shop({"user_id": record.seller_id}, revenue=sign * Decimal(record.total_price))
+
+
+def request_status(shop_id, old_status, new_status):
+    """An ItemRequest moved from ``old_status`` to ``new_status`` (None = didn't exist)."""
+    delta = (new_status == PENDING) - (old_status == PENDING)
+    if delta:
+        _bump_shop({"pk": shop_id}, pending_requests=delta)
+
+
+def wish(item_id, sign=1):
+    _bump_item(item_id, wishlist_count=sign)
+
+
+def _reconcile_items(using, archived_units):
+    fixed, last_pk = 0, 0
+    while True:
+        # One short transaction per batch: it holds the shard's write lock,
+        # so no sale of these items lands between count and write, without
+        # stalling checkout for the whole scan
+        with transaction.atomic(using=using):
+            items = list(
+                Item.objects.using(using).filter(pk__gt=last_pk).order_by("pk")
+                .only("pk", "units_sold", "wishlist_count")[:RECONCILE_BATCH]
+            )
+            if not items:
+                return fixed
+            first_pk, last_pk = items[0].pk, items[-1].pk
+            sold = dict(
+                Transaction.objects.using(using).filter(item_id__gte=first_pk, item_id__lte=last_pk)
+                .values_list("item_id").annotate(n=Sum("quantity")).order_by()
+            )
+            wanted = dict(
+                Wishlist.objects.filter(item_id__gte=first_pk, item_id__lte=last_pk)
+                .values_list("item_id").annotate(n=Count("pk")).order_by()
+            )
+            stale = []
+            for item in items:
+                counts = ((sold.get(item.pk) or 0) + archived_units.get(item.pk, 0), wanted.get(item.pk) or 0)
+                if (item.units_sold, item.wishlist_count) != counts:
+                    item.units_sold, item.wishlist_count = counts
+                    stale.append(item)
+            Item.objects.using(using).bulk_update(stale, ["units_sold", "wishlist_count"])
+        fixed += len(stale)
+
+
+def _reconcile_shops(archived_revenue):
+    revenue, pending = dict(archived_revenue), {}
+    for queryset in sharding.each_shard(Transaction.objects.all()):
+        for seller_id, total in queryset.values_list("seller_id").annotate(n=Sum("total_price")).order_by():
+            revenue[seller_id] = revenue.get(seller_id, 0) + total
+    for queryset in sharding.each_shard(ItemRequest.objects.filter(status=PENDING)):
+        for shop_id, n in queryset.values_list("shop_id").annotate(n=Count("pk")).order_by():
+            pending[shop_id] = pending.get(shop_id, 0) + n
+    stale = []
+    for shop in Shop.objects.only("pk", "user_id", "revenue", "pending_requests").iterator():
+        counts = (Decimal(revenue.get(shop.user_id) or 0).quantize(Decimal("0.01")), pending.get(shop.pk, 0))
+        if (shop.revenue, shop.pending_requests) != counts:
+            shop.revenue, shop.pending_requests = counts
+            stale.append(shop)
+    Shop.objects.bulk_update(stale, ["revenue", "pending_requests"], batch_size=500)
+    return len(stale)
+
+
+def reconcile():
+    """Recompute every counter from the rows; returns how many rows were off."""
+    fixed = 0
+    # Archived sales are gone from Transaction but still count
+    archived_units, archived_revenue = archive.archived_totals()
+    for using in sharding.shard_aliases():
+        fixed += _reconcile_items(using, archived_units)
+    with transaction.atomic():
+        fixed += _reconcile_shops(archived_revenue)
+    if fixed:
+        logger.warning("Reconciled %s counters that had drifted", fixed)
+    return fixed
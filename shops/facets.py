@@ -0,0 +1,117 @@
+"""
+Search facets: price buckets and shops.
+
+For a filtered search both facets come from one GROUP BY over the
+filtered products. The unfiltered counts (the landing search page) are
+kept precomputed in FacetCount, adjusted by the Product signals, so
+rendering them never scans the product table.
+
+Bucket counts are stored under the bucket's lower edge; run
+``manage.py rebuild_facets`` after changing SEARCH_PRICE_EDGES.
+"""
+import bisect
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import FacetCount, Product
+
+PRICE = "price"
+SHOP = "shop"
+DEFAULT_PRICE_EDGES = [0, 50, 100, 250, 500, 1000, 2500, 5000]
+SIDEBAR_SHOPS = 10
+
+
+def price_edges():
+    return getattr(settings, "SEARCH_PRICE_EDGES", DEFAULT_PRICE_EDGES)
+
+
+def bucket_floor(price):
+    """Lower edge of the bucket a price falls in."""
+    edges = price_edges()
+    return edges[max(bisect.bisect_right(edges, price) - 1, 0)]
+
+
+def _bucket_expression():
+    edges = price_edges()
+    whens = [When(price__lt=upper, then=Value(lower)) for lower, upper in zip(edges, edges[1:])]
+    return Case(*whens, default=Value(edges[-1]), output_field=IntegerField())
+
+
+def _sidebar(price_counts, shop_counts):
+    edges = price_edges()
+    # Inclusive bounds, as the min_price/max_price filters take them
+    uppers = {lower: upper - 1 for lower, upper in zip(edges, edges[1:])}
+    return {
+        "price": [
+            {"min": floor, "max": uppers.get(floor), "count": price_counts[floor]}
+            for floor in edges if price_counts.get(floor)
+        ],
+        "shops": [
+            {"name": name, "count": count}
+            for name, count in sorted(shop_counts.items(), key=lambda kv: (-kv[1], kv[0]))[:SIDEBAR_SHOPS]
+        ],
+    }
+
+
+def facet_counts(products):
+    """Both facets for a filtered queryset in one grouped query."""
+    price_counts, shop_counts = {}, {}
+    rows = (
+        products.order_by().annotate(bucket=_bucket_expression())
+        .values_list("bucket", "shop_name").annotate(n=Count("id"))
+    )
+    for bucket, shop_name, n in rows:
+        price_counts[bucket] = price_counts.get(bucket, 0) + n
+        shop_counts[shop_name] = shop_counts.get(shop_name, 0) + n
+    return _sidebar(price_counts, shop_counts)
+
+
+def global_counts():
+    """Unfiltered facets from the precomputed table."""
+    price_counts, shop_counts = {}, {}
+    for facet, value, count in FacetCount.objects.filter(count__gt=0).values_list("facet", "value", "count"):
+        if facet == PRICE:
+            price_counts[int(value)] = count
+        else:
+            shop_counts[value] = count
+    return _sidebar(price_counts, shop_counts)
+
+
+def _adjust(facet, value, delta):
+    value = str(value)
+    if FacetCount.objects.filter(facet=facet, value=value).update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            FacetCount.objects.create(facet=facet, value=value, count=delta)
+    except IntegrityError:
+        # Created by a concurrent writer in the meantime
+        FacetCount.objects.filter(facet=facet, value=value).update(count=F("count") + delta)
+
+
+def record(old, new):
+    """
+    Move a product's contribution from its ``old`` (price, shop_name) to
+    its ``new`` one; either is None for creates and deletes.
+    """
+    if old == new:
+        return
+    if old is not None:
+        _adjust(PRICE, bucket_floor(old[0]), -1)
+        _adjust(SHOP, old[1], -1)
+    if new is not None:
+        _adjust(PRICE, bucket_floor(new[0]), 1)
+        _adjust(SHOP, new[1], 1)
+
+
+def rebuild():
+    """Recompute the precomputed counts from scratch (one grouped query)."""
+    facets = facet_counts(Product.objects.all())
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        rows = [FacetCount(facet=PRICE, value=str(b["min"]), count=b["count"]) for b in facets["price"]]
+        shop_counts = Product.objects.order_by().values_list("shop_name").annotate(n=Count("id"))
+        rows += [FacetCount(facet=SHOP, value=name, count=n) for name, n in shop_counts]
+        FacetCount.objects.bulk_create(rows)
@@ -0,0 +1,105 @@
+"""
+Shopkeeper fulfilment queue: the shop's paid orders to ship, shipped
+orders to mark delivered, and delivered ones.
+
+Each page is one range scan of order_shop_status_idx on the shop's shard,
+continued from the last id shown (``?after=<id>``) rather than an
+OFFSET, so the hundredth page of a busy shop costs what the first does.
+A bulk action moves the ticked orders on with one UPDATE; orders that
+moved on in the meantime (another tab, another staff member) are left
+out by the status condition instead of being moved twice.
+"""
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from . import sharding
+from .models import Order, Shop
+
+# Status shown -> the status its bulk action moves orders to
+TRANSITIONS = {Order.PAID: Order.SHIPPED, Order.SHIPPED: Order.DELIVERED}
+QUEUES = [Order.PAID, Order.SHIPPED, Order.DELIVERED]
+
+
+def _page_size():
+    return getattr(settings, "FULFILMENT_PAGE_SIZE", 100)
+
+
+def page(shop, status, after=None, limit=None):
+    """
+    ``(orders, next_after)``: a page of the shop's orders in ``status``.
+    Open queues run oldest first (first paid, first shipped); delivered
+    orders newest first. ``next_after`` is None on the last page.
+    """
+    limit = limit or _page_size()
+    newest_first = status not in TRANSITIONS
+    orders = (
+        sharding.for_shop(Order.objects, shop.pk).filter(shop=shop, status=status)
+        .select_related("item").prefetch_related("user")
+        .order_by("-pk" if newest_first else "pk")
+    )
+    if after is not None:
+        orders = orders.filter(**{"pk__lt" if newest_first else "pk__gt": after})
+    rows = list(orders[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].pk
+    return rows, None
+
+
+def advance(shop, status, order_ids):
+    """Move the shop's orders ``order_ids`` that are still in ``status`` on; returns how many moved."""
+    return (
+        sharding.for_shop(Order.objects, shop.pk)
+        .filter(shop=shop, status=status, pk__in=order_ids)
+        .update(status=TRANSITIONS[status])
+    )
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@login_required
+def fulfilment_queue(request):
+    """
+    GET ``shopkeeper/orders/?status=Paid&after=<id>``: a page of the queue.
+    POST ``status`` and ``order_ids``: mark those orders shipped/delivered.
+    """
+    try:
+        shop = request.user.shop
+    except Shop.DoesNotExist:
+        messages.error(request, "⚠️ You don’t have a shop linked to this account.")
+        return redirect("shops:home")
+
+    status = request.POST.get("status") or request.GET.get("status") or Order.PAID
+    if status not in QUEUES:
+        status = Order.PAID
+
+    if request.method == "POST":
+        order_ids = {pk for pk in map(_int_or_none, request.POST.getlist("order_ids")) if pk is not None}
+        if status not in TRANSITIONS or not order_ids:
+            messages.error(request, "⚠️ Select the orders to update.")
+        elif len(order_ids) > _page_size():
+            messages.error(request, f"⚠️ At most {_page_size()} orders at a time.")
+        else:
+            moved = advance(shop, status, order_ids)
+            messages.success(request, f"✅ {moved} order(s) marked {TRANSITIONS[status].lower()}.")
+            skipped = len(order_ids) - moved
+            if skipped:
+                messages.warning(request, f"{skipped} order(s) were no longer {status.lower()} and were left alone.")
+        return redirect(f"{reverse('shops:fulfilment_queue')}?status={status}")
+
+    orders, next_after = page(shop, status, _int_or_none(request.GET.get("after")))
+    return render(request, "shops/fulfilment.html", {
+        "shop": shop,
+        "status": status,
+        "queues": QUEUES,
+        "next_status": TRANSITIONS.get(status),
+        "orders": orders,
+        "next_after": next_after,
+    })
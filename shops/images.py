@@ -0,0 +1,105 @@
+"""
+Content-addressed product images. An upload is stored once under
+``blobs/<sha256>.<ext>`` however many items (or shops) use it, so the URL
+only changes when the picture does and can be cached forever.
+
+Every Item referencing a blob holds a count on its ImageBlob row, taken
+once the item's save commits (see the Item signals). A blob that drops
+to zero references is removed by ``collect_garbage`` once it has stayed
+unreferenced for IMAGE_BLOB_GRACE_SECONDS and no item points at it. An
+upload of the same picture touches the row before reusing the file
+(shops/storage.py), under the same write lock as the collector's delete,
+so it either restarts the grace period or finds the file gone and writes
+it again.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import sharding
+from .models import ImageBlob, Item
+from .storage import BLOB_PREFIX, product_images
+
+logger = logging.getLogger(__name__)
+
+GC_BATCH = 500
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def acquire(name):
+    """Count one more reference to the blob ``name``."""
+    if not is_blob(name):
+        return
+    if ImageBlob.objects.filter(name=name).update(refcount=F("refcount") + 1):
+        return
+    try:
+        size = product_images().size(name)
+    except OSError:
+        size = 0
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, size=size, refcount=1)
+    except IntegrityError:
+        # Registered by a concurrent upload in the meantime
+        ImageBlob.objects.filter(name=name).update(refcount=F("refcount") + 1)
+
+
+def release(name):
+    """Drop one reference; the blob is deleted later by ``collect_garbage``."""
+    if is_blob(name):
+        ImageBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F("refcount") - 1)
+
+
+def _references(items):
+    """{blob name: number of ``items`` (an Item queryset) using it}, over every shard."""
+    counts = {}
+    for queryset in sharding.each_shard(items):
+        for name, refs in queryset.values_list("image").annotate(refs=Count("pk")).order_by():
+            counts[name] = counts.get(name, 0) + refs
+    return counts
+
+
+def recount():
+    """Set every refcount from the items themselves (after bulk updates)."""
+    counts = _references(Item.objects.filter(image__startswith=BLOB_PREFIX))
+    storage = product_images()
+    for name, refs in counts.items():
+        if not ImageBlob.objects.filter(name=name).update(refcount=refs):
+            ImageBlob.objects.create(name=name, size=storage.size(name) if storage.exists(name) else 0, refcount=refs)
+    # Left to collect_garbage, which applies the grace period
+    ImageBlob.objects.exclude(name__in=counts).exclude(refcount=0).update(refcount=0)
+    return counts
+
+
+def collect_garbage():
+    """Delete blobs nobody has referenced for IMAGE_BLOB_GRACE_SECONDS."""
+    grace = timedelta(seconds=getattr(settings, "IMAGE_BLOB_GRACE_SECONDS", 3600))
+    cutoff = timezone.now() - grace
+    freed = 0
+    candidates = list(ImageBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff))
+    # A save counts its reference only once it commits; a blob an item
+    # already points at gets its count back instead of being deleted
+    used = {}
+    for start in range(0, len(candidates), GC_BATCH):
+        names = [blob.name for blob in candidates[start:start + GC_BATCH]]
+        used.update(_references(Item.objects.filter(image__in=names)))
+    for blob in candidates:
+        if blob.name in used:
+            ImageBlob.objects.filter(pk=blob.pk, refcount__lte=0).update(refcount=used[blob.name])
+            continue
+        with transaction.atomic():
+            # Re-acquired or touched by an upload since the query: leave it
+            if not ImageBlob.objects.filter(pk=blob.pk, refcount__lte=0, updated_at=blob.updated_at).delete()[0]:
+                continue
+            product_images().delete(blob.name)
+        freed += blob.size
+    if freed:
+        logger.info("Freed %s bytes of unreferenced images", freed)
+    return freed
@@ -0,0 +1,53 @@
+"""
+PDF invoices. Kept out of ``shops.views`` so reportlab is only imported
+by the worker that first serves an invoice (see ``shops.lazy``).
+"""
+from io import BytesIO
+
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from . import archive, sharding
+from .models import Order
+
+
+@login_required
+def download_invoice(request, order_id):
+    """Generate PDF invoice for an order"""
+    order = sharding.locate(
+        Order.objects.select_related("item").prefetch_related("user", "item__shop"),
+        pk=order_id, user=request.user,
+    ) or archive.get(archive.ORDERS, order_id, request.user.pk)
+    if order is None:
+        raise Http404("No such order")
+
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    # Invoice Header
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(200, height - 50, "INVOICE")
+
+    # Order Info
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 100, f"Invoice No: {order.id}")
+    p.drawString(50, height - 120, f"Customer: {order.user.username}")
+    p.drawString(50, height - 140, f"Shop: {order.item.shop.shop_name}")
+    p.drawString(50, height - 160, f"Item: {order.item.name}")
+    p.drawString(50, height - 180, f"Quantity: {order.quantity}")
+    p.drawString(50, height - 200, f"Total Price: ₹{order.total_price}")
+    p.drawString(50, height - 220, f"Payment Method: {order.payment_method}")
+    p.drawString(50, height - 240, f"Order Date: {order.created_at.strftime('%d-%m-%Y %H:%M')}")
+
+    # Footer
+    p.setFont("Helvetica-Oblique", 10)
+    p.drawString(50, 50, "Thank you for shopping with us!")
+
+    p.showPage()
+    p.save()
+
+    buffer.seek(0)
+    return FileResponse(buffer, as_attachment=True, filename=f"invoice_{order.id}.pdf")
@@ -0,0 +1,18 @@
+from django.utils.module_loading import import_string
+
+
+def lazy_view(dotted_path):
+    """
+    URLconf entry for a view whose module (and its heavy imports) should
+    only be loaded when the view is first requested.
+    """
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path)
+        return view(request, *args, **kwargs)
+
+    wrapper.lazy_view_path = dotted_path
+    return wrapper
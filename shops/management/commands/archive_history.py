@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shops import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move delivered orders and sales older than --days (default ARCHIVE_AFTER_DAYS) "
+        "to compressed segment files in ARCHIVE_DIR and delete them from the tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=getattr(settings, "ARCHIVE_AFTER_DAYS", 365))
+        parser.add_argument("--kind", choices=sorted(archive.KINDS), help="Only orders or only transactions.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be moved.")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        for kind in [options["kind"]] if options["kind"] else archive.KINDS:
+            moved = archive.archive(kind, before, dry_run=options["dry_run"])
+            verb = "would move" if options["dry_run"] else "moved"
+            self.stdout.write(f"{kind}: {verb} {moved} rows older than {before:%Y-%m-%d}")
+        self.stdout.write(self.style.SUCCESS("Done."))
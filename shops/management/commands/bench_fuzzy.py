@@ -0,0 +1,86 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from shops.search_index import FUZZY_THRESHOLD, PrefixIndex, normalize, trigrams
+
+
+def _word(rng):
+    # Alternate consonants and vowels so words look like product names
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    return "".join(rng.choice(consonants if i % 2 == 0 else vowels) for i in range(rng.randint(4, 10)))
+
+
+def _typo(rng, name):
+    words = name.split()
+    w = rng.randrange(len(words))
+    word = words[w]
+    i = rng.randrange(len(word))
+    kind = rng.choice(["delete", "insert", "replace", "swap"])
+    if kind == "delete" and len(word) > 3:
+        word = word[:i] + word[i + 1:]
+    elif kind == "insert":
+        word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+    elif kind == "swap" and i < len(word) - 1:
+        word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    else:
+        word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+    words[w] = word
+    return " ".join(words)
+
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark typo-tolerant item name lookups on a synthetic catalog (no database needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--names", type=int, default=200_000, help="Catalog size.")
+        parser.add_argument("--vocabulary", type=int, default=30_000, help="Distinct words names are made of.")
+        parser.add_argument("--queries", type=int, default=2_000, help="Misspelt lookups to time.")
+        parser.add_argument("--threshold", type=float, default=FUZZY_THRESHOLD)
+        parser.add_argument("--scan-queries", type=int, default=20, help="Lookups to time as a full scan, for comparison.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = [_word(rng) for _ in range(options["vocabulary"])]
+        names = [" ".join(rng.sample(vocabulary, rng.randint(1, 3))) for _ in range(options["names"])]
+
+        started = time.perf_counter()
+        index = PrefixIndex()
+        index._max_names = len(names)
+        index.begin_bulk()
+        for item_id, name in enumerate(names, start=1):
+            index.set(item_id, name, rng.randint(0, 50))
+        index.finish_bulk()
+        self.stdout.write(f"Indexed {len(names)} names in {time.perf_counter() - started:.1f} s")
+
+        targets = rng.sample(names, min(options["queries"], len(names)))
+        queries = [_typo(rng, name) for name in targets]
+        timings, found = [], 0
+        for target, query in zip(targets, queries):
+            started = time.perf_counter()
+            results = index.similar(query, 5, options["threshold"])
+            timings.append((time.perf_counter() - started) * 1000)
+            found += any(normalize(name) == normalize(target) for name, _, _, _ in results)
+        timings.sort()
+        self.stdout.write(
+            f"Indexed lookup: p50 {_percentile(timings, 50):.2f} ms, p95 {_percentile(timings, 95):.2f} ms, "
+            f"p99 {_percentile(timings, 99):.2f} ms, max {timings[-1]:.2f} ms"
+        )
+        self.stdout.write(f"Recall@5: {found / len(queries):.1%} of misspelt names found")
+
+        # The same scoring over every name, i.e. what a table scan would cost
+        scan = queries[:options["scan_queries"]]
+        all_grams = [trigrams(normalize(name)) for name in names]
+        started = time.perf_counter()
+        for query in scan:
+            grams = trigrams(normalize(query))
+            [2 * len(grams & other) / (len(grams) + len(other)) for other in all_grams]
+        per_query = (time.perf_counter() - started) * 1000 / max(len(scan), 1)
+        self.stdout.write(f"Full scan for comparison: {per_query:.1f} ms per lookup")
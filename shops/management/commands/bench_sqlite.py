@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from product_check.sqlite_backend.base import DEFAULT_PRAGMAS, pragma_statements
+
+SCHEMA = [
+    "CREATE TABLE item (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL, price REAL NOT NULL)",
+    "CREATE TABLE cart_order (id INTEGER PRIMARY KEY AUTOINCREMENT, item_id INTEGER, quantity INTEGER, total REAL)",
+    "CREATE INDEX cart_order_item ON cart_order (item_id)",
+]
+
+# (label, pragmas, BEGIN statement). "stock" mirrors Django's default sqlite3
+# connection: rollback journal, Python's 5 s default timeout, deferred BEGIN.
+PROFILES = [
+    ("stock", {"busy_timeout": 5000}, "BEGIN"),
+    ("tuned", DEFAULT_PRAGMAS, "BEGIN IMMEDIATE"),
+]
+
+
+def _connect(path, pragmas):
+    # Lock waits are governed by each profile's busy_timeout pragma
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    for statement in pragma_statements(pragmas):
+        conn.execute(statement)
+    return conn
+
+
+def _writer(path, pragmas, begin, ops, items, seed, results):
+    conn = _connect(path, pragmas)
+    done = errors = 0
+    for i in range(ops):
+        item_id = (seed * 7919 + i) % items + 1
+        try:
+            # Same shape as a cart update: read stock, write stock, write order
+            conn.execute(begin)
+            (quantity,) = conn.execute("SELECT quantity FROM item WHERE id = ?", (item_id,)).fetchone()
+            conn.execute("UPDATE item SET quantity = ? WHERE id = ?", (quantity - 1, item_id))
+            conn.execute("INSERT INTO cart_order (item_id, quantity, total) VALUES (?, 1, 9.5)", (item_id,))
+            conn.execute("COMMIT")
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    results.put((done, errors))
+
+
+def _reader(path, pragmas, stop, results):
+    conn = _connect(path, pragmas)
+    reads = errors = 0
+    while not stop.is_set():
+        try:
+            conn.execute("SELECT COUNT(*), SUM(total) FROM cart_order").fetchone()
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    results.put((reads, errors))
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite write throughput under concurrent writers: stock settings vs the tuned backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--ops", type=int, default=300, help="Transactions per writer.")
+        parser.add_argument("--items", type=int, default=1000)
+
+    def run_profile(self, directory, label, pragmas, begin, options):
+        path = os.path.join(directory, f"{label}.sqlite3")
+        conn = _connect(path, pragmas)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.executemany(
+            "INSERT INTO item (id, quantity, price) VALUES (?, 1000000, 9.5)",
+            [(i,) for i in range(1, options["items"] + 1)],
+        )
+        conn.close()
+
+        ctx = multiprocessing.get_context("spawn")
+        writer_results, reader_results, stop = ctx.Queue(), ctx.Queue(), ctx.Event()
+        readers = [ctx.Process(target=_reader, args=(path, pragmas, stop, reader_results))
+                   for _ in range(options["readers"])]
+        writers = [ctx.Process(target=_writer, args=(path, pragmas, begin, options["ops"], options["items"], n, writer_results))
+                   for n in range(options["writers"])]
+        for p in readers:
+            p.start()
+        started = time.perf_counter()
+        for p in writers:
+            p.start()
+        writes = [writer_results.get() for _ in writers]
+        elapsed = time.perf_counter() - started
+        stop.set()
+        reads = [reader_results.get() for _ in readers]
+        for p in writers + readers:
+            p.join()
+
+        committed = sum(d for d, _ in writes)
+        return {
+            "label": label,
+            "seconds": elapsed,
+            "committed": committed,
+            "write_errors": sum(e for _, e in writes),
+            "writes_per_s": committed / elapsed,
+            "reads_per_s": sum(r for r, _ in reads) / elapsed,
+            "read_errors": sum(e for _, e in reads),
+        }
+
+    def handle(self, *args, **options):
+        attempted = options["writers"] * options["ops"]
+        self.stdout.write(
+            f"{options['writers']} writers x {options['ops']} txns, {options['readers']} readers "
+            f"({attempted} write transactions attempted per profile)"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            results = [self.run_profile(directory, *profile, options) for profile in PROFILES]
+
+        self.stdout.write(f"{'profile':<8} {'secs':>7} {'commits':>8} {'w-errors':>9} {'writes/s':>9} {'reads/s':>9} {'r-errors':>9}")
+        for r in results:
+            self.stdout.write(
+                f"{r['label']:<8} {r['seconds']:7.2f} {r['committed']:8d} {r['write_errors']:9d} "
+                f"{r['writes_per_s']:9.0f} {r['reads_per_s']:9.0f} {r['read_errors']:9d}"
+            )
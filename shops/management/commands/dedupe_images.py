@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from shops import images, sharding
+from shops.models import Item
+from shops.storage import BLOB_PREFIX, product_images
+
+
+class Command(BaseCommand):
+    help = (
+        "Move product images uploaded before content-addressed storage into blobs/ "
+        "(one file per distinct picture) and recount the blob references."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-originals", action="store_true", help="Don't delete the old files.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = product_images()
+        legacy = Item.objects.exclude(image="").exclude(image__isnull=True).exclude(image__startswith=BLOB_PREFIX)
+        moved = {}
+        missing = 0
+        for queryset in sharding.each_shard(legacy):
+            for pk, name in queryset.values_list("pk", "image").iterator():
+                if name not in moved:
+                    if not storage.exists(name):
+                        missing += 1
+                        continue
+                    if options["dry_run"]:
+                        moved[name] = None
+                        continue
+                    with storage.open(name) as f:
+                        moved[name] = storage.save(os.path.basename(name), f)
+                if not options["dry_run"]:
+                    # Only if the image wasn't changed meanwhile
+                    queryset.filter(pk=pk, image=name).update(image=moved[name])
+
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} items point at missing files; left as they are."))
+        before = sum(storage.size(name) for name in moved)
+        if options["dry_run"]:
+            self.stdout.write(f"{len(moved)} files, {before} bytes to move.")
+            return
+        blobs = set(moved.values())
+        after = sum(storage.size(blob) for blob in blobs)
+        self.stdout.write(f"{len(moved)} files, {before} bytes -> {len(blobs)} blobs, {after} bytes")
+
+        counts = images.recount()
+        self.stdout.write(f"{len(counts)} blobs referenced.")
+        if not options["keep_originals"]:
+            for name in moved:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a gunicorn worker imports before it can serve a request
+BOOT_SNIPPET = (
+    "import django; django.setup(); "
+    "import product_check.wsgi; "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+DEFAULT_FORBIDDEN = ["reportlab", "xhtml2pdf", "pandas", "numpy", "openai", "google.generativeai"]
+
+
+def parse_importtime(stderr):
+    """
+    Parse ``-X importtime`` output into (module, self_us, cumulative_us, depth)
+    rows. Depth is the nesting level shown by the indentation.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((stripped, int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Measure worker boot import time with -X importtime and fail past a budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget-ms", type=float,
+            default=getattr(settings, "IMPORT_TIME_BUDGET_MS", 500),
+            help="Fail if total boot import time exceeds this (default from IMPORT_TIME_BUDGET_MS).",
+        )
+        parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to list.")
+        parser.add_argument("--runs", type=int, default=3, help="Take the fastest of N runs to reduce noise.")
+        parser.add_argument("--json", dest="json_path", help="Also write the report to this file.")
+
+    def measure(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "product_check.settings"))
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SNIPPET],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Boot failed:\n{result.stderr[-2000:]}")
+        return parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self.measure() for _ in range(max(1, options["runs"]))]
+        rows = min(runs, key=lambda r: sum(c for _, _, c, depth in r if depth == 0))
+
+        total_ms = sum(c for _, _, c, depth in rows if depth == 0) / 1000
+        forbidden = getattr(settings, "IMPORT_TIME_FORBIDDEN", DEFAULT_FORBIDDEN)
+        leaked = [
+            mod for mod in forbidden
+            if any(name == mod or name.startswith(mod + ".") for name, _, _, _ in rows)
+        ]
+        slowest = sorted(rows, key=lambda r: r[1], reverse=True)[:options["top"]]
+
+        self.stdout.write(f"Boot import time: {total_ms:.1f} ms across {len(rows)} modules")
+        self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+        for name, self_us, cumulative_us, _ in slowest:
+            self.stdout.write(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump({
+                    "total_ms": total_ms,
+                    "budget_ms": options["budget_ms"],
+                    "forbidden_imported": leaked,
+                    "modules": [
+                        {"module": n, "self_us": s, "cumulative_us": c, "depth": d} for n, s, c, d in rows
+                    ],
+                }, fh, indent=2)
+
+        if leaked:
+            raise CommandError(f"Heavy modules imported at boot: {', '.join(leaked)}")
+        if total_ms > options["budget_ms"]:
+            raise CommandError(f"Boot import time {total_ms:.1f} ms exceeds budget of {options['budget_ms']:.0f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Within budget ({options['budget_ms']:.0f} ms)."))
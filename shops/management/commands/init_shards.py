@@ -0,0 +1,29 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shops import sharding
+from shops.models import Item, ItemRequest, Order, PriceChange, StockMovement, StockSnapshot, Transaction
+
+
+class Command(BaseCommand):
+    help = "Migrate every shard database and seed its primary key range (see shops/sharding.py)."
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            self.stdout.write("SHARD_COUNT is 1; nothing to do.")
+            return
+
+        for index, alias in enumerate(sharding.shard_aliases()):
+            call_command("migrate", database=alias, verbosity=0)
+            floor = index << sharding.ID_SHIFT
+            with connections[alias].cursor() as cursor:
+                for model in (Item, ItemRequest, Order, Transaction, StockMovement, StockSnapshot, PriceChange):
+                    table = model._meta.db_table
+                    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                    row = cursor.fetchone()
+                    if row is None:
+                        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, floor])
+                    elif row[0] < floor:
+                        cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [floor, table])
+            self.stdout.write(f"{alias}: ready, ids from {floor + 1}")
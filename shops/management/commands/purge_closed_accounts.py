@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shops.closure import purge_account
+from shops.models import AccountClosure
+
+
+class Command(BaseCommand):
+    help = "Finish account purges that were interrupted (pending, running or failed)."
+
+    def handle(self, *args, **options):
+        closures = AccountClosure.objects.exclude(status="done").order_by("id")
+        for closure in closures:
+            self.stdout.write(f"Purging {closure.username} (from step '{closure.current_step or 'start'}')")
+            purge_account(closure.pk)
+        self.stdout.write(self.style.SUCCESS("Done."))
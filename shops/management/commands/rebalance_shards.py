@@ -0,0 +1,209 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+
+from shops import archive, changes, sharding, stock, versions
+from shops.models import (
+    CartItem, Item, ItemRequest, Notification, Order, PriceChange, Recommendation, ShardAssignment, Shop,
+    StockMovement, StockSnapshot, Transaction, Wishlist,
+)
+
+# Columns of the moved tables that point at other moved rows
+REFERENCES = {
+    ItemRequest: {"item_id": Item},
+    Order: {"item_id": Item},
+    Transaction: {"item_id": Item},
+    StockMovement: {"item_id": Item, "order_id": Order, "sale_id": Transaction},
+    PriceChange: {"item_id": Item},
+}
+# Rows on "default" that point at items
+ITEM_REFERENCES = [
+    (CartItem, "product_id"), (Notification, "item_id"), (Recommendation, "item_id"), (Wishlist, "item_id"),
+]
+
+
+def shop_rows(shop_id):
+    """Sharded rows owned by a shop, parents first."""
+    return [
+        (Item, Q(shop_id=shop_id)),
+        (ItemRequest, Q(shop_id=shop_id)),
+        (Order, Q(shop_id=shop_id) | Q(item__shop_id=shop_id)),
+        (Transaction, Q(item__shop_id=shop_id)),
+        (StockMovement, Q(item__shop_id=shop_id)),
+        (StockSnapshot, Q(item__shop_id=shop_id)),
+        (PriceChange, Q(item__shop_id=shop_id)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move shops between shards.\n"
+        "  --pin              after changing SHARD_COUNT: pin every shop to where its rows are now\n"
+        "  (no options)       move pinned shops to their hash shard, then drop the pin\n"
+        "  --shop ID --to DB  move one shop to a given shard and pin it there\n"
+        "Pause writes for a shop while it is being moved.\n"
+        "Moved rows get new ids from the target shard (so each shard keeps handing\n"
+        "out ids from its own range); references to them are updated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pin", action="store_true")
+        parser.add_argument("--shop", type=int)
+        parser.add_argument("--to")
+        parser.add_argument("--limit", type=int, default=0, help="Move at most N shops in this run.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            raise CommandError("Sharding is off (SHARD_COUNT = 1).")
+        self.chunk_size = options["chunk_size"]
+        self.dry_run = options["dry_run"]
+
+        if options["pin"]:
+            self.pin_all()
+        elif options["shop"] is not None:
+            if options["to"] not in sharding.shard_aliases():
+                raise CommandError(f"--to must be one of {', '.join(sharding.shard_aliases())}")
+            self.move(options["shop"], options["to"], keep_pin=True)
+        else:
+            self.rebalance(options["limit"])
+
+    def locate_shop(self, shop_id):
+        """{alias: row count} for every shard holding rows of the shop."""
+        found = {}
+        for alias in sharding.shard_aliases():
+            count = sum(model.objects.using(alias).filter(q).count() for model, q in shop_rows(shop_id))
+            if count:
+                found[alias] = count
+        return found
+
+    def pin_all(self):
+        pinned = 0
+        for shop_id in Shop.objects.using(sharding.PRIMARY).values_list("pk", flat=True).iterator():
+            found = self.locate_shop(shop_id)
+            if not found:
+                continue
+            if len(found) > 1:
+                self.stderr.write(f"Shop {shop_id} has rows on several shards {found}; finish its move first.")
+            current = max(found, key=found.get)
+            if current != sharding.home_shard(shop_id):
+                if not self.dry_run:
+                    ShardAssignment.objects.using(sharding.PRIMARY).update_or_create(
+                        shop_id=shop_id, defaults={"alias": current}
+                    )
+                pinned += 1
+        sharding.invalidate_assignments()
+        self.stdout.write(self.style.SUCCESS(f"Pinned {pinned} shops to their current shard."))
+
+    def rebalance(self, limit):
+        moved = 0
+        for assignment in ShardAssignment.objects.using(sharding.PRIMARY).order_by("shop_id"):
+            home = sharding.home_shard(assignment.shop_id)
+            if assignment.alias == home:
+                if not self.dry_run:
+                    assignment.delete()
+                continue
+            self.move(assignment.shop_id, home, keep_pin=False)
+            moved += 1
+            if limit and moved >= limit:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} shops."))
+
+    def copy_rows(self, model, condition, source, target, new_ids):
+        """
+        Copy rows to ``target`` under ids it hands out, in their old order.
+        Records old id -> new id in ``new_ids[model]`` and points columns
+        at the copies of rows copied before (parents come first).
+        """
+        copied, last_pk = 0, None
+        references = REFERENCES.get(model, {})
+        while True:
+            qs = model.objects.using(source).filter(condition).order_by("pk")
+            if last_pk is not None:
+                qs = qs.filter(pk__gt=last_pk)
+            batch = list(qs[:self.chunk_size])
+            if not batch:
+                return copied
+            last_pk = batch[-1].pk
+            old_pks = [obj.pk for obj in batch]
+            for obj in batch:
+                obj.pk = None
+                for column, parent in references.items():
+                    value = getattr(obj, column)
+                    setattr(obj, column, new_ids[parent].get(value, value))
+            with transaction.atomic(using=target):
+                model.objects.using(target).bulk_create(batch)
+            new_ids[model].update(zip(old_pks, (obj.pk for obj in batch)))
+            copied += len(batch)
+
+    def repoint_items(self, shop_id, sources, target, item_ids):
+        """Point everything outside the shard that names a moved item by id at its new id."""
+        pairs = list(item_ids.items())
+        users = set()
+        for start in range(0, len(pairs), self.chunk_size):
+            chunk = dict(pairs[start:start + self.chunk_size])
+            with transaction.atomic(using=sharding.PRIMARY):
+                for model, column in ITEM_REFERENCES:
+                    rows = model.objects.using(sharding.PRIMARY).filter(**{f"{column}__in": chunk})
+                    if model is Wishlist:
+                        users.update(rows.values_list("user_id", flat=True))
+                    rows.update(**{column: Case(
+                        *[When(**{column: old_id}, then=Value(new_id)) for old_id, new_id in chunk.items()]
+                    )})
+            items = Item.objects.using(target).filter(pk__in=chunk.values())
+            changes.record_renumbered(items, {new_id: old_id for old_id, new_id in chunk.items()})
+        archive.renumber_items(sources, item_ids)
+        # Cached pages link to items by id
+        requesters = set(ItemRequest.objects.using(target).filter(shop_id=shop_id).values_list("user_id", flat=True))
+        versions.bump(
+            versions.ITEM_NAMES, versions.shop_requests(shop_id),
+            *map(versions.wishlist, users), *map(versions.user_requests, requesters),
+        )
+
+    def delete_rows(self, model, condition, source):
+        while True:
+            pks = list(model.objects.using(source).filter(condition).values_list("pk", flat=True)[:self.chunk_size])
+            if not pks:
+                return
+            with transaction.atomic(using=source):
+                # No cascade and no delete signals: the rows live on in the target
+                model.objects.using(source).filter(pk__in=pks)._raw_delete(source)
+
+    def move(self, shop_id, target, keep_pin):
+        found = self.locate_shop(shop_id)
+        sources = [alias for alias in found if alias != target]
+        self.stdout.write(f"Shop {shop_id}: {found or 'no rows'} -> {target}")
+        if self.dry_run:
+            return
+
+        new_ids = {model: {} for model, _ in shop_rows(shop_id)}
+        for source in sources:
+            for model, condition in shop_rows(shop_id):
+                # Snapshots are retaken below from the copied movements
+                if model is StockSnapshot:
+                    continue
+                copied = self.copy_rows(model, condition, source, target, new_ids)
+                self.stdout.write(f"  copied {copied} {model._meta.verbose_name_plural} from {source}")
+        if sources:
+            self.repoint_items(shop_id, sources, target, new_ids[Item])
+
+        # Switch routing before deleting, so reads never see the shop empty
+        if keep_pin or target != sharding.home_shard(shop_id):
+            ShardAssignment.objects.using(sharding.PRIMARY).update_or_create(
+                shop_id=shop_id, defaults={"alias": target}
+            )
+        else:
+            ShardAssignment.objects.using(sharding.PRIMARY).filter(shop_id=shop_id).delete()
+        sharding.invalidate_assignments()
+        # Other workers cache the shard map for SHARD_MAP_TTL seconds
+        time.sleep(getattr(settings, "SHARD_MAP_TTL", 5))
+
+        for source in sources:
+            for model, condition in reversed(shop_rows(shop_id)):
+                self.delete_rows(model, condition, source)
+        if sources:
+            stock.snapshot([target])
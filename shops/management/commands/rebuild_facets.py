@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shops import facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed search facet counts (e.g. after changing SEARCH_PRICE_EDGES)."
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shops import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales, revenue, pending request and wishlist counters of every item and shop."
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Done ({fixed} rows corrected)."))
@@ -0,0 +1,67 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from shops import schedule, tasks
+
+
+def _child(stop, poll):
+    # Ctrl-C reaches the whole process group; the supervisor sets ``stop``
+    # and each child finishes its current job first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tasks.work(stop, poll=poll)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs and queue periodic ones (see shops/tasks.py and shops/schedule.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=getattr(settings, "SHOPS_WORKER_PROCESSES", 2),
+            help="Worker processes to keep running.",
+        )
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between claims while the queue is empty.")
+        parser.add_argument("--no-schedule", action="store_true", help="Don't queue SHOPS_SCHEDULE tasks from this node.")
+        parser.add_argument("--once", action="store_true", help="Queue due periodic tasks, drain the queue in this process and exit.")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            if not options["no_schedule"]:
+                schedule.run_due()
+            tasks.work(threading.Event(), once=True)
+            return
+
+        # fork: children inherit the loaded project instead of re-importing it
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        # Setting the shared Event from a handler can deadlock on its lock
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.append(True))
+
+        children = []
+        self.stdout.write(f"Starting {options['processes']} worker process(es)")
+        while not stopping:
+            children = [child for child in children if child.is_alive()]
+            while len(children) < options["processes"]:
+                # Forked children must not share the parent's connections
+                connections.close_all()
+                child = context.Process(target=_child, args=(stop, options["poll"]), daemon=True)
+                child.start()
+                children.append(child)
+            if not options["no_schedule"]:
+                close_old_connections()
+                for name in schedule.run_due():
+                    self.stdout.write(f"Queued periodic task {name}")
+            time.sleep(1)
+
+        self.stdout.write("Stopping: waiting for running jobs to finish")
+        stop.set()
+        for child in children:
+            child.join()
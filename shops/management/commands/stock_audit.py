@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from shops import sharding, stock
+from shops.models import Item
+
+
+class Command(BaseCommand):
+    help = "List items whose quantity differs from their stock ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shop", type=int, help="Only this shop's items.")
+        parser.add_argument("--snapshot", action="store_true", help="Take stock snapshots first.")
+
+    def handle(self, *args, **options):
+        if options["snapshot"]:
+            self.stdout.write(f"{stock.snapshot()} snapshots taken.")
+        items = Item.objects.all()
+        if options["shop"] is not None:
+            shards = [sharding.for_shop(items, options["shop"]).filter(shop_id=options["shop"])]
+        else:
+            shards = sharding.each_shard(items)
+        drifted = 0
+        for queryset in shards:
+            for item, ledger in stock.drift(queryset):
+                drifted += 1
+                self.stdout.write(f"item {item.pk} ({item.name}): quantity {item.quantity}, ledger {ledger}")
+        if drifted:
+            self.stdout.write(self.style.WARNING(f"{drifted} items differ from the ledger."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every item matches its ledger."))
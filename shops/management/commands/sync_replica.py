@@ -0,0 +1,39 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the read replica file with the online backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep syncing every N seconds (keep below REPLICA_PIN_SECONDS). 0 = sync once.",
+        )
+
+    def sync_once(self, primary_path, replica_path):
+        started = time.perf_counter()
+        source = sqlite3.connect(primary_path)
+        target = sqlite3.connect(replica_path, timeout=30)
+        try:
+            # pages=-1: one step, so the replica only ever sees a consistent snapshot
+            source.backup(target, pages=-1)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(f"Replica synced in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def handle(self, *args, **options):
+        if "replica" not in settings.DATABASES:
+            raise CommandError("No replica configured (set REPLICA_DB_PATH).")
+        primary_path = str(settings.DATABASES["default"]["NAME"])
+        replica_path = str(settings.DATABASES["replica"]["NAME"])
+
+        while True:
+            self.sync_once(primary_path, replica_path)
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:24
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0010_order_user_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('item', 'Item'), ('shop', 'Shop')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('shop_id', models.IntegerField()),
+                ('op', models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('stock', 'Stock changed'), ('delete', 'Deleted')], max_length=10)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shop_id', 'id'], name='catalogchange_shop_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:38
+
+import bisect
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_counts(apps, schema_editor):
+    # Same bucketing as shops.facets.bucket_floor, frozen for the migration
+    Product = apps.get_model('shops', 'Product')
+    FacetCount = apps.get_model('shops', 'FacetCount')
+    edges = getattr(settings, 'SEARCH_PRICE_EDGES', [0, 50, 100, 250, 500, 1000, 2500, 5000])
+    prices, shops = Counter(), Counter()
+    for price, shop_name in Product.objects.values_list('price', 'shop_name').iterator():
+        prices[edges[max(bisect.bisect_right(edges, price) - 1, 0)]] += 1
+        shops[shop_name] += 1
+    FacetCount.objects.bulk_create(
+        [FacetCount(facet='price', value=str(floor), count=n) for floor, n in prices.items()]
+        + [FacetCount(facet='shop', value=name, count=n) for name, n in shops.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0012_resourceversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=200)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='facetcount_facet_value_uniq'),
+        ),
+        migrations.RunPython(seed_counts, migrations.RunPython.noop),
+    ]
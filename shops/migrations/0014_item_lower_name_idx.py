@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:39
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0013_facetcount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='item_lower_name_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0015_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='itemrequest',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:52
+
+from django.db import migrations, models
+import shops.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0016_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shops.storage.product_images, upload_to='products/'),
+        ),
+    ]
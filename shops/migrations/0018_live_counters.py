@@ -0,0 +1,72 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def seed_counters(apps, schema_editor):
+    # Same sums as shops.counters.reconcile, within this database only: with
+    # sharding, run `manage.py reconcile_counters` once all shards are migrated
+    db = schema_editor.connection.alias
+    Item = apps.get_model('shops', 'Item')
+    Shop = apps.get_model('shops', 'Shop')
+    Transaction = apps.get_model('shops', 'Transaction')
+    Wishlist = apps.get_model('shops', 'Wishlist')
+    ItemRequest = apps.get_model('shops', 'ItemRequest')
+
+    def total(queryset, field, expression):
+        return Coalesce(Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=expression).values('n')
+        ), 0)
+
+    Item.objects.using(db).update(
+        units_sold=total(Transaction.objects.using(db), 'item', Sum('quantity')),
+        wishlist_count=total(Wishlist.objects.using(db), 'item', Count('pk')),
+    )
+    Shop.objects.using(db).update(
+        revenue=Coalesce(Subquery(
+            Transaction.objects.using(db).filter(seller=OuterRef('user')).order_by()
+            .values('seller').annotate(n=Sum('total_price')).values('n')
+        ), 0),
+        pending_requests=total(ItemRequest.objects.using(db).filter(status='Pending'), 'shop', Count('pk')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0017_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='units_sold',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='wishlist_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='pending_requests',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['shop', '-units_sold'], name='item_shop_units_sold_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['-wishlist_count'], name='item_wishlist_count_idx'),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:57
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0018_live_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('alias', models.CharField(max_length=50)),
+                ('path', models.CharField(max_length=255)),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('rows', models.IntegerField(default=0)),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('totals', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchiveEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('user_id', models.IntegerField()),
+                ('offset', models.BigIntegerField(null=True)),
+                ('length', models.BigIntegerField(null=True)),
+                ('rows', models.IntegerField(default=0)),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='shops.archivesegment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'user_id', 'last_at'], name='archiveentry_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.23 on 2026-10-19 15:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def open_ledger(apps, schema_editor):
+    # Every existing item starts the ledger with its current quantity
+    db = schema_editor.connection.alias
+    Item = apps.get_model('shops', 'Item')
+    StockMovement = apps.get_model('shops', 'StockMovement')
+    batch = []
+    for item_id, quantity in Item.objects.using(db).exclude(quantity=0).values_list('item_id', 'quantity').iterator():
+        batch.append(StockMovement(item_id=item_id, delta=quantity, reason='opening'))
+        if len(batch) >= 500:
+            StockMovement.objects.using(db).bulk_create(batch)
+            batch = []
+    StockMovement.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0019_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('movement_id', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('item', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shops.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'movement_id'], name='stocksnap_item_movement_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shops.item')),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shops.order')),
+                ('sale', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shops.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'created_at'], name='stockmove_item_created_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
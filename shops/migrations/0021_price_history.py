@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-19 15:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_prices(apps, schema_editor):
+    # The current price, as of the item's last save: the earliest time it is known to hold
+    db = schema_editor.connection.alias
+    Item = apps.get_model('shops', 'Item')
+    PriceChange = apps.get_model('shops', 'PriceChange')
+    batch = []
+    for item_id, price, updated_at in Item.objects.using(db).values_list('item_id', 'price', 'updated_at').iterator():
+        batch.append(PriceChange(item_id=item_id, price=price, changed_at=updated_at))
+        if len(batch) >= 500:
+            PriceChange.objects.using(db).bulk_create(batch)
+            batch = []
+    PriceChange.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0020_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shops.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'changed_at'], name='pricechange_item_changed_idx')],
+            },
+        ),
+        migrations.RunPython(seed_prices, migrations.RunPython.noop),
+    ]
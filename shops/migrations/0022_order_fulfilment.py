@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-19 15:03
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_shop(apps, schema_editor):
+    # Checkout used to leave Order.shop unset; an order's item is on its shard
+    db = schema_editor.connection.alias
+    Item = apps.get_model('shops', 'Item')
+    Order = apps.get_model('shops', 'Order')
+    Order.objects.using(db).filter(shop__isnull=True, item__isnull=False).update(
+        shop_id=Subquery(Item.objects.using(db).filter(pk=OuterRef('item_id')).values('shop_id')[:1]),
+    )
+    # Rows saved with the old lowercase default
+    for old, new in (('pending', 'Pending'), ('shipped', 'Shipped'), ('delivered', 'Delivered')):
+        Order.objects.using(db).filter(status=old).update(status=new)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0021_price_history'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Paid', 'Paid'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered')], default='Pending', max_length=20),
+        ),
+        migrations.RunPython(backfill_shop, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shop', 'status'], name='order_shop_status_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-19 15:34
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def backfill_name_key(apps, schema_editor):
+    # Same normalisation as shops.models.name_key at the time of writing
+    db = schema_editor.connection.alias
+    Item = apps.get_model('shops', 'Item')
+    batch = []
+    for item in Item.objects.using(db).only('pk', 'name').iterator(chunk_size=2000):
+        item.name_key = unicodedata.normalize('NFKC', item.name).casefold().strip()
+        batch.append(item)
+        if len(batch) >= 2000:
+            Item.objects.using(db).bulk_update(batch, ['name_key'])
+            batch = []
+    Item.objects.using(db).bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0023_cross_shard_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_lower_name_idx',
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_name_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['name_key'], name='item_name_key_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from django.core.exceptions import ValidationError
+from django.db.models.fields.files import FieldFile
+
+
+class DirtyFieldsMixin:
+    """
+    Remember the column values a model instance was loaded (or last saved)
+    with, so ``save()`` only writes the columns that actually changed and
+    skips the UPDATE entirely when nothing did.
+
+    Explicit ``update_fields``, ``force_insert`` or a different ``using``
+    fall back to Django's normal behaviour.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get("fields", args[1] if len(args) > 1 else None)
+        # A lazy load of one deferred field must not mark other edits clean
+        self._snapshot(fields)
+
+    def _current_value(self, field):
+        value = self.__dict__[field.attname]
+        if isinstance(value, FieldFile):
+            value = value.name
+        return value
+
+    def _snapshot(self, fields=None):
+        if fields is None or not hasattr(self, "_original_state"):
+            self._original_state = {}
+        wanted = set(fields) if fields is not None else None
+        for field in self._meta.concrete_fields:
+            if wanted is not None and field.name not in wanted and field.attname not in wanted:
+                continue
+            if field.attname in self.__dict__:
+                self._original_state[field.attname] = self._current_value(field)
+
+    def _differs(self, field, original):
+        current = self._current_value(field)
+        if current == original:
+            return False
+        try:
+            # e.g. a float assigned to a DecimalField that holds the same amount
+            return field.to_python(current) != field.to_python(original)
+        except (ValidationError, TypeError, ValueError):
+            return True
+
+    def get_dirty_fields(self):
+        """Names of changed fields, or None if the original state is unknown."""
+        state = getattr(self, "_original_state", None)
+        if state is None:
+            return None
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if field.attname not in state or self._differs(field, state[field.attname]):
+                dirty.append(field.name)
+        return dirty
+
+    def original_value(self, field_name):
+        """Value ``field_name`` had when loaded/last saved (None if unknown)."""
+        field = self._meta.get_field(field_name)
+        return getattr(self, "_original_state", {}).get(field.attname)
+
+    def save(self, *args, **kwargs):
+        partial = (
+            not args
+            and not self._state.adding
+            and self.pk is not None
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and kwargs.get("using") in (None, self._state.db)
+        )
+        if partial:
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                auto_now = [
+                    f.name for f in self._meta.concrete_fields
+                    if getattr(f, "auto_now", False) and f.name not in dirty
+                ]
+                kwargs["update_fields"] = dirty + auto_now
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get("update_fields"))
@@ -1,12 +1,18 @@
+import unicodedata
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .mixins import DirtyFieldsMixin
+from .storage import product_images
+
 
 # -------------------------
 # Profile for Users
 # -------------------------
-class Profile(models.Model):
+class Profile(DirtyFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     phone = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
@@ -18,10 +24,14 @@ class Profile(models.Model):
 # -------------------------
 # Shop Model
 # -------------------------
-class Shop(models.Model):
+class Shop(DirtyFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="shop")
     shop_name = models.CharField(max_length=100)
     address = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Counters kept by shops/counters.py
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pending_requests = models.IntegerField(default=0)
 
     def __str__(self):
         return self.shop_name
@@ -30,28 +40,60 @@ class Shop(models.Model):
 # -------------------------
 # Item / Product Model
 # -------------------------
-class Item(models.Model):
-    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="items")
+def name_key(name):
+    """Case- and accent-form-insensitive form of an item name (" Äpfel" -> "äpfel")."""
+    # SQLite's LOWER() only folds ASCII, so matching happens on this column
+    return unicodedata.normalize("NFKC", name).casefold().strip()
+
+
+class Item(DirtyFieldsMixin, models.Model):
+    # Foreign keys between a sharded table and a global one (see
+    # shops/sharding.py) cross databases once SHARD_COUNT > 1, so they
+    # carry no database constraint; the ORM still cascades deletes
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="items", db_constraint=False)
     item_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True)
+    # name_key(name), kept by save(); for exact, case-insensitive name lookups
+    name_key = models.CharField(max_length=255, default="", editable=False)
 
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Stored once per distinct picture under blobs/ (see shops/images.py)
+    image = models.ImageField(upload_to='products/', storage=product_images, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Counters kept by shops/counters.py
+    units_sold = models.IntegerField(default=0)
+    wishlist_count = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Case-insensitive name lookups (bulk availability, admin search)
+            models.Index(fields=["name_key"], name="item_name_key_idx"),
+            # "Best sellers" of a shop and "most wanted" overall
+            models.Index(fields=["shop", "-units_sold"], name="item_shop_units_sold_idx"),
+            models.Index(fields=["-wishlist_count"], name="item_wishlist_count_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if "name" in self.__dict__:
+            self.name_key = name_key(self.name)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "name" in update_fields:
+                kwargs["update_fields"] = {*update_fields, "name_key"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} ({self.shop.shop_name})"
 
-class ItemRequest(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    shop = models.ForeignKey(Shop, on_delete=models.CASCADE)
+class ItemRequest(DirtyFieldsMixin, models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False)
     item_name = models.CharField(max_length=100)
     quantity = models.IntegerField(default=1)
     status = models.CharField(max_length=20, default="Pending")
     reply_message = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True)
 
     def __str__(self):
@@ -61,9 +103,9 @@ class ItemRequest(models.Model):
 # -------------------------
 # Cart Item (User's Cart)
 # -------------------------
-class CartItem(models.Model):
+class CartItem(DirtyFieldsMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cart_items")
-    product = models.ForeignKey(Item, on_delete=models.CASCADE)  # Fixed: Item instead of Product
+    product = models.ForeignKey(Item, on_delete=models.CASCADE, db_constraint=False)  # Fixed: Item instead of Product
     quantity = models.PositiveIntegerField(default=1)
 
     class Meta:
@@ -77,12 +119,12 @@ class CartItem(models.Model):
 # Transaction / Sale
 # -------------------------
 class Transaction(models.Model):
-    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="purchases")
-    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sales")
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="purchases", db_constraint=False)
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sales", db_constraint=False)
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"{self.buyer.username} bought {self.item.name} from {self.seller.username}"
@@ -91,18 +133,23 @@ class Transaction(models.Model):
 # -------------------------
 # Orders
 # -------------------------
-class Order(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, null=True, blank=True)
+class Order(DirtyFieldsMixin, models.Model):
+    PENDING = "Pending"  # in the cart
+    PAID = "Paid"
+    SHIPPED = "Shipped"
+    DELIVERED = "Delivered"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, null=True, blank=True, db_constraint=False)
     item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(
         max_length=20,
-        choices=[("pending", "Pending"), ("shipped", "Shipped"), ("delivered", "Delivered")],
-        default="pending"
+        choices=[(PENDING, "Pending"), (PAID, "Paid"), (SHIPPED, "Shipped"), (DELIVERED, "Delivered")],
+        default=PENDING
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     # ✅ Add this field
     payment_method = models.CharField(
@@ -116,6 +163,15 @@ class Order(models.Model):
         default="cod"
     )
 
+    class Meta:
+        indexes = [
+            # Serves the cart: pending orders (and their total) per user
+            models.Index(fields=["user", "status"], name="order_user_status_idx"),
+            # Serves the fulfilment queue (shops/fulfilment.py): a shop's
+            # orders in one status, in id order (the rowid ends the key)
+            models.Index(fields=["shop", "status"], name="order_shop_status_idx"),
+        ]
+
     def __str__(self):
         return f"Order: {self.user.username} - {self.item} ({self.status})"
 
@@ -125,24 +181,319 @@ class Order(models.Model):
 # -------------------------
 class Wishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_constraint=False)
+
+    class Meta:
+        # Covers the "who is watching this item" fan-out without touching the table
+        indexes = [models.Index(fields=["item", "user"], name="wishlist_item_user_idx")]
 
     def __str__(self):
         return f"{self.user.username} wishes {self.item.name}"
 
 
+# -------------------------
+# Notifications (wishlist alerts)
+# -------------------------
+class Notification(models.Model):
+    BACK_IN_STOCK = "back_in_stock"
+    PRICE_DROP = "price_drop"
+    KIND_CHOICES = [
+        (BACK_IN_STOCK, "Back in stock"),
+        (PRICE_DROP, "Price drop"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_constraint=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    message = models.CharField(max_length=255)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "is_read", "-created_at"], name="notification_inbox_idx")]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.message}"
+
+
 # -------------------------
 # Recommendations
 # -------------------------
 class Recommendation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_constraint=False)
 
     def __str__(self):
         return f"Recommendation for {self.user.username}: {self.item.name}"
 
 
-class Product(models.Model):
+# -------------------------
+# Account closure (background purge progress)
+# -------------------------
+class AccountClosure(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    # Plain ids: the user row is deleted at the end of the purge
+    user_id = models.IntegerField(db_index=True)
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    current_step = models.CharField(max_length=50, blank=True)
+    deleted_rows = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Closure of {self.username} ({self.status})"
+
+
+# -------------------------
+# Shard assignments (shops pinned off their hash shard)
+# -------------------------
+class ShardAssignment(models.Model):
+    shop_id = models.IntegerField(unique=True)
+    alias = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Shop {self.shop_id} -> {self.alias}"
+
+
+# -------------------------
+# Catalog change feed (see shops/changes.py)
+# -------------------------
+class CatalogChange(models.Model):
+    CREATE = "create"
+    UPDATE = "update"
+    STOCK = "stock"
+    DELETE = "delete"
+    OP_CHOICES = [
+        (CREATE, "Created"),
+        (UPDATE, "Updated"),
+        (STOCK, "Stock changed"),
+        (DELETE, "Deleted"),
+    ]
+    KIND_CHOICES = [("item", "Item"), ("shop", "Shop")]
+
+    # The primary key is the feed cursor. Plain ids: the row may be
+    # deleted or live on another shard.
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    shop_id = models.IntegerField()
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["shop_id", "id"], name="catalogchange_shop_idx")]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id} {self.op}"
+
+
+# -------------------------
+# Resource versions for conditional GET (see shops/versions.py)
+# -------------------------
+class ResourceVersion(models.Model):
+    scope = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.scope} @ {self.version}"
+
+
+# -------------------------
+# Background jobs (see shops/tasks.py)
+# -------------------------
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    # Dotted path of the function to call
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # A running job whose lease ran out belongs to a dead worker
+    locked_by = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_at"], name="job_status_run_at_idx")]
+
+    def __str__(self):
+        return f"#{self.pk} {self.task} ({self.status})"
+
+
+class PeriodicTask(models.Model):
+    # One row per SHOPS_SCHEDULE entry; moving next_run_at is the claim
+    name = models.CharField(max_length=100, unique=True)
+    next_run_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.next_run_at}"
+
+
+# -------------------------
+# Precomputed search facet counts (see shops/facets.py)
+# -------------------------
+class FacetCount(models.Model):
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=200)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["facet", "value"], name="facetcount_facet_value_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+# -------------------------
+# Content-addressed image blobs (see shops/images.py)
+# -------------------------
+class ImageBlob(models.Model):
+    # Path relative to MEDIA_ROOT; refcount = items whose image is this blob
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+# -------------------------
+# Stock ledger (see shops/stock.py)
+# -------------------------
+class StockMovement(models.Model):
+    OPENING = "opening"  # quantity when the ledger was introduced
+    CREATED = "created"
+    EDIT = "edit"  # shopkeeper set the quantity
+    CART = "cart"  # cart/checkout quantity changed
+    CART_REMOVE = "cart_remove"
+    SALE = "sale"
+
+    # Append-only: no constraints, so deleting or archiving an item, order
+    # or sale leaves its movements as they were
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20)
+    order = models.ForeignKey(
+        Order, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    sale = models.ForeignKey(
+        Transaction, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["item", "created_at"], name="stockmove_item_created_idx")]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.item_id} {self.delta:+d} ({self.reason})"
+
+
+class StockSnapshot(models.Model):
+    # The item's quantity after every movement up to movement_id; none of
+    # those happened after taken_at
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    quantity = models.IntegerField()
+    movement_id = models.BigIntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["item", "movement_id"], name="stocksnap_item_movement_idx")]
+
+    def __str__(self):
+        return f"{self.item_id} = {self.quantity} @ {self.taken_at}"
+
+
+# -------------------------
+# Price history (see shops/prices.py)
+# -------------------------
+class PriceChange(models.Model):
+    # One row per actual change: the price the item had from changed_at on
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["item", "changed_at"], name="pricechange_item_changed_idx")]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.price} from {self.changed_at}"
+
+
+# -------------------------
+# Cold storage of old orders and sales (see shops/archive.py)
+# -------------------------
+class ArchiveSegment(models.Model):
+    PENDING = "pending"  # file written, hot rows not yet all deleted
+    DONE = "done"
+
+    kind = models.CharField(max_length=20)
+    alias = models.CharField(max_length=50)  # database the rows came from
+    path = models.CharField(max_length=255)  # relative to ARCHIVE_DIR
+    status = models.CharField(max_length=10, default=PENDING)
+    rows = models.IntegerField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    # Per-item units and per-seller revenue of archived sales, for counters.reconcile
+    totals = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.path} ({self.rows} rows)"
+
+
+class ArchiveEntry(models.Model):
+    # A user's rows in a segment. With an offset, the rows they own (a buyer's
+    # orders, a seller's sales) stored as one gzip member at that offset;
+    # without, rows they are the other party of (orders in their shop,
+    # their purchases), which are spread over the segment.
+    segment = models.ForeignKey(ArchiveSegment, on_delete=models.CASCADE, related_name="entries")
+    kind = models.CharField(max_length=20)
+    user_id = models.IntegerField()
+    offset = models.BigIntegerField(null=True)
+    length = models.BigIntegerField(null=True)
+    rows = models.IntegerField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "user_id", "last_at"], name="archiveentry_user_idx")]
+
+
+class Product(DirtyFieldsMixin, models.Model):
     product_name = models.CharField(max_length=200)
     shop_name = models.CharField(max_length=200)
     price = models.IntegerField()
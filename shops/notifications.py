@@ -0,0 +1,55 @@
+"""
+Wishlist alerts: tell every user watching an item when it comes back in
+stock or gets cheaper.
+"""
+from . import sharding, versions
+from .models import Item, Notification, Wishlist
+
+BATCH_SIZE = 500
+
+
+def detect_item_events(old_quantity, new_quantity, old_price, new_price):
+    """Return the notification kinds triggered by a stock/price change."""
+    events = []
+    if old_quantity is not None and old_quantity <= 0 < new_quantity:
+        events.append(Notification.BACK_IN_STOCK)
+    if old_price is not None and new_price < old_price:
+        events.append(Notification.PRICE_DROP)
+    return events
+
+
+def notify_watchers(item_id, kind, old_price=None):
+    """
+    Fan a single event out to everyone who wishlisted the item.
+    Runs in the background (see ``shops.tasks.enqueue``).
+    """
+    item = sharding.locate(Item.objects.prefetch_related("shop"), pk=item_id)
+    if item is None:
+        return
+
+    if kind == Notification.BACK_IN_STOCK:
+        message = f"{item.name} is back in stock at {item.shop.shop_name}"
+    else:
+        message = f"{item.name} dropped from ₹{old_price} to ₹{item.price} at {item.shop.shop_name}"
+
+    # One pass over the (item, user) index, written in fixed-size batches
+    user_ids = (
+        Wishlist.objects.filter(item_id=item_id)
+        .values_list("user_id", flat=True)
+        .distinct()
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for user_id in user_ids:
+        batch.append(Notification(user_id=user_id, item_id=item_id, kind=kind, message=message[:255]))
+        if len(batch) >= BATCH_SIZE:
+            _write_batch(batch)
+            batch = []
+    if batch:
+        _write_batch(batch)
+
+
+def _write_batch(batch):
+    Notification.objects.bulk_create(batch)
+    # bulk_create sends no signals; refresh the recipients' wishlist pages here
+    versions.bump(*(versions.wishlist(n.user_id) for n in batch))
@@ -0,0 +1,115 @@
+"""
+Price history. Every actual change of ``Item.price`` appends a
+PriceChange (item, changed_at, price) on the item's shard; saves that
+leave the price alone write nothing.
+
+``series()`` returns the price curves of many items over a time range in
+one query per shard: a window function pairs each change with the next
+one, so the price already in effect at ``start`` comes back with the
+changes inside the range, without a query per item.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lead
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from . import sharding
+from .models import Item, PriceChange
+
+CENT = Decimal("0.01")
+
+
+def _price(item):
+    # edit_product assigns a float
+    return Item._meta.get_field("price").to_python(item.price).quantize(CENT)
+
+
+def record(item, created):
+    """Append a PriceChange if the saved item's price changed (the Item post_save signal)."""
+    price = _price(item)
+    if not created:
+        old = item.original_value("price")
+        if old is not None:
+            if Decimal(old).quantize(CENT) == price:
+                return
+        else:
+            # Saved without being loaded: compare with the stored history instead
+            last = (
+                PriceChange.objects.using(item._state.db).filter(item_id=item.pk)
+                .order_by("-changed_at", "-pk").values_list("price", flat=True).first()
+            )
+            if last is not None and last == price:
+                return
+    PriceChange.objects.using(item._state.db).create(item_id=item.pk, price=price)
+
+
+def price_at(item, at):
+    """The item's price at time ``at`` (e.g. to check an order's total), or None if unknown."""
+    return (
+        PriceChange.objects.using(item._state.db).filter(item_id=item.pk, changed_at__lte=at)
+        .order_by("-changed_at", "-pk").values_list("price", flat=True).first()
+    )
+
+
+def series(item_ids, start=None, end=None):
+    """
+    ``{item_id: [(changed_at, price), ...]}`` for the range [start, end),
+    oldest first. The first point of each series is the price in effect
+    at ``start`` (dated when it was set); items without history are left out.
+    """
+    changes = PriceChange.objects.filter(item_id__in=set(item_ids))
+    if end is not None:
+        changes = changes.filter(changed_at__lt=end)
+    if start is not None:
+        changes = changes.annotate(
+            next_change=Window(Lead("changed_at"), partition_by=[F("item_id")], order_by=[F("changed_at"), F("pk")]),
+        ).filter(Q(changed_at__gte=start) | Q(next_change__isnull=True) | Q(next_change__gt=start))
+    result = {}
+    rows = sharding.fan_out(changes.order_by("item_id", "changed_at", "pk").values_list("item_id", "changed_at", "price"))
+    for item_id, changed_at, price in rows:
+        # SQLite can hand decimals back without their scale
+        result.setdefault(item_id, []).append((changed_at, Decimal(price).quantize(CENT)))
+    return result
+
+
+def _parse_time(value, name):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO 8601 date or time.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+@require_GET
+def price_history(request):
+    """GET ``prices/?items=1,2,3&start=...&end=...``: the price series of the items."""
+    max_items = getattr(settings, "PRICE_HISTORY_MAX_ITEMS", 500)
+    try:
+        item_ids = [int(part) for part in request.GET.get("items", "").split(",") if part.strip()]
+        if not item_ids:
+            raise ValueError("Pass items=<id>,<id>,...")
+        if len(item_ids) > max_items:
+            raise ValueError(f"At most {max_items} items per request.")
+        start = _parse_time(request.GET.get("start"), "start")
+        end = _parse_time(request.GET.get("end"), "end")
+    except ValueError as exc:
+        return JsonResponse({"success": False, "error": str(exc)}, status=400)
+
+    found = series(item_ids, start, end)
+    return JsonResponse({
+        "success": True,
+        "series": {
+            str(item_id): [{"at": changed_at, "price": price} for changed_at, price in points]
+            for item_id, points in found.items()
+        },
+    })
@@ -0,0 +1,130 @@
+"""
+Periodic jobs. ``SHOPS_SCHEDULE`` maps a name to a task path and a cron
+expression (``minute hour day-of-month month day-of-week``, in
+TIME_ZONE). Every ``run_worker`` supervisor calls ``run_due`` each tick;
+a run is queued by whichever of them first moves the entry's
+PeriodicTask.next_run_at forward, so several nodes never queue the
+same run twice. Runs missed while no worker was up collapse into one.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from product_check.sqlite_backend.retry import retry_on_locked
+
+from . import tasks
+from .models import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEDULE = {
+    "rebuild-search-facets": {"task": "shops.facets.rebuild", "cron": "15 3 * * *"},
+    "prune-finished-jobs": {"task": "shops.tasks.prune", "cron": "@daily"},
+    "prune-catalog-changes": {"task": "shops.changes.prune", "cron": "20 4 * * *"},
+    "archive-history": {"task": "shops.archive.archive_old", "cron": "30 2 * * 0"},
+    "snapshot-stock": {"task": "shops.stock.snapshot", "cron": "@hourly"},
+    "reconcile-counters": {"task": "shops.counters.reconcile", "cron": "45 3 * * *"},
+    "collect-image-blobs": {"task": "shops.images.collect_garbage", "cron": "@hourly"},
+}
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (lowest, highest) per field
+FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(text, lowest, highest):
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if spec == "*":
+            start, end = lowest, highest
+        elif "-" in spec:
+            start, end = (int(n) for n in spec.split("-", 1))
+        else:
+            start = int(spec)
+            end = highest if step > 1 else start
+        if not lowest <= start <= end <= highest or step < 1:
+            raise ValueError(f"{part!r} is out of range {lowest}-{highest}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    def __init__(self, expression):
+        fields = ALIASES.get(expression, expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} needs 5 fields")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(text, *bounds) for text, bounds in zip(fields, FIELDS)
+        )
+        # 0 and 7 are both Sunday
+        self.weekdays = {day % 7 for day in weekdays}
+        # As in cron: when both day fields are restricted, either may match
+        self.any_day = fields[2] != "*" and fields[4] != "*"
+
+    def _day_matches(self, t):
+        in_month = t.day in self.days
+        in_week = (t.weekday() + 1) % 7 in self.weekdays
+        return in_month or in_week if self.any_day else in_month and in_week
+
+    def next_after(self, when):
+        """The first matching minute strictly after ``when``."""
+        t = timezone.localtime(when).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Five years covers every satisfiable expression (e.g. Feb 29)
+        limit = t + timedelta(days=5 * 366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError("Cron expression never matches")
+
+
+def get_schedule():
+    return getattr(settings, "SHOPS_SCHEDULE", DEFAULT_SCHEDULE)
+
+
+@retry_on_locked
+def _run_entry(name, entry, now):
+    cron = Cron(entry["cron"])
+    with transaction.atomic():
+        row, created = PeriodicTask.objects.get_or_create(
+            name=name, defaults={"next_run_at": cron.next_after(now)}
+        )
+        if created or row.next_run_at > now:
+            return False
+        claimed = PeriodicTask.objects.filter(pk=row.pk, next_run_at=row.next_run_at).update(
+            next_run_at=cron.next_after(now)
+        )
+        if claimed:
+            tasks.submit(entry["task"], entry.get("args", ()), entry.get("kwargs"))
+        return bool(claimed)
+
+
+def run_due(now=None):
+    """Queue every scheduled task that is due; returns their names."""
+    now = now or timezone.now()
+    queued = []
+    for name, entry in get_schedule().items():
+        try:
+            if _run_entry(name, entry, now):
+                queued.append(name)
+        except Exception:
+            logger.exception("Could not schedule %s", name)
+    return queued
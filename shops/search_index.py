@@ -0,0 +1,382 @@
+"""
+In-memory prefix index behind ``/search/suggest/``.
+
+Each worker holds one index of item and shop names. It is built by the
+post-fork warm-up (or the first suggest request), kept current by
+replaying the catalog change feed (``shops.changes``) at most every
+SEARCH_INDEX_SYNC_SECONDS, so writes made through any worker show up in
+all of them, and rebuilt in the background every
+SEARCH_INDEX_REBUILD_SECONDS to drop names nothing carries any more.
+
+Objects live in parallel arrays sorted by id (~20 bytes each). Each
+distinct name is stored once (~300 bytes with its keys): the whole name
+plus the suffixes starting at its next MAX_WORDS - 1 words, so "tom"
+finds both "tomato" and "cherry tomato". Names are also posted under
+their word trigrams for typo-tolerant lookups (``similar()``), about 50
+bytes more per name. SEARCH_INDEX_MAX_NAMES caps the
+distinct names a worker holds; objects with names past the cap are left
+out of suggestions until a rebuild finds room.
+"""
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import connections
+
+from product_check import warmup
+
+from . import sharding
+from .models import CatalogChange, Item, Shop
+
+logger = logging.getLogger(__name__)
+
+MAX_WORDS = 4
+# One-letter prefixes match a large share of the catalog; not worth ranking
+MIN_PREFIX = 2
+# Suggestions kept per cached prefix; requests take a slice of these
+RESULTS = 20
+CACHE_SIZE = 4096
+FEED_BATCH = 5000
+# Dice similarity a fuzzy match needs, and how many names it may verify
+FUZZY_THRESHOLD = 0.5
+MAX_CANDIDATES = 5000
+_END = "\U0010ffff"
+_NO_SLOTS = array("l")
+
+
+def normalize(name):
+    return " ".join(re.findall(r"\w+", (name or "").casefold()))
+
+
+def trigrams(norm):
+    """Trigrams of each word, padded so word starts and ends count."""
+    grams = set()
+    for word in norm.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class PrefixIndex:
+    """Names of one kind of object (items or shops), ranked by stock and sales."""
+
+    def __init__(self):
+        self._ids = array("q")  # object ids, sorted
+        self._obj_slot = array("l")  # name slot of each object
+        self._obj_qty = array("l")  # quantity of each object
+        self._slot_of = {}  # normalized name -> slot
+        self._display = []  # slot -> name as first seen
+        self._stock = array("q")  # slot -> total quantity
+        self._carriers = array("l")  # slot -> objects with this name
+        self._sales = array("q")  # slot -> units sold (as of the last build)
+        self._keys = []  # sorted keys
+        self._key_slots = array("l")
+        self._grams = {}  # trigram -> slots (ascending)
+        self._gram_counts = array("H")  # slot -> number of trigrams
+        self._pending_keys = None  # (key, slot) pairs while bulk loading
+        self._cache = OrderedDict()
+        self._max_names = getattr(settings, "SEARCH_INDEX_MAX_NAMES", 500_000)
+        self._full = False
+
+    # ---- loading ----
+    def begin_bulk(self):
+        self._pending_keys = []
+
+    def finish_bulk(self):
+        """Sort what ``set()`` appended while bulk loading."""
+        pairs = sorted(zip(self._keys, self._key_slots)) + sorted(self._pending_keys)
+        self._pending_keys = None
+        self._keys = [key for key, _ in pairs]
+        self._key_slots = array("l", (slot for _, slot in pairs))
+        if any(a > b for a, b in zip(self._ids, self._ids[1:])):
+            order = sorted(range(len(self._ids)), key=self._ids.__getitem__)
+            for name in ("_ids", "_obj_slot", "_obj_qty"):
+                old = getattr(self, name)
+                setattr(self, name, array(old.typecode, (old[i] for i in order)))
+
+    def _slot(self, name):
+        norm = normalize(name)
+        slot = self._slot_of.get(norm)
+        if slot is not None:
+            return slot
+        if len(self._display) >= self._max_names:
+            if not self._full:
+                logger.warning("Search index is full (%d names); new names are not suggested", self._max_names)
+                self._full = True
+            return None
+        slot = len(self._display)
+        self._slot_of[norm] = slot
+        display = name.strip()
+        self._display.append(norm if display == norm else display)
+        self._stock.append(0)
+        self._carriers.append(0)
+        self._sales.append(0)
+        grams = trigrams(norm)
+        self._gram_counts.append(min(len(grams), 0xFFFF))
+        for gram in grams:
+            self._grams.setdefault(gram, array("l")).append(slot)
+        for key in self._keys_for(norm):
+            if self._pending_keys is not None:
+                self._pending_keys.append((key, slot))
+            else:
+                at = bisect.bisect_left(self._keys, key)
+                self._keys.insert(at, key)
+                self._key_slots.insert(at, slot)
+        return slot
+
+    @staticmethod
+    def _keys_for(norm):
+        if not norm:
+            return []
+        words = norm.split(" ")
+        # The first key is the name itself, sharing the string kept in _slot_of
+        return [norm] + [" ".join(words[i:]) for i in range(1, min(len(words), MAX_WORDS))]
+
+    def _find(self, obj_id):
+        i = bisect.bisect_left(self._ids, obj_id)
+        return i if i < len(self._ids) and self._ids[i] == obj_id else -1
+
+    # ---- updates ----
+    def set(self, obj_id, name, quantity=0):
+        slot = self._slot(name)
+        if slot is None:
+            self.remove(obj_id)
+            return
+        quantity = max(int(quantity or 0), 0)
+        i = self._find(obj_id) if self._pending_keys is None else -1
+        if i >= 0:
+            self._adjust(self._obj_slot[i], -self._obj_qty[i], -1)
+            self._obj_slot[i] = slot
+            self._obj_qty[i] = quantity
+        elif self._pending_keys is not None:
+            # Bulk loads append; finish_bulk() sorts
+            self._ids.append(obj_id)
+            self._obj_slot.append(slot)
+            self._obj_qty.append(quantity)
+        else:
+            at = bisect.bisect_left(self._ids, obj_id)
+            self._ids.insert(at, obj_id)
+            self._obj_slot.insert(at, slot)
+            self._obj_qty.insert(at, quantity)
+        self._adjust(slot, quantity, 1)
+
+    def set_quantity(self, obj_id, quantity):
+        i = self._find(obj_id)
+        if i < 0:
+            return
+        quantity = max(int(quantity or 0), 0)
+        self._adjust(self._obj_slot[i], quantity - self._obj_qty[i], 0)
+        self._obj_qty[i] = quantity
+
+    def add_sales(self, obj_id, units):
+        i = self._find(obj_id)
+        if i >= 0:
+            self._sales[self._obj_slot[i]] += int(units or 0)
+
+    def remove(self, obj_id):
+        i = self._find(obj_id)
+        if i < 0:
+            return
+        self._adjust(self._obj_slot[i], -self._obj_qty[i], -1)
+        del self._ids[i]
+        del self._obj_slot[i]
+        del self._obj_qty[i]
+
+    def _adjust(self, slot, stock_delta, carriers_delta):
+        self._stock[slot] += stock_delta
+        self._carriers[slot] += carriers_delta
+        if self._cache:
+            # Drop only the cached prefixes this name can appear under
+            for key in self._keys_for(normalize(self._display[slot])):
+                for end in range(1, len(key) + 1):
+                    self._cache.pop(key[:end], None)
+
+    # ---- queries ----
+    def _score(self, slot):
+        return (self._stock[slot] > 0, self._sales[slot], self._stock[slot])
+
+    def top(self, prefix, limit):
+        """[(name, stock, carriers)] for names with a word starting with ``prefix``."""
+        prefix = normalize(prefix)
+        if len(prefix) < MIN_PREFIX:
+            return []
+        hit = self._cache.get(prefix)
+        if hit is None:
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + _END, lo)
+            slots = {self._key_slots[i] for i in range(lo, hi)}
+            best = heapq.nlargest(RESULTS, (s for s in slots if self._carriers[s] > 0), key=self._score)
+            hit = [(self._display[s], self._stock[s], self._carriers[s]) for s in best]
+            self._cache[prefix] = hit
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(prefix)
+        return hit[:limit]
+
+    def similar(self, query, limit, threshold=FUZZY_THRESHOLD):
+        """
+        [(name, stock, carriers, score)] for names within ``threshold``
+        Dice similarity of ``query`` over word trigrams, best first.
+        """
+        grams = trigrams(normalize(query))
+        n = len(grams)
+        if not n:
+            return []
+        # A name scoring >= t shares at least t*n/(2-t) of the query's
+        # trigrams, so it is posted under one of the n - that + 1 rarest
+        # ones: candidates come from those lists, never the whole table
+        shared = math.ceil(threshold * n / (2 - threshold))
+        postings = sorted((self._grams.get(gram, _NO_SLOTS) for gram in grams), key=len)
+        candidates = set()
+        for slots in postings[:n - shared + 1]:
+            candidates.update(slots)
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        # Shared trigrams per name, counted in C over every list
+        common = Counter()
+        for slots in postings:
+            common.update(slots)
+
+        # ... and has between t/(2-t) and (2-t)/t times as many trigrams
+        fewest, most = n * threshold / (2 - threshold), n * (2 - threshold) / threshold
+        scored = []
+        for slot in candidates:
+            m = self._gram_counts[slot]
+            if common[slot] < shared or not fewest <= m <= most or self._carriers[slot] <= 0:
+                continue
+            score = 2 * common[slot] / (n + m)
+            if score >= threshold:
+                scored.append((score, self._score(slot), slot))
+        return [
+            (self._display[slot], self._stock[slot], self._carriers[slot], round(score, 3))
+            for score, _, slot in heapq.nlargest(limit, scored)
+        ]
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.items = PrefixIndex()
+        self.shops = PrefixIndex()
+        self.cursor = 0
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def apply(self, kind, object_id, op, data):
+        target = self.items if kind == "item" else self.shops
+        if op == CatalogChange.DELETE:
+            target.remove(object_id)
+        elif op == CatalogChange.STOCK:
+            target.set_quantity(object_id, data["quantity"])
+        elif kind == "item":
+            target.set(object_id, data["name"], data["quantity"])
+        else:
+            target.set(object_id, data["shop_name"])
+
+    def sync(self):
+        """Replay feed rows after our cursor. Replays are idempotent."""
+        while True:
+            rows = list(
+                CatalogChange.objects.filter(id__gt=self.cursor).order_by("id")
+                .values_list("id", "kind", "object_id", "op", "data")[:FEED_BATCH]
+            )
+            for change_id, kind, object_id, op, data in rows:
+                self.apply(kind, object_id, op, data)
+                self.cursor = change_id
+            if len(rows) < FEED_BATCH:
+                break
+        self.synced_at = time.monotonic()
+
+    def suggest(self, prefix, limit):
+        with self.lock:
+            return self.items.top(prefix, limit), self.shops.top(prefix, limit)
+
+    def similar_items(self, query, limit):
+        with self.lock:
+            return self.items.similar(query, limit)
+
+
+def build():
+    from .changes import latest_cursor
+
+    started = time.perf_counter()
+    index = SuggestIndex()
+    # Anything written during the scan is in the feed after this cursor
+    index.cursor = latest_cursor()
+
+    index.items.begin_bulk()
+    sold = []
+    # units_sold is the item's sales counter (shops/counters.py)
+    for items in sharding.each_shard(Item.objects.values_list("item_id", "name", "quantity", "units_sold")):
+        for item_id, name, quantity, units in items.iterator(chunk_size=FEED_BATCH):
+            index.items.set(item_id, name, quantity)
+            if units:
+                sold.append((item_id, units))
+    index.items.finish_bulk()
+    for item_id, units in sold:
+        index.items.add_sales(item_id, units)
+
+    index.shops.begin_bulk()
+    for shop_id, shop_name in Shop.objects.values_list("id", "shop_name").iterator(chunk_size=FEED_BATCH):
+        index.shops.set(shop_id, shop_name)
+    index.shops.finish_bulk()
+
+    index.sync()
+    index.built_at = time.monotonic()
+    logger.info(
+        "Search index built: %d items, %d shops in %.0f ms",
+        len(index.items), len(index.shops), (time.perf_counter() - started) * 1000,
+    )
+    return index
+
+
+_index = None
+_build_lock = threading.Lock()
+_rebuilding = False
+
+
+def _rebuild_in_background():
+    global _index, _rebuilding
+    try:
+        _index = build()
+    except Exception:
+        logger.exception("Search index rebuild failed")
+    finally:
+        _rebuilding = False
+        connections.close_all()
+
+
+def get_index():
+    global _index, _rebuilding
+    index = _index
+    if index is None:
+        with _build_lock:
+            if _index is None:
+                _index = build()
+            return _index
+
+    now = time.monotonic()
+    if now - index.built_at > getattr(settings, "SEARCH_INDEX_REBUILD_SECONDS", 900) and not _rebuilding:
+        _rebuilding = True
+        threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    if now - index.synced_at > getattr(settings, "SEARCH_INDEX_SYNC_SECONDS", 1):
+        with index.lock:
+            if now - index.synced_at > getattr(settings, "SEARCH_INDEX_SYNC_SECONDS", 1):
+                index.sync()
+    return index
+
+
+@warmup.register
+def warm_search_index():
+    get_index()
@@ -0,0 +1,230 @@
+"""
+Shop sharding.
+
+Item, ItemRequest, Order and Transaction rows live on the database that
+owns their shop: ``SHARD_COUNT`` aliases ("default", "shard_1", ...),
+chosen by ``shop_id % SHARD_COUNT`` unless a ShardAssignment row pins the
+shop elsewhere (see ``manage.py rebalance_shards``). Users, shops and the
+other global tables stay on "default".
+
+With ``SHARD_COUNT = 1`` (the default) every helper here is a no-op and
+querysets keep their normal routing (including the read replica).
+
+Rules for code touching sharded models:
+- shop-scoped queries go through ``for_shop()``;
+- user-scoped/global reads go through ``fan_out()`` or ``each_shard()``;
+- lookups by primary key alone use ``get_or_404()``;
+- relations to global tables (shop, user, buyer, seller) are loaded with
+  ``prefetch_related``, never ``select_related``: a JOIN on a shard would
+  hit that shard's empty copy of the global table.
+"""
+import heapq
+import time
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.http import Http404
+
+PRIMARY = "default"
+SHARDED_MODELS = {"item", "itemrequest", "order", "transaction", "stockmovement", "stocksnapshot", "pricechange"}
+
+# Shard n allocates primary keys from n << ID_SHIFT (seeded by init_shards),
+# so a primary key alone says which shard holds the row (rebalance_shards
+# gives the rows it moves new ids from the target's range).
+ID_SHIFT = 40
+
+_assignments = {}
+_assignments_loaded_at = 0.0
+
+
+def shard_count():
+    return getattr(settings, "SHARD_COUNT", 1)
+
+
+def is_enabled():
+    return shard_count() > 1
+
+
+def shard_aliases():
+    return [PRIMARY] + [f"shard_{n}" for n in range(1, shard_count())]
+
+
+def _load_assignments():
+    global _assignments, _assignments_loaded_at
+    ttl = getattr(settings, "SHARD_MAP_TTL", 5)
+    if time.monotonic() - _assignments_loaded_at > ttl:
+        from .models import ShardAssignment
+
+        _assignments = dict(ShardAssignment.objects.using(PRIMARY).values_list("shop_id", "alias"))
+        _assignments_loaded_at = time.monotonic()
+    return _assignments
+
+
+def invalidate_assignments():
+    global _assignments_loaded_at
+    _assignments_loaded_at = 0.0
+
+
+def home_shard(shop_id):
+    """Shard a shop belongs on by hash alone."""
+    return shard_aliases()[int(shop_id) % shard_count()]
+
+
+def shard_for_shop(shop_id):
+    if not is_enabled():
+        return PRIMARY
+    return _load_assignments().get(int(shop_id)) or home_shard(shop_id)
+
+
+def shard_for_pk(pk):
+    """Shard a row was created on, judging by its primary key."""
+    aliases = shard_aliases()
+    index = int(pk) >> ID_SHIFT
+    return aliases[index] if index < len(aliases) else PRIMARY
+
+
+def shard_for_item(item_id):
+    """
+    Shard holding an item known only by id: the one whose range the id
+    falls in, since rebalance_shards gives the rows it moves new ids from
+    the target's range. The other shards are still checked, for items
+    moved before it did (it used to keep ids).
+    """
+    from .models import Item
+
+    guess = shard_for_pk(item_id)
+    for alias in [guess] + [a for a in shard_aliases() if a != guess]:
+        if Item.objects.using(alias).filter(pk=item_id).exists():
+            return alias
+    return guess
+
+
+def for_shop(queryset, shop_id):
+    """Scope a queryset (or manager) of a sharded model to the shop's shard."""
+    if not is_enabled():
+        return queryset.all()
+    return queryset.using(shard_for_shop(shop_id))
+
+
+def each_shard(queryset):
+    """The queryset once per shard (just itself when sharding is off)."""
+    if not is_enabled():
+        return [queryset.all()]
+    return [queryset.using(alias) for alias in shard_aliases()]
+
+
+def fan_out(queryset, key=None, reverse=False, limit=None):
+    """
+    Run a queryset on every shard and merge the results. Pass ``key`` when
+    the queryset is ordered, so the per-shard results can be merged in
+    order; ``limit`` is applied per shard and to the merged result.
+    """
+    parts = [list(qs[:limit] if limit else qs) for qs in each_shard(queryset)]
+    if len(parts) == 1:
+        return parts[0]
+    if key is not None:
+        merged = list(heapq.merge(*parts, key=key, reverse=reverse))
+    else:
+        merged = [obj for part in parts for obj in part]
+    return merged[:limit] if limit else merged
+
+
+def locate(queryset, **lookup):
+    """Fetch one object from whichever shard has it (guessing by pk first), or None."""
+    if not is_enabled():
+        return queryset.filter(**lookup).first()
+    pk = lookup.get("pk")
+    aliases = shard_aliases()
+    if pk is not None:
+        guess = shard_for_pk(pk)
+        aliases = [guess] + [a for a in aliases if a != guess]
+    for alias in aliases:
+        obj = queryset.using(alias).filter(**lookup).first()
+        if obj is not None:
+            return obj
+    return None
+
+
+def get_or_404(queryset, **lookup):
+    obj = locate(queryset.all(), **lookup)
+    if obj is None:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    return obj
+
+
+def prefetch_by_shop(shops, lookup):
+    """``prefetch_related(lookup)`` for a shop-owned relation (e.g. "items") across shards."""
+    from django.db.models import Prefetch, prefetch_related_objects
+
+    if not is_enabled():
+        prefetch_related_objects(shops, lookup)
+        return
+    by_alias = {}
+    for shop in shops:
+        by_alias.setdefault(shard_for_shop(shop.pk), []).append(shop)
+    related_model = shops[0]._meta.get_field(lookup).related_model if shops else None
+    for alias, group in by_alias.items():
+        prefetch_related_objects(group, Prefetch(lookup, queryset=related_model._default_manager.using(alias)))
+
+
+def _shop_id_of(obj):
+    from .models import Shop
+
+    if isinstance(obj, Shop):
+        return obj.pk
+    if getattr(obj, "shop_id", None) is not None:
+        return obj.shop_id
+    for name in ("item", "product"):
+        try:
+            field = obj._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.is_relation and field.many_to_one and field.is_cached(obj):
+            related = field.get_cached_value(obj)
+            if related is not None:
+                return related.shop_id
+    seller_id = getattr(obj, "seller_id", None)
+    if seller_id is not None:
+        return Shop.objects.using(PRIMARY).filter(user_id=seller_id).values_list("pk", flat=True).first()
+    return None
+
+
+class ShopShardRouter:
+    """
+    Routes sharded models by their shop when Django gives us an instance
+    (saves, related-object access). Everything else falls through to the
+    next router.
+    """
+
+    def _route(self, model, instance):
+        if not is_enabled() or instance is None:
+            return None
+        if model._meta.app_label != "shops" or model._meta.model_name not in SHARDED_MODELS:
+            return None
+        # Rows already on a shard stay there; so do rows related to them
+        if instance._state.db and not instance._state.adding:
+            if instance._meta.model_name in SHARDED_MODELS:
+                return instance._state.db
+        shop_id = _shop_id_of(instance)
+        if shop_id is not None:
+            return shard_for_shop(shop_id)
+        # e.g. wishlist.item: only the item id is known
+        if model._meta.model_name == "item":
+            item_id = getattr(instance, "item_id", None) or getattr(instance, "product_id", None)
+            if item_id is not None:
+                return shard_for_item(item_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Shard rows point at global rows on "default" by design
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard gets the full schema
+        return None
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import Profile, Item, ItemRequest, Product, Shop, Transaction, Wishlist
+from . import changes, counters, facets, images, prices, stock, tasks, versions
+from .notifications import detect_item_events, notify_watchers
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -10,4 +13,175 @@ def create_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    # Only a profile loaded on this instance can carry edits, and an
+    # unchanged one is a no-op save (DirtyFieldsMixin)
+    if User.profile.is_cached(instance):
+        instance.profile.save()
+
+
+# ---------------- Wishlist alerts ----------------
+@receiver(post_save, sender=Item)
+def queue_wishlist_alerts(sender, instance, created, **kwargs):
+    if created:
+        return
+    # post_save runs before the mixin re-snapshots, so these are pre-save values
+    old_quantity = instance.original_value("quantity")
+    old_price = instance.original_value("price")
+
+    for kind in detect_item_events(old_quantity, instance.quantity, old_price, instance.price):
+        tasks.enqueue_for(instance._state.db, notify_watchers, instance.pk, kind, old_price=str(old_price))
+
+
+# ---------------- Catalog change feed ----------------
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Shop)
+def record_catalog_save(sender, instance, created, update_fields=None, **kwargs):
+    changes.record_save(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Shop)
+def record_catalog_delete(sender, instance, **kwargs):
+    changes.record_delete(instance)
+
+
+# ---------------- Page versions (conditional GET) ----------------
+@receiver(post_save, sender=ItemRequest)
+@receiver(post_delete, sender=ItemRequest)
+def bump_request_pages(sender, instance, **kwargs):
+    versions.bump(versions.user_requests(instance.user_id), versions.shop_requests(instance.shop_id))
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def bump_wishlist_page(sender, instance, **kwargs):
+    versions.bump(versions.wishlist(instance.user_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_pages(sender, instance, **kwargs):
+    versions.bump(versions.PRODUCTS)
+
+
+@receiver(post_save, sender=Item)
+def bump_item_name_pages(sender, instance, created, **kwargs):
+    # Search suggests item names ("did you mean"); stock changes don't matter
+    if created or instance.original_value("name") != instance.name:
+        versions.bump(versions.ITEM_NAMES)
+
+
+@receiver(post_delete, sender=Item)
+def bump_item_name_pages_on_delete(sender, instance, **kwargs):
+    versions.bump(versions.ITEM_NAMES)
+
+
+@receiver(post_save, sender=User)
+def bump_user_name_pages(sender, instance, created, update_fields=None, **kwargs):
+    # User isn't dirty-tracked; logins only save last_login
+    if not created and (update_fields is None or "username" in update_fields):
+        versions.bump(versions.USER_NAMES)
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def bump_shop_pages(sender, instance, **kwargs):
+    # Request lists show shop names
+    versions.bump(versions.SHOPS)
+
+
+# ---------------- Search facets ----------------
+@receiver(post_save, sender=Product)
+def count_product_facets(sender, instance, created, **kwargs):
+    new = (instance.price, instance.shop_name)
+    if created:
+        facets.record(None, new)
+        return
+    old_price = instance.original_value("price")
+    if old_price is None:
+        # Saved without being loaded; the old bucket is unknown
+        tasks.enqueue(facets.rebuild)
+        return
+    facets.record((old_price, instance.original_value("shop_name")), new)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product_facets(sender, instance, **kwargs):
+    facets.record((instance.price, instance.shop_name), None)
+
+
+# ---------------- Stock ledger ----------------
+@receiver(post_save, sender=Item)
+def record_stock_movement(sender, instance, created, **kwargs):
+    stock.record(instance, created)
+
+
+# ---------------- Price history ----------------
+@receiver(post_save, sender=Item)
+def record_price_change(sender, instance, created, **kwargs):
+    prices.record(instance, created)
+
+
+# ---------------- Denormalized counters ----------------
+@receiver(post_save, sender=Transaction)
+def count_sale(sender, instance, created, **kwargs):
+    if created:
+        counters.sale(instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def uncount_sale(sender, instance, **kwargs):
+    counters.sale(instance, sign=-1)
+
+
+@receiver(post_save, sender=ItemRequest)
+def count_pending_request(sender, instance, created, **kwargs):
+    if created:
+        counters.request_status(instance.shop_id, None, instance.status)
+        return
+    old_status = instance.original_value("status")
+    if old_status is None:
+        # Saved without being loaded; the old status is unknown
+        tasks.enqueue_for(instance._state.db, counters.reconcile)
+        return
+    counters.request_status(instance.shop_id, old_status, instance.status)
+
+
+@receiver(post_delete, sender=ItemRequest)
+def uncount_pending_request(sender, instance, **kwargs):
+    counters.request_status(instance.shop_id, instance.status, None)
+
+
+@receiver(post_save, sender=Wishlist)
+def count_wish(sender, instance, created, **kwargs):
+    if created:
+        counters.wish(instance.item_id)
+
+
+@receiver(post_delete, sender=Wishlist)
+def uncount_wish(sender, instance, **kwargs):
+    counters.wish(instance.item_id, sign=-1)
+
+
+# ---------------- Image blob references ----------------
+@receiver(post_save, sender=Item)
+def reference_item_image(sender, instance, created, **kwargs):
+    new = instance.image.name if instance.image else None
+    old = None if created else instance.original_value("image")
+    if new == old:
+        return
+    # Both counts change once the save commits on the item's shard, so a
+    # rolled-back save leaves them alone; until then the upload's touch
+    # (and collect_garbage's check of the items) keeps the blob
+    if new:
+        transaction.on_commit(lambda: images.acquire(new), using=instance._state.db)
+    if old:
+        transaction.on_commit(lambda: images.release(old), using=instance._state.db)
+
+
+@receiver(post_delete, sender=Item)
+def release_item_image(sender, instance, **kwargs):
+    # Also runs for the chunked deletes of an account closure
+    name = instance.image.name if instance.image else None
+    if name:
+        transaction.on_commit(lambda: images.release(name), using=instance._state.db)
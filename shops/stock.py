@@ -0,0 +1,152 @@
+"""
+Stock ledger: every change of ``Item.quantity`` appends a StockMovement
+(delta, reason, the order or sale behind it) in the same transaction as
+the item's UPDATE, so "why is the stock what it is" has an answer.
+
+The movement is written by the Item post_save signal from the quantity
+the item was loaded with, so no code path that saves an item can skip it.
+Callers say why with ``note()`` before saving; a change without a note
+is recorded as a shopkeeper edit.
+
+``snapshot()`` (scheduled) stores each changed item's running total, so
+``as_of()`` only adds up the movements since the last snapshot before
+the requested time instead of the item's whole history. Both rely on
+movement ids only growing on each database; rebalance_shards gives the
+movements it moves new ids and leaves their snapshots behind. A
+snapshot is dated by the newest movement it covers, not the last id.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import sharding
+from .models import StockMovement, StockSnapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BATCH = 500
+
+
+def note(item, reason, order=None, sale=None):
+    """Why ``item``'s quantity is about to change; used by its next save."""
+    item._stock_note = (reason, order, sale)
+
+
+def record(item, created):
+    """Append the movement for a saved item (the Item post_save signal)."""
+    reason, order, sale = item.__dict__.pop("_stock_note", (StockMovement.EDIT, None, None))
+    if created:
+        delta = item.quantity
+        reason = StockMovement.CREATED
+    else:
+        old = item.original_value("quantity")
+        if old is None:
+            # Saved without being loaded: the change can't be known. The
+            # audit (stock_audit) reports the item if its stock moved.
+            logger.warning("Item %s saved without its old quantity; no stock movement recorded", item.pk)
+            return
+        delta = item.quantity - old
+    if not delta:
+        return
+    StockMovement.objects.using(item._state.db).create(
+        item_id=item.pk, delta=delta, reason=reason,
+        order_id=order.pk if order is not None else None,
+        sale_id=sale.pk if sale is not None else None,
+    )
+
+
+def movements(item, start=None, end=None):
+    """The item's movements in [start, end), oldest first (served by stockmove_item_created_idx)."""
+    queryset = StockMovement.objects.using(item._state.db).filter(item_id=item.pk)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset.order_by("created_at", "pk")
+
+
+def as_of(items, at):
+    """
+    ``items`` (an Item queryset, on one shard) annotated with
+    ``stock_as_of``: the quantity at time ``at`` according to the ledger.
+    """
+    db = items.db
+    snapshots = (
+        StockSnapshot.objects.using(db).filter(item_id=OuterRef("pk"), taken_at__lte=at).order_by("-movement_id")
+    )
+    since = (
+        StockMovement.objects.using(db)
+        .filter(item_id=OuterRef("pk"), pk__gt=OuterRef("snapshot_movement"), created_at__lte=at)
+        .order_by().values("item_id").annotate(total=Sum("delta")).values("total")
+    )
+    return items.annotate(
+        snapshot_quantity=Coalesce(Subquery(snapshots.values("quantity")[:1]), Value(0)),
+        snapshot_movement=Coalesce(Subquery(snapshots.values("movement_id")[:1]), Value(0)),
+    ).annotate(
+        stock_as_of=F("snapshot_quantity") + Coalesce(Subquery(since, output_field=IntegerField()), Value(0)),
+    )
+
+
+def _snapshot_shard(db):
+    watermark = StockSnapshot.objects.using(db).aggregate(m=Max("movement_id"))["m"] or 0
+    # Ids are only the cursor: rows moved in by rebalance_shards get new
+    # ids but keep their times, so the newest id isn't the newest time
+    window = StockMovement.objects.using(db).filter(pk__gt=watermark).aggregate(
+        upto=Max("pk"), taken_at=Max("created_at"),
+    )
+    if window["upto"] is None:
+        return 0
+    upto, taken_at = window["upto"], window["taken_at"]
+    changed = dict(
+        StockMovement.objects.using(db).filter(pk__gt=watermark, pk__lte=upto)
+        .values_list("item_id").annotate(total=Sum("delta")).order_by()
+    )
+    item_ids = sorted(changed)
+    taken = 0
+    for start in range(0, len(item_ids), SNAPSHOT_BATCH):
+        batch = item_ids[start:start + SNAPSHOT_BATCH]
+        newest = dict(
+            StockSnapshot.objects.using(db).filter(item_id__in=batch)
+            .values_list("item_id").annotate(m=Max("movement_id")).order_by()
+        )
+        previous = {
+            item_id: (quantity, previous_at)
+            for item_id, movement_id, quantity, previous_at in StockSnapshot.objects.using(db)
+            .filter(item_id__in=newest, movement_id__in=set(newest.values()))
+            .values_list("item_id", "movement_id", "quantity", "taken_at")
+            if newest[item_id] == movement_id
+        }
+        snapshots = []
+        for item_id in batch:
+            quantity, previous_at = previous.get(item_id, (0, taken_at))
+            snapshots.append(StockSnapshot(
+                item_id=item_id, quantity=quantity + changed[item_id],
+                movement_id=upto, taken_at=max(taken_at, previous_at),
+            ))
+        with transaction.atomic(using=db):
+            StockSnapshot.objects.using(db).bulk_create(snapshots)
+        taken += len(batch)
+    return taken
+
+
+def snapshot(aliases=None):
+    """Scheduled: snapshot every item that moved since the last run."""
+    taken = sum(_snapshot_shard(db) for db in aliases or sharding.shard_aliases())
+    logger.info("Stock snapshots taken: %s", taken)
+    return taken
+
+
+def drift(items):
+    """
+    Items (one shard's queryset) whose quantity differs from the ledger:
+    ``[(item, ledger quantity)]``. These are the lost updates and
+    unrecorded writes the ledger exists to find.
+    """
+    return [
+        (item, item.stock_as_of)
+        for item in as_of(items, timezone.now()).iterator()
+        if item.stock_as_of != item.quantity
+    ]
@@ -0,0 +1,46 @@
+"""
+Storage for Item.image: content-addressed, see shops/images.py.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+BLOB_PREFIX = "blobs/"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Saves a file under the hash of its content; identical uploads share one file."""
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        blob = f"{BLOB_PREFIX}{hexdigest[:2]}/{hexdigest}{extension}"
+        from .models import ImageBlob
+
+        # Holds the write lock, like collect_garbage's delete: either the
+        # collector has removed the file and it is written again below, or
+        # the touched row restarts its grace period until the item's save
+        # commits and acquires it
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            ImageBlob.objects.using(DEFAULT_DB_ALIAS).filter(name=blob).update(updated_at=timezone.now())
+            if self.exists(blob):
+                return blob
+        return super()._save(blob, content)
+
+
+_storage = None
+
+
+def product_images():
+    """Storage of Item.image (a callable, so migrations don't pin the instance)."""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
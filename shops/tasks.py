@@ -0,0 +1,212 @@
+"""
+Background jobs for side effects the request doesn't need to wait for.
+
+``enqueue`` writes a Job row inside the caller's transaction on
+"default", so a rolled-back save there never triggers it; code writing
+to a shard uses ``enqueue_for``, which submits the job once the shard's
+transaction commits. ``manage.py run_worker`` executes the queue.
+
+A worker claims a job by taking a lease that a heartbeat thread renews
+while the job runs; once a lease runs out (the worker died) the job can
+be claimed again, so several workers, on one machine or several sharing
+the database, never run a job twice at the same time. Failures are retried with exponential backoff up to
+``max_attempts``. A claim is one short IMMEDIATE transaction, so SQLite
+is all it needs.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from product_check.sqlite_backend.retry import retry_on_locked
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, "SHOPS_JOB_LEASE_SECONDS", 60))
+
+
+def task_path(func):
+    path = f"{func.__module__}.{func.__qualname__}"
+    try:
+        importable = import_string(path) is func
+    except ImportError:
+        importable = False
+    if not importable:
+        raise ValueError(f"{path} is not importable by its dotted path; jobs must be module-level functions.")
+    return path
+
+
+def submit(task, args=(), kwargs=None, run_at=None, max_attempts=None):
+    """Queue ``task`` (a dotted path) without the eager shortcut."""
+    return Job.objects.create(
+        task=task,
+        args=list(args),
+        kwargs=kwargs or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or getattr(settings, "SHOPS_JOB_MAX_ATTEMPTS", 5),
+    )
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    Queue ``func(*args, **kwargs)`` for a worker. Arguments must be JSON
+    serialisable. Set ``SHOPS_TASKS_EAGER = True`` to run it inline once
+    the transaction commits instead, e.g. while debugging.
+    """
+    if getattr(settings, "SHOPS_TASKS_EAGER", False):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+        return
+    submit(task_path(func), args, kwargs)
+
+
+def enqueue_for(using, func, *args, **kwargs):
+    """
+    ``enqueue`` on behalf of a write to database ``using``. Jobs live on
+    "default", so for a shard the job is queued when the shard's
+    transaction commits (and never if it rolls back); a crash in between
+    loses the job, which is why these jobs are audits that also run on a
+    schedule or best-effort alerts.
+    """
+    if using is None or using == DEFAULT_DB_ALIAS:
+        enqueue(func, *args, **kwargs)
+        return
+    transaction.on_commit(lambda: enqueue(func, *args, **kwargs), using=using)
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _backoff(attempt):
+    base = getattr(settings, "SHOPS_JOB_RETRY_BASE_SECONDS", 10)
+    cap = getattr(settings, "SHOPS_JOB_RETRY_MAX_SECONDS", 3600)
+    delay = min(base * 2 ** (attempt - 1), cap)
+    # Jitter, so jobs that failed together don't all retry together
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+@retry_on_locked
+def claim(worker):
+    """Lease the next due job to ``worker``; None when nothing is due."""
+    with transaction.atomic():
+        while True:
+            now = timezone.now()
+            job = (
+                Job.objects.filter(
+                    Q(status=Job.QUEUED, run_at__lte=now)
+                    | Q(status=Job.RUNNING, lease_expires_at__lt=now)
+                )
+                .order_by("run_at", "id")
+                .first()
+            )
+            if job is None:
+                return None
+            if job.status == Job.RUNNING and job.attempts >= job.max_attempts:
+                # Its last attempt died with the worker
+                job.status = Job.FAILED
+                job.last_error = f"Lease held by {job.locked_by} expired"
+                job.finished_at = now
+                job.save(update_fields=["status", "last_error", "finished_at"])
+                continue
+            job.status = Job.RUNNING
+            job.locked_by = worker
+            job.lease_expires_at = now + _lease()
+            job.attempts += 1
+            job.save(update_fields=["status", "locked_by", "lease_expires_at", "attempts"])
+            return job
+
+
+@retry_on_locked
+def _renew(job_id, worker):
+    return Job.objects.filter(pk=job_id, locked_by=worker, status=Job.RUNNING).update(
+        lease_expires_at=timezone.now() + _lease()
+    )
+
+
+class _Heartbeat(threading.Thread):
+    """Renew a job's lease until stopped."""
+
+    def __init__(self, job_id, worker):
+        super().__init__(name=f"job-{job_id}-heartbeat", daemon=True)
+        self.job_id = job_id
+        self.worker = worker
+        self._stopped = threading.Event()
+
+    def run(self):
+        interval = _lease().total_seconds() / 3
+        try:
+            while not self._stopped.wait(interval):
+                if not _renew(self.job_id, self.worker):
+                    logger.warning("Job %s: lease lost by %s", self.job_id, self.worker)
+                    return
+        except Exception:
+            logger.exception("Job %s: heartbeat failed", self.job_id)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+@retry_on_locked
+def _finish(job, worker, error=None):
+    mine = Job.objects.filter(pk=job.pk, locked_by=worker, status=Job.RUNNING)
+    now = timezone.now()
+    if error is None:
+        mine.update(status=Job.DONE, finished_at=now, lease_expires_at=None, last_error="")
+    elif job.attempts < job.max_attempts:
+        mine.update(status=Job.QUEUED, run_at=now + _backoff(job.attempts), lease_expires_at=None, last_error=error)
+    else:
+        mine.update(status=Job.FAILED, finished_at=now, lease_expires_at=None, last_error=error)
+
+
+def run(job, worker):
+    """Execute a claimed job and record the outcome."""
+    heartbeat = _Heartbeat(job.pk, worker)
+    heartbeat.start()
+    error = None
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        error = traceback.format_exc()
+    finally:
+        heartbeat.stop()
+    _finish(job, worker, error)
+
+
+def work(stop, worker=None, poll=1.0, once=False):
+    """
+    Claim and run jobs until ``stop`` (an Event) is set, sleeping ``poll``
+    seconds while the queue is empty. ``once`` returns when it is empty.
+    """
+    worker = worker or worker_id()
+    while not stop.is_set():
+        close_old_connections()
+        job = claim(worker)
+        if job is None:
+            if once:
+                return
+            stop.wait(poll)
+            continue
+        run(job, worker)
+
+
+def prune():
+    """Delete finished jobs older than SHOPS_JOB_KEEP_DAYS (failed ones stay)."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, "SHOPS_JOB_KEEP_DAYS", 7))
+    Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
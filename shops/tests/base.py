@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from shops import sharding
+from shops.models import Item, Shop
+
+
+@override_settings(SHARD_MAP_TTL=0, SHOPS_TASKS_EAGER=True)
+class ShardedTestCase(TransactionTestCase):
+    """
+    Runs against every database, each shard seeded with its id range as
+    ``init_shards`` does (``manage.py test`` uses two shards by default).
+    """
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command("init_shards", stdout=StringIO())
+
+    def setUp(self):
+        sharding.invalidate_assignments()
+
+    def make_shop(self, name, alias=None):
+        """A shop (with its owner) whose id hashes to ``alias``."""
+        while True:
+            owner = User.objects.create_user(f"{name}-{User.objects.count()}", password="x")
+            shop = Shop.objects.create(user=owner, shop_name=name)
+            if alias is None or sharding.shard_for_shop(shop.pk) == alias:
+                return shop
+            shop.delete()
+            owner.delete()
+
+    def make_item(self, shop, name="Tea", quantity=10, price="2.50"):
+        return sharding.for_shop(Item.objects, shop.pk).create(shop=shop, name=name, quantity=quantity, price=price)
@@ -0,0 +1,36 @@
+import json
+
+from django.urls import reverse
+
+from shops.models import Item
+
+from .base import ShardedTestCase
+
+
+class AvailabilityTests(ShardedTestCase):
+    def check(self, *lines):
+        response = self.client.post(
+            reverse("shops:bulk_availability"),
+            json.dumps({"items": [{"name": name, "quantity": quantity} for name, quantity in lines]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_names_match_regardless_of_case(self):
+        first, second = self.make_shop("First"), self.make_shop("Second")
+        self.make_item(first, name="Äpfel", quantity=5, price="3.00")
+        self.make_item(second, name="äPFEL", quantity=2, price="2.00")
+        self.make_item(second, name="Straße", quantity=1, price="1.00")
+        result = self.check(("ÄPFEL", 2), ("strasse", 1), ("Pears", 1))
+        self.assertEqual([shop["shop_id"] for shop in result["lines"][0]["shops"]], [second.pk, first.pk])
+        self.assertEqual([shop["shop_id"] for shop in result["lines"][1]["shops"]], [second.pk])
+        self.assertEqual(result["lines"][2]["shops"], [])
+        self.assertEqual(result["best_shop"]["shop_id"], second.pk)
+
+    def test_renaming_updates_the_key(self):
+        item = self.make_item(self.make_shop("Renaming"), name="Tea")
+        item.name = "Ölive"
+        item.save(update_fields=["name"])
+        self.assertEqual(Item.objects.using(item._state.db).get(pk=item.pk).name_key, "ölive")
+        self.assertEqual(len(self.check(("ÖLIVE", 1))["lines"][0]["shops"]), 1)
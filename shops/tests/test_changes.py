@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shops import changes, sharding
+from shops.models import CatalogChange
+
+from .base import ShardedTestCase
+
+
+class ChangeFeedTests(ShardedTestCase):
+    def setUp(self):
+        super().setUp()
+        # Items on a shard, the feed on "default"
+        self.shop = self.make_shop("Feed", alias=sharding.shard_aliases()[-1])
+        self.cursor = changes.latest_cursor()
+
+    def feed(self, **params):
+        return self.client.get(reverse("shops:catalog_changes"), params)
+
+    def test_row_is_written_when_the_shard_commits(self):
+        item = self.make_item(self.shop)
+        with transaction.atomic(using=item._state.db):
+            item.name = "Green tea"
+            item.save()
+            self.assertEqual(changes.latest_cursor(), self.cursor + 1)
+        row = CatalogChange.objects.latest("id")
+        self.assertEqual((row.object_id, row.op, row.data["name"]), (item.pk, CatalogChange.UPDATE, "Green tea"))
+
+    def test_rolled_back_save_leaves_no_row(self):
+        item = self.make_item(self.shop)
+        cursor = changes.latest_cursor()
+        try:
+            with transaction.atomic(using=item._state.db):
+                item.quantity = 0
+                item.save(update_fields=["quantity", "updated_at"])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(changes.latest_cursor(), cursor)
+
+    def test_feed_pages_from_the_cursor(self):
+        first = self.make_item(self.shop, name="One")
+        second = self.make_item(self.shop, name="Two")
+        response = self.feed(since=self.cursor, limit=1).json()
+        self.assertEqual([row["object_id"] for row in response["changes"]], [first.pk])
+        self.assertTrue(response["more"])
+        response = self.feed(since=response["cursor"]).json()
+        self.assertEqual([row["object_id"] for row in response["changes"]], [second.pk])
+        self.assertFalse(response["more"])
+
+    @override_settings(CATALOG_CHANGES_KEEP_DAYS=1)
+    def test_pruned_cursor_expires(self):
+        for name in ("One", "Two", "Three"):
+            self.make_item(self.shop, name=name)
+        CatalogChange.objects.update(created_at=timezone.now() - timedelta(days=2))
+        recent = self.make_item(self.shop, name="Four")
+        changes.prune()
+        self.assertEqual(list(CatalogChange.objects.values_list("object_id", flat=True)), [recent.pk])
+        response = self.feed(since=self.cursor)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()["cursor"], changes.latest_cursor())
+        self.assertEqual(self.feed(since=changes.latest_cursor() - 1).status_code, 200)
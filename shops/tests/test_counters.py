@@ -0,0 +1,52 @@
+from decimal import Decimal
+from unittest import mock
+
+from shops import counters, sharding
+from shops.models import Item, ItemRequest, Shop, Transaction, Wishlist
+
+from .base import ShardedTestCase
+
+
+class CounterTests(ShardedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shop = self.make_shop("Counting")
+        self.buyer = self.make_shop("Buyer").user
+        self.items = [self.make_item(self.shop, name=f"Item {n}") for n in range(3)]
+
+    def sell(self, item, quantity):
+        return sharding.for_shop(Transaction.objects, self.shop.pk).create(
+            buyer=self.buyer, seller=self.shop.user, item=item,
+            quantity=quantity, total_price=Decimal("2.50") * quantity,
+        )
+
+    def reload(self, item):
+        return Item.objects.using(item._state.db).get(pk=item.pk)
+
+    def test_signals_keep_counts(self):
+        sale = self.sell(self.items[0], 2)
+        Wishlist.objects.create(user=self.buyer, item=self.items[0])
+        sharding.for_shop(ItemRequest.objects, self.shop.pk).create(user=self.buyer, shop=self.shop, item_name="Milk")
+        item = self.reload(self.items[0])
+        self.assertEqual((item.units_sold, item.wishlist_count), (2, 1))
+        shop = Shop.objects.get(pk=self.shop.pk)
+        self.assertEqual((shop.revenue, shop.pending_requests), (Decimal("5.00"), 1))
+        sale.delete()
+        self.assertEqual(self.reload(self.items[0]).units_sold, 0)
+
+    def test_reconcile_fixes_drift_in_batches(self):
+        for item in self.items:
+            self.sell(item, 1)
+        Wishlist.objects.create(user=self.buyer, item=self.items[2])
+        db = self.items[0]._state.db
+        Item.objects.using(db).filter(pk__in=[item.pk for item in self.items]).update(units_sold=9, wishlist_count=9)
+        Shop.objects.filter(pk=self.shop.pk).update(revenue=0)
+
+        with mock.patch.object(counters, "RECONCILE_BATCH", 2):
+            self.assertEqual(counters.reconcile(), 4)
+        self.assertEqual(
+            [(item.units_sold, item.wishlist_count) for item in map(self.reload, self.items)],
+            [(1, 0), (1, 0), (1, 1)],
+        )
+        self.assertEqual(Shop.objects.get(pk=self.shop.pk).revenue, Decimal("7.50"))
+        self.assertEqual(counters.reconcile(), 0)
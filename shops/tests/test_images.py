@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from shops import images, sharding
+from shops.models import ImageBlob, Item
+from shops.storage import product_images
+
+from .base import ShardedTestCase
+
+
+class ImageBlobTests(ShardedTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.shop = self.make_shop("Pictures", alias=sharding.shard_aliases()[-1])
+        self.item = self.make_item(self.shop)
+
+    def attach(self, item, content=b"picture"):
+        item.image.save("tea.png", ContentFile(content), save=False)
+        item.save()
+        return item.image.name
+
+    def refcount(self, name):
+        return ImageBlob.objects.get(name=name).refcount
+
+    def age(self, name):
+        ImageBlob.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(days=1))
+
+    def test_identical_uploads_share_a_blob(self):
+        other = self.make_item(self.shop, name="Coffee")
+        name = self.attach(self.item)
+        self.assertEqual(self.attach(other), name)
+        self.assertEqual(self.refcount(name), 2)
+        other.delete()
+        self.assertEqual(self.refcount(name), 1)
+
+    def test_rolled_back_save_takes_no_reference(self):
+        name = self.attach(self.item)
+        other = self.make_item(self.shop, name="Coffee")
+        try:
+            with transaction.atomic(using=other._state.db):
+                self.attach(other)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.refcount(name), 1)
+
+    def test_collect_garbage_deletes_unreferenced_blobs(self):
+        name = self.attach(self.item)
+        self.item.image = None
+        self.item.save()
+        self.age(name)
+        self.assertEqual(images.collect_garbage(), len(b"picture"))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertFalse(product_images().exists(name))
+
+    def test_collect_garbage_keeps_blobs_items_point_at(self):
+        name = self.attach(self.item)
+        # As if the item's acquire hadn't run yet
+        ImageBlob.objects.filter(name=name).update(refcount=0)
+        self.age(name)
+        self.assertEqual(images.collect_garbage(), 0)
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(product_images().exists(name))
+        self.assertEqual(Item.objects.using(self.item._state.db).get(pk=self.item.pk).image.name, name)
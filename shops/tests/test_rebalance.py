@@ -0,0 +1,75 @@
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from shops import archive, counters, sharding
+from shops.models import Item, Order, StockMovement, Transaction, Wishlist
+
+from .base import ShardedTestCase
+
+
+@skipUnless(sharding.is_enabled(), "needs SHARD_COUNT > 1")
+class RebalanceTests(ShardedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shop = self.make_shop("Moving", alias="shard_1")
+        self.stay = self.make_shop("Staying", alias="default")
+        self.item = self.make_item(self.shop)
+        self.buyer = self.make_shop("Buyer").user
+        self.order = sharding.for_shop(Order.objects, self.shop.pk).create(
+            user=self.buyer, shop=self.shop, item=self.item, total_price="2.50", status=Order.PAID,
+        )
+        self.sale = sharding.for_shop(Transaction.objects, self.shop.pk).create(
+            buyer=self.buyer, seller=self.shop.user, item=self.item, quantity=1, total_price="2.50",
+        )
+        self.wish = Wishlist.objects.create(user=self.buyer, item=self.item)
+
+    def move(self):
+        call_command("rebalance_shards", shop=self.shop.pk, to="default", stdout=StringIO())
+        sharding.invalidate_assignments()
+
+    def test_moved_rows_take_ids_from_the_target_range(self):
+        self.move()
+        moved = Item.objects.using("default").get(shop=self.shop)
+        self.assertEqual(sharding.shard_for_pk(moved.pk), "default")
+        self.assertFalse(Item.objects.using("shard_1").filter(shop=self.shop).exists())
+
+    def test_new_rows_after_a_move_get_distinct_ids(self):
+        self.move()
+        # The source shard's next id used to be handed out by the target too
+        on_target = self.make_item(self.stay, name="New there")
+        other = self.make_shop("Other", alias="shard_1")
+        on_source = self.make_item(other, name="New here")
+        self.assertEqual(on_target._state.db, "default")
+        self.assertEqual(on_source._state.db, "shard_1")
+        self.assertNotEqual(on_target.pk, on_source.pk)
+        self.assertEqual(sharding.shard_for_pk(on_target.pk), "default")
+        self.assertEqual(sharding.shard_for_pk(on_source.pk), "shard_1")
+
+    def test_references_follow_the_renumbered_rows(self):
+        self.move()
+        item = Item.objects.using("default").get(shop=self.shop)
+        order = Order.objects.using("default").get(shop=self.shop)
+        sale = Transaction.objects.using("default").get(item=item)
+        self.assertEqual(order.item_id, item.pk)
+        self.assertEqual(Wishlist.objects.get(pk=self.wish.pk).item_id, item.pk)
+        self.assertEqual(Wishlist.objects.get(pk=self.wish.pk).item, item)
+        movements = StockMovement.objects.using("default").filter(item_id=item.pk)
+        self.assertTrue(movements.exists())
+        self.assertFalse(StockMovement.objects.using("default").exclude(item_id=item.pk).exists())
+        self.assertEqual(sale.quantity, 1)
+
+    def test_archived_sales_still_count_after_a_move(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(ARCHIVE_DIR=root):
+            archive.archive(archive.TRANSACTIONS, timezone.now())
+            self.move()
+            item = Item.objects.using("default").get(shop=self.shop)
+            units, _ = archive.archived_totals()
+            self.assertEqual(dict(units), {item.pk: 1})
+            Item.objects.using("default").filter(pk=item.pk).update(units_sold=0)
+            counters.reconcile()
+            self.assertEqual(Item.objects.using("default").get(pk=item.pk).units_sold, 1)
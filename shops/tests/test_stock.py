@@ -0,0 +1,51 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from shops import sharding, stock
+from shops.models import Item, StockMovement
+
+from .base import ShardedTestCase
+
+
+class StockLedgerTests(ShardedTestCase):
+    def test_as_of_adds_up_movements_since_the_snapshot(self):
+        shop = self.make_shop("Ledger")
+        item = self.make_item(shop, quantity=10)
+        stock.snapshot()
+        before_sale = timezone.now()
+        item.quantity = 7
+        item.save()
+        items = Item.objects.using(item._state.db).filter(pk=item.pk)
+        self.assertEqual(stock.as_of(items, before_sale).get().stock_as_of, 10)
+        self.assertEqual(stock.as_of(items, timezone.now()).get().stock_as_of, 7)
+        self.assertEqual(stock.drift(items), [])
+
+    def test_drift_reports_unrecorded_writes(self):
+        shop = self.make_shop("Drifting")
+        item = self.make_item(shop, quantity=10)
+        Item.objects.using(item._state.db).filter(pk=item.pk).update(quantity=4)
+        items = Item.objects.using(item._state.db).filter(pk=item.pk)
+        self.assertEqual([(found.pk, ledger) for found, ledger in stock.drift(items)], [(item.pk, 10)])
+
+    @skipUnless(sharding.is_enabled(), "needs SHARD_COUNT > 1")
+    def test_as_of_after_a_rebalance(self):
+        moving = self.make_shop("Moving", alias="shard_1")
+        old = self.make_item(moving, quantity=3)
+        two_days_ago = timezone.now() - timedelta(days=2)
+        StockMovement.objects.using("shard_1").filter(item_id=old.pk).update(created_at=two_days_ago)
+        staying = self.make_shop("Staying", alias="default")
+        new = self.make_item(staying, quantity=5)
+
+        # The moved movement gets the newest id but keeps its old time
+        call_command("rebalance_shards", shop=moving.pk, to="default", stdout=StringIO())
+        sharding.invalidate_assignments()
+
+        yesterday = timezone.now() - timedelta(days=1)
+        items = Item.objects.using("default")
+        self.assertEqual(stock.as_of(items.filter(pk=new.pk), yesterday).get().stock_as_of, 0)
+        self.assertEqual(stock.as_of(items.filter(shop=moving), yesterday).get().stock_as_of, 3)
+        self.assertEqual(stock.as_of(items.filter(pk=new.pk), timezone.now()).get().stock_as_of, 5)
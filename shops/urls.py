@@ -1,6 +1,7 @@
 from django.urls import path
-from . import views
+from . import availability, changes, fulfilment, prices, views
 from .views import search_products
+from .lazy import lazy_view
 app_name = "shops"
 
 urlpatterns = [
@@ -32,6 +33,7 @@ urlpatterns = [
 
     path('request/custom/<int:shop_id>/', views.request_custom_product, name='request_custom_product'),
     path('shopkeeper/<int:shop_id>/requests/', views.view_requests, name='view_requests'),
+    path('shopkeeper/orders/', fulfilment.fulfilment_queue, name='fulfilment_queue'),
     path('user/requests/', views.user_requests, name='user_requests'),
     path('request/<int:request_id>/reply/', views.reply_request, name='reply_request'),
 
@@ -47,10 +49,14 @@ urlpatterns = [
     path('user/close-account/', views.close_account_view, name='close_account'),
     path('place_order/', views.place_order, name='place_order'),
     path('order/confirmation/<str:order_ids>/', views.order_confirmation, name='order_confirmation'),
-    path('order/<int:order_id>/invoice/', views.download_invoice, name='download_invoice'),
+    path('order/<int:order_id>/invoice/', lazy_view('shops.invoices.download_invoice'), name='download_invoice'),
     path("cart/add/<int:item_id>/", views.add_to_cart, name="add_to_cart"),
     path("cart/remove/<int:order_id>/", views.remove_from_cart, name="remove_from_cart"),
     path("cart/", views.cart, name="cart"),
     path('search/', search_products, name="search"),
+    path('search/suggest/', views.search_suggest, name="search_suggest"),
+    path('changes/', changes.catalog_changes, name="catalog_changes"),
+    path('availability/', availability.bulk_availability, name="bulk_availability"),
+    path('prices/', prices.price_history, name="price_history"),
 
 ]
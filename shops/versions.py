@@ -0,0 +1,92 @@
+"""
+Conditional GET. Signals bump a ResourceVersion row per scope ("requests
+of user 7", "the product list", ...) whenever data a page shows changes,
+and ``conditional_view`` turns those rows into an ETag/Last-Modified, so
+a repeat visit gets a 304 from one indexed lookup instead of the page's
+querysets and template.
+"""
+import hashlib
+import time
+
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .models import ResourceVersion
+
+PRODUCTS = "products"
+SHOPS = "shops"
+# Bumped when an item is added, renamed or removed (not on stock changes)
+ITEM_NAMES = "item-names"
+# Bumped when a username changes (request lists show them)
+USER_NAMES = "user-names"
+
+
+def user_requests(user_id):
+    return f"requests:user:{user_id}"
+
+
+def shop_requests(shop_id):
+    return f"requests:shop:{shop_id}"
+
+
+def wishlist(user_id):
+    return f"wishlist:user:{user_id}"
+
+
+def bump(*scopes):
+    """Mark scopes changed: one upsert, however many scopes."""
+    now = timezone.now()
+    version = time.time_ns()
+    ResourceVersion.objects.bulk_create(
+        [ResourceVersion(scope=scope, version=version, updated_at=now) for scope in set(scopes)],
+        update_conflicts=True,
+        unique_fields=["scope"],
+        update_fields=["version", "updated_at"],
+    )
+
+
+def _state(request, scopes):
+    # condition() asks for the ETag and Last-Modified separately; look up once
+    if getattr(request, "_resource_versions", None) is None:
+        rows = {
+            scope: (version, updated_at)
+            for scope, version, updated_at in ResourceVersion.objects.filter(scope__in=scopes)
+            .values_list("scope", "version", "updated_at")
+        }
+        user = request.user
+        # The page differs per viewer and embeds the CSRF token; a fresh
+        # login bumps last_login, so older copies are never revalidated
+        key = [
+            str(user.pk),
+            request.COOKIES.get("csrftoken", ""),
+            *(f"{scope}={rows.get(scope, (0,))[0]}" for scope in scopes),
+        ]
+        stamps = [updated_at for _, updated_at in rows.values()]
+        if user.is_authenticated and user.last_login:
+            stamps.append(user.last_login)
+        request._resource_versions = (
+            hashlib.sha1("|".join(key).encode()).hexdigest(),
+            max(stamps) if stamps else None,
+        )
+    return request._resource_versions
+
+
+def conditional_view(scopes_for):
+    """
+    Answer ``If-None-Match``/``If-Modified-Since`` with 304 before the view
+    runs. ``scopes_for(request, *args, **kwargs)`` lists the scopes the
+    page depends on. Place below ``login_required``.
+    """
+    def decorator(view):
+        def etag(request, *args, **kwargs):
+            return _state(request, scopes_for(request, *args, **kwargs))[0]
+
+        def last_modified(request, *args, **kwargs):
+            return _state(request, scopes_for(request, *args, **kwargs))[1]
+
+        wrapped = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        # Browsers must revalidate, and shared caches must not store it
+        return cache_control(private=True, no_cache=True)(vary_on_cookie(wrapped))
+    return decorator
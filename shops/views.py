@@ -5,14 +5,21 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.http import JsonResponse, HttpResponse
 import datetime
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from django.http import FileResponse
-from .models import Profile, Shop, Item, ItemRequest, Transaction, Order, Wishlist, Recommendation
-
-from django.db.models import Q
+import logging
+import time
+from decimal import Decimal
+from .models import Profile, Shop, Item, ItemRequest, Transaction, Order, Wishlist, Recommendation, Notification
+from .models import AccountClosure, StockMovement
+from . import tasks
+from .closure import purge_account
+from . import archive, facets, search_index, sharding, stock, versions
+
+from django.db.models import Q, Sum
 from .models import Product
+from product_check.jsonlog import lazy
+
+logger = logging.getLogger(__name__)
+search_logger = logging.getLogger("shops.search")
 
 
 
@@ -110,23 +117,31 @@ def user_dashboard(request):
                 profile.address = value
             elif field == "password":
                 user.set_password(value)
-                update_session_auth_hash(request, user)  # keep user logged in
 
-            user.save()
+            # Write only the column that changed (profile.save() is a no-op if untouched)
+            if field in ("username", "email", "password"):
+                user.save(update_fields=[field])
+                if field == "password":
+                    update_session_auth_hash(request, user)  # keep user logged in
             profile.save()
             return JsonResponse({"success": True, "field": field, "value": value})
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)})
 
     # ---- Normal GET request: render dashboard ----
-    shops = Shop.objects.prefetch_related("items").all()
-    requests = ItemRequest.objects.filter(user=user).select_related("shop", "item")
-    orders = Order.objects.filter(user=user).order_by("-id")
+    shops = list(Shop.objects.all())
+    sharding.prefetch_by_shop(shops, "items")
+    requests = sharding.fan_out(
+        ItemRequest.objects.filter(user=user).select_related("item").prefetch_related("shop")
+    )
+    # Newest orders first; older pages read through to the archive
+    orders, older_orders = archive.page(archive.ORDERS, user.pk, request.GET.get("orders_before"))
 
     return render(request, "shops/user_dashboard.html", {
         "shops": shops,
         "requests": requests,
         "orders": orders,
+        "older_orders": older_orders,
         "profile": profile
     })
 
@@ -148,13 +163,15 @@ def update_profile(request):
                 profile.phone = value
             elif field == "password":
                 user.set_password(value)
-                update_session_auth_hash(request, user)  # keep user logged in
             elif field == "address":
                 profile.address = value
             else:
                 return JsonResponse({"success": False, "error": "Invalid field"})
 
-            user.save()
+            if field in ("username", "email", "password"):
+                user.save(update_fields=[field])
+                if field == "password":
+                    update_session_auth_hash(request, user)  # keep user logged in
             profile.save()
             return JsonResponse({"success": True, "field": field, "value": value})
         except Exception as e:
@@ -206,13 +223,15 @@ def shopkeeper_dashboard(request):
         return redirect("shops:home")
 
     # ---- Fetch all items (no pagination) ----
-    items = Item.objects.filter(shop=shop).order_by('-item_id')
+    # Counter columns sort without touching sales or wishlists (shops/counters.py)
+    sort = request.GET.get("sort")
+    ordering = {"best": ("-units_sold", "-item_id"), "wanted": ("-wishlist_count", "-item_id")}.get(sort, ("-item_id",))
+    items = sharding.for_shop(Item.objects, shop.id).filter(shop=shop).order_by(*ordering)
 
     # ---- Fetch requests and transactions ----
-    requests = ItemRequest.objects.filter(shop=shop).order_by("-created_at")
-    sold_transactions = Transaction.objects.filter(
-        seller=request.user
-    ).select_related("item", "buyer").order_by("-date")
+    requests = sharding.for_shop(ItemRequest.objects, shop.id).filter(shop=shop).order_by("-created_at")
+    # Newest sales first; older pages read through to the archive
+    sold_transactions, older_sales = archive.page(archive.TRANSACTIONS, request.user.pk, request.GET.get("sales_before"))
 
     # ---- Handle Profile + Shop update ----
     if request.method == "POST" and "update_profile" in request.POST:
@@ -220,13 +239,19 @@ def shopkeeper_dashboard(request):
         profile = user.profile
         shop = user.shop 
 
-        user.username = request.POST.get("username", user.username)
-        user.email = request.POST.get("email", user.email)
+        # User isn't dirty-tracked, so collect its changed columns by hand
+        changed = []
+        for field in ("username", "email"):
+            value = request.POST.get(field, getattr(user, field))
+            if value != getattr(user, field):
+                setattr(user, field, value)
+                changed.append(field)
         shop.shop_name = request.POST.get("shop_name", shop.shop_name)
         profile.phone = request.POST.get("phone", profile.phone)
         profile.address = request.POST.get("address", profile.address)
 
-        user.save()
+        if changed:
+            user.save(update_fields=changed)
         shop.save()
         profile.save()
         messages.success(request, "✅ Profile & Shop updated successfully!")
@@ -242,14 +267,16 @@ def shopkeeper_dashboard(request):
         try:
             image = request.FILES.get("image")
             if name and quantity and price:
-                Item.objects.create(
-                    shop=shop,
-                    name=name,
-                    quantity=int(quantity),
-                    price=float(price),
-                    description=description,
-                    image=image 
-                )
+                # The item and its opening stock movement commit together
+                with transaction.atomic(using=sharding.shard_for_shop(shop.id)):
+                    sharding.for_shop(Item.objects, shop.id).create(
+                        shop=shop,
+                        name=name,
+                        quantity=int(quantity),
+                        price=float(price),
+                        description=description,
+                        image=image
+                    )
                 messages.success(request, "✅ Product added successfully!")
             else:
                 messages.error(request, "⚠️ Please fill required fields.")
@@ -264,7 +291,7 @@ def shopkeeper_dashboard(request):
         reply_message = request.POST.get("reply_message", "")
 
         try:
-            item_request = ItemRequest.objects.get(id=request_id, shop=shop)
+            item_request = sharding.for_shop(ItemRequest.objects, shop.id).get(id=request_id, shop=shop)
             if action == "approve":
                 item_request.status = "Approved"
             elif action == "reject":
@@ -282,8 +309,10 @@ def shopkeeper_dashboard(request):
     return render(request, "shops/shopkeeper_dashboard.html", {
         "shop": shop,
         "items": items,  # all items, no pagination
+        "sort": sort,
         "requests": requests,
         "sold_transactions": sold_transactions,
+        "older_sales": older_sales,
     })
 
 
@@ -307,7 +336,7 @@ def shopkeeper_login(request):
 
 @login_required
 def edit_product(request, item_id):
-    item = get_object_or_404(Item, pk=item_id)
+    item = sharding.get_or_404(Item.objects, pk=item_id)
 
     if request.method == "POST":
         # Update fields safely
@@ -329,7 +358,9 @@ def edit_product(request, item_id):
             except ValueError:
                 pass  # keep old value if invalid
 
-        item.save()
+        # With its stock movement, if the quantity changed
+        with transaction.atomic(using=item._state.db):
+            item.save()
 
         # Return JSON for AJAX requests
         if request.headers.get("x-requested-with") == "XMLHttpRequest":
@@ -348,7 +379,7 @@ def edit_product(request, item_id):
 
 @login_required
 def delete_product(request, item_id):
-    product = get_object_or_404(Item, pk=item_id)
+    product = sharding.get_or_404(Item.objects, pk=item_id)
     if request.user != product.shop.user:
         return HttpResponse("❌ Forbidden", status=403)
     if request.method == "POST":
@@ -357,6 +388,22 @@ def delete_product(request, item_id):
         return redirect("shops:shopkeeper_dashboard")
     return render(request, "shops/delete_product.html", {"item": product})
 
+def _stocked_match(shop, item_name):
+    """The shop's in-stock item closest to a typed name, if any ("tomatos" -> Tomato)."""
+    names = [name for name, _, _, _ in search_index.get_index().similar_items(item_name, 5)]
+    if not names:
+        return None
+    spelled = Q()
+    for name in names:
+        spelled |= Q(name__iexact=name)
+    matches = {
+        item.name.casefold(): item
+        for item in sharding.for_shop(Item.objects, shop.id).filter(spelled, shop=shop, quantity__gt=0)
+    }
+    # Closest name first
+    return next((matches[name.casefold()] for name in names if name.casefold() in matches), None)
+
+
 @login_required
 def send_request(request, shop_id):
     """
@@ -378,10 +425,14 @@ def send_request(request, shop_id):
             messages.error(request, "⚠️ Please enter product name and quantity.")
             return redirect("shops:user_dashboard")
 
+        # Typed name of something the shop already has: link the request to it
+        stocked = _stocked_match(shop, item_name)
+
         # ✅ Request create hoga (same model jise dashboard use kar raha hai)
-        new_request = ItemRequest.objects.create(
+        new_request = sharding.for_shop(ItemRequest.objects, shop.id).create(
             user=request.user,
             shop=shop,
+            item=stocked,
             item_name=item_name,
             quantity=quantity,
             status="Pending"
@@ -398,10 +449,13 @@ def send_request(request, shop_id):
                     "quantity": new_request.quantity,
                     "status": new_request.status,
                     "created_at": new_request.created_at.strftime("%d %b %Y %H:%M"),
-                }
+                },
+                "in_stock": stocked and {"item_id": stocked.pk, "name": stocked.name, "quantity": stocked.quantity},
             })
 
         # Agar normal form submit:
+        if stocked:
+            messages.info(request, f"ℹ️ {shop.shop_name} already has {stocked.name} in stock ({stocked.quantity} left).")
         messages.success(request, "✅ Request sent successfully!")
         return redirect("shops:user_dashboard")
 
@@ -411,9 +465,17 @@ def send_request(request, shop_id):
 
 # ---------------- Wishlist & Recommendations ----------------
 @login_required
+@versions.conditional_view(lambda request: [versions.wishlist(request.user.pk)])
 def wishlist_view(request):
     items = Wishlist.objects.filter(user=request.user)
-    return render(request, "shops/user_wishlist.html", {"items": items})
+    notifications = list(
+        Notification.objects.filter(user=request.user, is_read=False).order_by("-created_at")[:20]
+    )
+    if notifications:
+        Notification.objects.filter(id__in=[n.id for n in notifications]).update(is_read=True)
+        # The next visit no longer shows them
+        versions.bump(versions.wishlist(request.user.pk))
+    return render(request, "shops/user_wishlist.html", {"items": items, "notifications": notifications})
 
 
 @login_required
@@ -424,7 +486,7 @@ def recommendation_view(request):
 
 @login_required
 def add_to_cart(request, item_id):
-    item = get_object_or_404(Item, pk=item_id)
+    item = sharding.get_or_404(Item.objects, pk=item_id)
     quantity = int(request.POST.get('quantity', 1))
 
     cart_item, created = CartItem.objects.get_or_create(
@@ -444,8 +506,12 @@ def add_to_cart(request, item_id):
 def close_account_view(request):
     if request.method == "POST":
         user = request.user
+        # Lock the account now; the cascade is deleted in the background
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        closure = AccountClosure.objects.create(user_id=user.pk, username=user.username)
         logout(request)
-        user.delete()
+        tasks.enqueue(purge_account, closure.pk)
         messages.success(request, "✅ Your account has been closed permanently.")
         return redirect("shops:home")
 
@@ -468,14 +534,19 @@ def request_custom_product(request, shop_id):
         item_name = custom_name
 
         if item_id:
-            item = get_object_or_404(Item, id=item_id, shop=shop)
+            item = get_object_or_404(sharding.for_shop(Item.objects, shop.id), pk=item_id, shop=shop)
             item_name = item.name  # use actual product name
 
         if not item and not custom_name:
             messages.error(request, "⚠️ Please specify an existing item or enter a custom product name.")
             return redirect("shops:shop_detail", shop_id=shop.id)
 
-        ItemRequest.objects.create(
+        if not item:
+            item = _stocked_match(shop, custom_name)
+            if item:
+                messages.info(request, f"ℹ️ {shop.shop_name} already has {item.name} in stock.")
+
+        sharding.for_shop(ItemRequest.objects, shop.id).create(
             user=request.user,
             shop=shop,
             item=item,
@@ -491,6 +562,11 @@ def request_custom_product(request, shop_id):
 
 
 @login_required
+@versions.conditional_view(
+    lambda request, shop_id: [
+        versions.shop_requests(shop_id), versions.SHOPS, versions.ITEM_NAMES, versions.USER_NAMES,
+    ]
+)
 def view_requests(request, shop_id):
     """
     Shopkeeper: View all requests for their shop.
@@ -501,7 +577,10 @@ def view_requests(request, shop_id):
         messages.error(request, "⚠️ You are not authorized to view these requests.")
         return redirect("shops:home")
 
-    requests_qs = ItemRequest.objects.filter(shop=shop).select_related("user", "item").order_by('-created_at')
+    requests_qs = (
+        sharding.for_shop(ItemRequest.objects, shop.id).filter(shop=shop)
+        .select_related("item").prefetch_related("user").order_by('-created_at')
+    )
 
     return render(request, "shops/view_requests.html", {
         "shop": shop,
@@ -515,7 +594,7 @@ def reply_request(request, request_id):
     Shopkeeper: Approve/Reject and/or reply to a user request.
     Supports AJAX.
     """
-    item_request = get_object_or_404(ItemRequest, id=request_id)
+    item_request = sharding.get_or_404(ItemRequest.objects, pk=request_id)
     if request.user != item_request.shop.user:
         if request.is_ajax():
             return JsonResponse({"success": False, "error": "Unauthorized"}, status=403)
@@ -548,11 +627,16 @@ def reply_request(request, request_id):
 
 
 @login_required
+@versions.conditional_view(
+    lambda request: [versions.user_requests(request.user.pk), versions.SHOPS, versions.USER_NAMES]
+)
 def user_requests(request):
     """
     Customer: view their own submitted requests.
     """
-    requests = ItemRequest.objects.filter(user=request.user).select_related("shop", "item")
+    requests = sharding.fan_out(
+        ItemRequest.objects.filter(user=request.user).select_related("item").prefetch_related("shop")
+    )
 
     return render(request, "shops/user_requests.html", {
         "requests": requests
@@ -563,7 +647,7 @@ def buy_item(request, item_id):
     """
     Add a single item to a temporary checkout order and redirect to checkout page.
     """
-    item = get_object_or_404(Item, pk=item_id)
+    item = sharding.get_or_404(Item.objects, pk=item_id)
 
     if request.method == "POST":
         try:
@@ -581,8 +665,9 @@ def buy_item(request, item_id):
             return redirect("shops:user_dashboard")
 
         # Create a pending Order (status="Pending")
-        Order.objects.create(
+        sharding.for_shop(Order.objects, item.shop_id).create(
             user=request.user,
+            shop_id=item.shop_id,
             item=item,
             quantity=quantity,
             total_price=item.price * quantity,
@@ -595,11 +680,158 @@ def buy_item(request, item_id):
 
     return redirect("shops:user_dashboard")
 
-from django.utils import timezone  
-from django.views.decorators.csrf import csrf_exempt
-import io
-from django.template.loader import render_to_string
-from xhtml2pdf import pisa
+from django.db import OperationalError, transaction
+from product_check.sqlite_backend.retry import retry_on_locked
+
+# ---------------- Cart / checkout writes ----------------
+# Each helper is one short transaction (BEGIN IMMEDIATE, see settings) that
+# re-reads its rows, so a retry after "database is locked" starts clean.
+
+def _pending_total(user):
+    """Cart total as one SUM per shard over the (user, status) index."""
+    total = Decimal("0.00")  # SQLite's SUM drops the scale
+    for orders in sharding.each_shard(Order.objects.filter(user=user, status="Pending")):
+        total += orders.aggregate(total=Sum("total_price"))["total"] or 0
+    return total
+
+
+@retry_on_locked
+def _set_order_quantity(db, order_id, quantity):
+    """Returns the order and how much the cart total changed."""
+    with transaction.atomic(using=db):
+        order = Order.objects.using(db).select_related("item").get(pk=order_id)
+        old_total = order.total_price
+        order.item.quantity += order.quantity - quantity
+        stock.note(order.item, StockMovement.CART, order=order)
+        order.quantity = quantity
+        order.total_price = order.quantity * order.item.price
+        order.item.save()
+        order.save()
+    return order, order.total_price - old_total
+
+
+@retry_on_locked
+def _remove_order(db, order_id):
+    """Returns how much the cart total changed."""
+    with transaction.atomic(using=db):
+        order = Order.objects.using(db).select_related("item").get(pk=order_id)
+        order.item.quantity += order.quantity
+        stock.note(order.item, StockMovement.CART_REMOVE, order=order)
+        order.item.save()
+        order.delete()
+    return -order.total_price
+
+
+def _pay_pending_orders(user, payment_method):
+    """
+    Mark the user's pending orders paid, take the stock and record the
+    sales. Returns ``(paid order ids, complete)``: each shard commits on
+    its own, so a shard still locked after its retries keeps its orders
+    pending while the other shards' orders stay paid.
+    """
+    processed_order_ids = []
+    complete = True
+    for db in sharding.shard_aliases():
+        try:
+            processed_order_ids += _pay_pending_orders_on(db, user, payment_method)
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            logger.warning("Checkout for user %s: %s still locked, its orders stay pending", user.pk, db)
+            complete = False
+    return processed_order_ids, complete
+
+
+@retry_on_locked
+def _pay_pending_orders_on(db, user, payment_method):
+    # One transaction per shard: a shard's orders, stock and sales commit together
+    processed_order_ids = []
+    with transaction.atomic(using=db):
+        orders = (
+            Order.objects.using(db).filter(user=user, status="Pending")
+            .select_related("item").prefetch_related("item__shop")
+        )
+        for order in orders:
+            order.status = Order.PAID
+            order.payment_method = payment_method
+            # Carts from before Order.shop was filled in
+            order.shop_id = order.shop_id or order.item.shop_id
+            order.save()
+            processed_order_ids.append(str(order.id))
+
+            # Create Transaction for each order
+            sale = Transaction.objects.using(db).create(
+                buyer=user,
+                seller_id=order.item.shop.user_id,
+                item=order.item,
+                quantity=order.quantity,
+                total_price=order.total_price
+            )
+
+            # Reduce stock
+            order.item.quantity -= order.quantity
+            stock.note(order.item, StockMovement.SALE, order=order, sale=sale)
+            order.item.save()
+    return processed_order_ids
+
+
+def _payment_response(request, processed_order_ids, complete, success_message):
+    """Confirmation for a checkout, saying so when only part of the cart went through."""
+    if not processed_order_ids:
+        messages.error(request, "⚠️ The shop is busy right now and nothing was charged. Please try again.")
+        return redirect("shops:checkout")
+    if complete:
+        messages.success(request, success_message)
+    else:
+        messages.warning(
+            request,
+            "⚠️ Only part of your order went through. The rest is still in your cart; please place it again.",
+        )
+    return redirect("shops:order_confirmation", order_ids=",".join(processed_order_ids))
+
+
+def _cart_ajax(request, user):
+    """
+    Quantity change / remove for the cart and checkout pages (None = unknown
+    action). Responses carry the change to the cart total ("delta") rather
+    than a recomputed cart; the page already holds the other lines.
+    """
+    action = request.POST.get("action")
+    order_id = request.POST.get("order_id")
+    order = sharding.get_or_404(Order.objects.select_related("item"), pk=order_id, user=user)
+    db = sharding.shard_for_shop(order.item.shop_id)
+
+    if action == "update_quantity":
+        try:
+            quantity = int(request.POST.get("quantity", order.quantity))
+            if quantity <= 0:
+                return JsonResponse({"success": False, "error": "Quantity must be at least 1."})
+            elif quantity > order.item.quantity + order.quantity:
+                return JsonResponse({"success": False, "error": "Not enough stock available."})
+
+            # Adjust stock & price
+            order, delta = _set_order_quantity(db, order.id, quantity)
+
+            return JsonResponse({
+                "success": True,
+                "order_id": order.id,
+                "quantity": order.quantity,
+                "subtotal": order.total_price,
+                "delta": delta,
+            })
+        except ValueError:
+            return JsonResponse({"success": False, "error": "Invalid quantity."})
+
+    elif action == "remove_order":
+        delta = _remove_order(db, order.id)
+        return JsonResponse({
+            "success": True,
+            "order_id": order_id,
+            "delta": delta,
+        })
+
+    return None
+
 
 @login_required
 def checkout(request):
@@ -608,53 +840,19 @@ def checkout(request):
     """
     user = request.user
     profile = user.profile
-    orders = Order.objects.filter(user=user, status="Pending")
-    total_amount = sum(o.total_price for o in orders)
 
     # ---------------- AJAX updates (quantity change / remove item) ----------------
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
-        action = request.POST.get("action")
-        order_id = request.POST.get("order_id")
-        order = get_object_or_404(Order, id=order_id, user=user)
+        response = _cart_ajax(request, user)
+        if response is not None:
+            return response
 
-        if action == "update_quantity":
-            try:
-                quantity = int(request.POST.get("quantity", order.quantity))
-                if quantity <= 0:
-                    return JsonResponse({"success": False, "error": "Quantity must be at least 1."})
-                elif quantity > order.item.quantity + order.quantity:
-                    return JsonResponse({"success": False, "error": "Not enough stock available."})
-
-                # Adjust total price and quantity
-                order.item.quantity += order.quantity - quantity
-                order.quantity = quantity
-                order.total_price = order.quantity * order.item.price
-                order.item.save()
-                order.save()
-
-                return JsonResponse({
-                    "success": True,
-                    "order_id": order.id,
-                    "quantity": order.quantity,
-                    "subtotal": order.total_price,
-                    "total_amount": sum(o.total_price for o in Order.objects.filter(user=user, status="Pending"))
-                })
-            except ValueError:
-                return JsonResponse({"success": False, "error": "Invalid quantity."})
-
-        elif action == "remove_order":
-            order.item.quantity += order.quantity
-            order.item.save()
-            order.delete()
-            return JsonResponse({
-                "success": True,
-                "order_id": order_id,
-                "total_amount": sum(o.total_price for o in Order.objects.filter(user=user, status="Pending"))
-            })
+    orders = sharding.fan_out(Order.objects.filter(user=user, status="Pending").select_related("item"))
+    total_amount = _pending_total(user)
 
     # ---------------- Normal POST request (Place Order) ----------------
     if request.method == "POST" and not request.headers.get("x-requested-with"):
-        if not orders.exists():
+        if not orders:
             messages.warning(request, "⚠️ No items in your cart to place order.")
             return redirect("shops:user_dashboard")
 
@@ -664,30 +862,10 @@ def checkout(request):
             profile.save()
 
         payment_method = request.POST.get("payment_method", "COD")
-        processed_order_ids = []
-
-        for order in orders:
-            order.status = "Paid"
-            order.payment_method = payment_method
-            order.paid_at = timezone.now()
-            order.save()
-            processed_order_ids.append(str(order.id))
-
-            # Reduce stock
-            order.item.quantity -= order.quantity
-            order.item.save()
-
-            # Create Transaction for each order
-            Transaction.objects.create(
-                buyer=user,
-                seller=order.item.shop.user,
-                item=order.item,
-                quantity=order.quantity,
-                total_price=order.total_price
-            )
-
-        messages.success(request, "✅ Payment successful! Your orders are confirmed.")
-        return redirect("shops:order_confirmation", order_ids=",".join(processed_order_ids))
+        processed_order_ids, complete = _pay_pending_orders(user, payment_method)
+        return _payment_response(
+            request, processed_order_ids, complete, "✅ Payment successful! Your orders are confirmed."
+        )
 
     # ---------------- Normal page load ----------------
     return render(request, "shops/checkout.html", {
@@ -705,9 +883,9 @@ def place_order(request):
     """
     user = request.user
     profile = user.profile
-    orders = Order.objects.filter(user=user, status="Pending")
+    has_orders = any(qs.exists() for qs in sharding.each_shard(Order.objects.filter(user=user, status="Pending")))
 
-    if not orders.exists():
+    if not has_orders:
         messages.warning(request, "⚠️ No items in your cart to place order.")
         return redirect("shops:user_dashboard")
 
@@ -718,30 +896,10 @@ def place_order(request):
             profile.save()
 
         payment_method = request.POST.get("payment_method", "COD")
-        processed_order_ids = []
-
-        for order in orders:
-            order.status = "Paid"
-            order.paid_at = timezone.now()
-            order.payment_method = payment_method
-            order.save()
-            processed_order_ids.append(str(order.id))
-
-            # Reduce stock
-            order.item.quantity -= order.quantity
-            order.item.save()
-
-            # Create Transaction for each order
-            Transaction.objects.create(
-                buyer=user,
-                seller=order.item.shop.user,
-                item=order.item,
-                quantity=order.quantity,
-                total_price=order.total_price
-            )
-
-        messages.success(request, "✅ Your order has been placed successfully!")
-        return redirect("shops:order_confirmation", order_ids=",".join(processed_order_ids))
+        processed_order_ids, complete = _pay_pending_orders(user, payment_method)
+        return _payment_response(
+            request, processed_order_ids, complete, "✅ Your order has been placed successfully!"
+        )
 
     return redirect("shops:checkout")
 
@@ -752,7 +910,7 @@ def order_confirmation(request, order_ids):
     Displays a stylish order confirmation page.
     """
     ids = [int(i) for i in order_ids.split(",")]
-    orders = Order.objects.filter(id__in=ids, user=request.user)
+    orders = sharding.fan_out(Order.objects.filter(id__in=ids, user=request.user).select_related("item"))
     total_amount = sum(o.total_price for o in orders)
 
     return render(request, "shops/order_confirmation.html", {
@@ -762,48 +920,13 @@ def order_confirmation(request, order_ids):
         "profile": request.user.profile,
     })
 
-@login_required
-def download_invoice(request, order_id):
-    """Generate PDF invoice for an order"""
-    order = get_object_or_404(Order, pk=order_id, user=request.user)
-
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Invoice Header
-    p.setFont("Helvetica-Bold", 18)
-    p.drawString(200, height - 50, "INVOICE")
-
-    # Order Info
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 100, f"Invoice No: {order.id}")
-    p.drawString(50, height - 120, f"Customer: {order.user.username}")
-    p.drawString(50, height - 140, f"Shop: {order.item.shop.shop_name}")
-    p.drawString(50, height - 160, f"Item: {order.item.name}")
-    p.drawString(50, height - 180, f"Quantity: {order.quantity}")
-    p.drawString(50, height - 200, f"Total Price: ₹{order.total_price}")
-    p.drawString(50, height - 220, f"Payment Method: {order.payment_method}")
-    p.drawString(50, height - 240, f"Order Date: {order.created_at.strftime('%d-%m-%Y %H:%M')}")
-
-    # Footer
-    p.setFont("Helvetica-Oblique", 10)
-    p.drawString(50, 50, "Thank you for shopping with us!")
-
-    p.showPage()
-    p.save()
-
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=f"invoice_{order.id}.pdf")
-
-
 @login_required
 def add_to_cart(request, item_id):
     """
     Add a product to the cart (Pending orders).
     If item already in cart → increase quantity.
     """
-    item = get_object_or_404(Item, pk=item_id)
+    item = sharding.get_or_404(Item.objects, pk=item_id)
 
     if request.method == "POST":
         try:
@@ -821,11 +944,11 @@ def add_to_cart(request, item_id):
             return redirect("shops:user_dashboard")
 
         # Check if already in cart (Pending order)
-        order, created = Order.objects.get_or_create(
+        order, created = sharding.for_shop(Order.objects, item.shop_id).get_or_create(
             user=request.user,
             item=item,
             status="Pending",
-            defaults={"quantity": quantity, "total_price": item.price * quantity}
+            defaults={"shop_id": item.shop_id, "quantity": quantity, "total_price": item.price * quantity}
         )
 
         if not created:
@@ -843,7 +966,7 @@ def remove_from_cart(request, order_id):
     """
     Remove a product from the cart.
     """
-    order = get_object_or_404(Order, pk=order_id, user=request.user, status="Pending")
+    order = sharding.get_or_404(Order.objects, pk=order_id, user=request.user, status="Pending")
     order.delete()
     messages.info(request, "🗑️ Item removed from your cart.")
     return redirect("shops:checkout")
@@ -854,49 +977,15 @@ def cart(request):
     Cart page with AJAX quantity update & remove.
     """
     user = request.user
-    cart_items = Order.objects.filter(user=user, status="Pending")
-    total_amount = sum(o.total_price for o in cart_items)
 
     # Handle AJAX requests
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
-        action = request.POST.get("action")
-        order_id = request.POST.get("order_id")
-        order = get_object_or_404(Order, id=order_id, user=user)
-
-        if action == "update_quantity":
-            try:
-                quantity = int(request.POST.get("quantity", order.quantity))
-                if quantity <= 0:
-                    return JsonResponse({"success": False, "error": "Quantity must be at least 1."})
-                elif quantity > order.item.quantity + order.quantity:
-                    return JsonResponse({"success": False, "error": "Not enough stock available."})
-
-                # Adjust stock & price
-                order.item.quantity += order.quantity - quantity
-                order.quantity = quantity
-                order.total_price = order.quantity * order.item.price
-                order.item.save()
-                order.save()
-
-                return JsonResponse({
-                    "success": True,
-                    "order_id": order.id,
-                    "quantity": order.quantity,
-                    "subtotal": order.total_price,
-                    "total_amount": sum(o.total_price for o in Order.objects.filter(user=user, status="Pending"))
-                })
-            except ValueError:
-                return JsonResponse({"success": False, "error": "Invalid quantity."})
+        response = _cart_ajax(request, user)
+        if response is not None:
+            return response
 
-        elif action == "remove_order":
-            order.item.quantity += order.quantity
-            order.item.save()
-            order.delete()
-            return JsonResponse({
-                "success": True,
-                "order_id": order_id,
-                "total_amount": sum(o.total_price for o in Order.objects.filter(user=user, status="Pending"))
-            })
+    cart_items = sharding.fan_out(Order.objects.filter(user=user, status="Pending").select_related("item"))
+    total_amount = _pending_total(user)
 
     return render(request, "shops/cart.html", {
         "cart_items": cart_items,
@@ -906,7 +995,8 @@ def cart(request):
 @login_required
 def handle_request_action(request, request_id):
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
-        item_request = get_object_or_404(ItemRequest, id=request_id, shop=request.user.shop)
+        shop = request.user.shop
+        item_request = get_object_or_404(sharding.for_shop(ItemRequest.objects, shop.id), id=request_id, shop=shop)
         action = request.POST.get("action")
         reply = request.POST.get("reply", "")
 
@@ -925,32 +1015,75 @@ def handle_request_action(request, request_id):
 
 
 
+def search_suggest(request):
+    """Autocomplete for item and shop names, answered from the in-memory index."""
+    query = request.GET.get("q", "")[:100]
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 8)), search_index.RESULTS))
+    except ValueError:
+        limit = 8
+    items, shops = search_index.get_index().suggest(query, limit)
+    return JsonResponse({
+        "query": query,
+        "items": [{"name": name, "stock": stock, "shops": carriers} for name, stock, carriers in items],
+        "shops": [{"name": name} for name, _, _ in shops],
+    })
+
+
+@versions.conditional_view(lambda request: [versions.PRODUCTS, versions.ITEM_NAMES])
 def search_products(request):
+    started = time.perf_counter()
     query = request.GET.get('q', '')
-    print("SEARCH QUERY =", query)
-
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
 
-    print("MIN PRICE =", min_price)
-    print("MAX PRICE =", max_price)
+    priced = Product.objects.all()
+    if min_price:
+        priced = priced.filter(price__gte=int(min_price))
+    if max_price:
+        priced = priced.filter(price__lte=int(max_price))
 
-    products = Product.objects.all()
-    print("TOTAL PRODUCTS =", products.count())
+    shop = request.GET.get('shop')
+    if shop:
+        priced = priced.filter(shop_name=shop)
 
+    products = priced
     if query:
-        products = products.filter(
+        products = priced.filter(
             Q(product_name__icontains=query) |
             Q(shop_name__icontains=query)
         )
-        print("AFTER QUERY FILTER =", products.count())
 
-    if min_price:
-        products = products.filter(price__gte=int(min_price))
-        print("AFTER MIN PRICE FILTER =", products.count())
-
-    if max_price:
-        products = products.filter(price__lte=int(max_price))
-        print("AFTER MAX PRICE FILTER =", products.count())
-
-    return render(request, 'search.html', {'products': products})
+    # Nothing matched as typed: retry with the closest item names
+    did_you_mean = []
+    if query and not products.exists():
+        did_you_mean = [name for name, _, _, _ in search_index.get_index().similar_items(query, 5)]
+        if did_you_mean:
+            spelled = Q()
+            for name in did_you_mean:
+                spelled |= Q(product_name__icontains=name)
+            products = priced.filter(spelled)
+
+    # The bare search page reads the precomputed counts; any filter costs
+    # one grouped query over what it matched
+    if query or min_price or max_price or shop:
+        sidebar = facets.facet_counts(products)
+    else:
+        sidebar = facets.global_counts()
+
+    search_logger.info("search", extra={
+        "query": query,
+        "min_price": min_price,
+        "max_price": max_price,
+        "shop": shop,
+        "did_you_mean": did_you_mean,
+        # Only counted for the records that are sampled
+        "results": lazy(products.count),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+    return render(request, 'search.html', {
+        'products': products,
+        'query': query,
+        'did_you_mean': did_you_mean,
+        'facets': sidebar,
+    })
@@ -0,0 +1,32 @@
+// Name suggestions for inputs marked with data-suggest (see /search/suggest/)
+(function () {
+    const url = document.currentScript.dataset.url;
+    const list = document.createElement("datalist");
+    list.id = "suggest-list";
+    document.addEventListener("DOMContentLoaded", function () {
+        document.body.appendChild(list);
+        document.querySelectorAll("input[data-suggest]").forEach(function (input) {
+            input.setAttribute("list", list.id);
+            input.setAttribute("autocomplete", "off");
+            let timer;
+            input.addEventListener("input", function () {
+                clearTimeout(timer);
+                const q = input.value.trim();
+                if (q.length < 2) return;
+                timer = setTimeout(function () {
+                    fetch(url + "?q=" + encodeURIComponent(q))
+                        .then(function (res) { return res.json(); })
+                        .then(function (data) {
+                            list.innerHTML = "";
+                            data.items.forEach(function (item) {
+                                const option = document.createElement("option");
+                                option.value = item.name;
+                                option.label = item.stock > 0 ? "In stock" : "Out of stock";
+                                list.appendChild(option);
+                            });
+                        });
+                }, 150);
+            });
+        });
+    });
+})();